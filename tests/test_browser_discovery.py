@@ -0,0 +1,196 @@
+import os
+import stat
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import types
+
+import pytest
+
+import url_browser_rule_core as core
+from url_browser_rule_core import (
+    DesktopEntryDiscoveryBackend, PathDiscoveryBackend, RegistryDiscoveryBackend, RouterEngine,
+)
+
+
+def make_executable(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("#!/bin/sh\n")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def write_desktop_file(data_dir, name, body):
+    applications = data_dir / "applications"
+    applications.mkdir(parents=True, exist_ok=True)
+    (applications / f"{name}.desktop").write_text(textwrap.dedent(body))
+
+
+unix_only = pytest.mark.skipif(sys.platform == "win32", reason="使用可执行权限位模拟PATH中的命令")
+
+
+@unix_only
+def test_path_backend_finds_first_command(tmp_path):
+    bin_dir = tmp_path / "bin"
+    chromium = make_executable(bin_dir / "chromium")
+    backend = PathDiscoveryBackend(search_path=str(bin_dir))
+    
+    assert backend.probe("chrome", "chrome.exe", RouterEngine.BROWSER_COMMANDS["chrome"]) == chromium
+    assert backend.probe("firefox", "firefox.exe", RouterEngine.BROWSER_COMMANDS["firefox"]) is None
+    
+    stable = make_executable(bin_dir / "google-chrome-stable")
+    # 命令按顺序查找，先找到的命令优先
+    assert backend.probe("chrome", "chrome.exe", RouterEngine.BROWSER_COMMANDS["chrome"]) == stable
+
+
+@unix_only
+def test_desktop_entry_backend_prefers_user_directory(tmp_path):
+    bin_dir = tmp_path / "bin"
+    firefox_esr = make_executable(bin_dir / "firefox-esr")
+    user_firefox = make_executable(tmp_path / "opt" / "firefox" / "firefox")
+    data_home, system_dir = tmp_path / "home", tmp_path / "usr"
+    write_desktop_file(system_dir, "firefox", """\
+        [Desktop Entry]
+        Type=Application
+        Exec=firefox-esr %u
+    """)
+    write_desktop_file(data_home, "firefox", f"""\
+        [Desktop Action new-window]
+        Exec=ignored
+        [Desktop Entry]
+        Type=Application
+        Exec="{user_firefox}" --new-window %u
+    """)
+    backend = DesktopEntryDiscoveryBackend([str(data_home), str(system_dir)], search_path=str(bin_dir))
+    assert backend.probe("firefox", "firefox.exe", ("firefox", "firefox-esr")) == user_firefox
+    
+    # 用户目录的同名文件被隐藏时不再使用系统目录的文件
+    write_desktop_file(data_home, "firefox", "[Desktop Entry]\nHidden=true\nExec=firefox\n")
+    backend = DesktopEntryDiscoveryBackend([str(data_home), str(system_dir)], search_path=str(bin_dir))
+    assert backend.probe("firefox", "firefox.exe", ("firefox", "firefox-esr")) is None
+    
+    # 按Exec命令识别文件名不同的.desktop文件，命令在PATH中查找
+    write_desktop_file(system_dir, "org.mozilla.esr", "[Desktop Entry]\nExec=firefox-esr %u\n")
+    backend = DesktopEntryDiscoveryBackend([str(data_home), str(system_dir)], search_path=str(bin_dir))
+    assert backend.probe("firefox", "firefox.exe", ("firefox", "firefox-esr")) == firefox_esr
+
+
+def test_desktop_entry_backend_skips_missing_targets(tmp_path):
+    write_desktop_file(tmp_path, "google-chrome", """\
+        [Desktop Entry]
+        Type=Application
+        TryExec=/nonexistent/google-chrome
+        Exec=/nonexistent/google-chrome %U
+    """)
+    write_desktop_file(tmp_path, "chromium", "[Desktop Entry]\nType=Link\nExec=chromium\n")
+    backend = DesktopEntryDiscoveryBackend([str(tmp_path), str(tmp_path / "missing")], search_path=str(tmp_path))
+    assert backend.probe("chrome", "chrome.exe", RouterEngine.BROWSER_COMMANDS["chrome"]) is None
+    assert backend.probe("safari", "safari.exe", ()) is None
+
+
+def test_registry_backend_reads_app_paths_and_commands(tmp_path):
+    edge = tmp_path / "Edge Application" / "msedge.exe"
+    edge.parent.mkdir()
+    edge.write_text("")
+    chrome = tmp_path / "chrome.exe"
+    chrome.write_text("")
+    values = {
+        # 带引号和参数的打开命令
+        r"SOFTWARE\Clients\StartMenuInternet\Microsoft Edge\shell\open\command": f'"{edge}" --single-argument %1',
+        # App Paths指向不存在的文件时继续查找下一项
+        r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe": str(tmp_path / "old" / "chrome.exe"),
+        r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Google Chrome\shell\open\command": f"{chrome} -- %1",
+    }
+    backend = RegistryDiscoveryBackend(read_value=values.get)
+    assert backend.available()
+    assert backend.probe("edge", "msedge.exe", ()) == str(edge)
+    assert backend.probe("chrome", "chrome.exe", ()) == str(chrome)
+    assert backend.probe("firefox", "firefox.exe", ()) is None
+
+
+def test_registry_backend_reads_default_values_through_winreg(monkeypatch):
+    key_path = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\firefox.exe"
+    opened = []
+    
+    class Key:
+        def __init__(self, root, path):
+            if path != key_path:
+                raise FileNotFoundError(path)
+            opened.append((root, path))
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc_info):
+            return False
+    
+    fake_winreg = types.SimpleNamespace(
+        HKEY_LOCAL_MACHINE="HKLM", KEY_READ=1,
+        OpenKey=lambda root, path, reserved, access: Key(root, path),
+        QueryValueEx=lambda key, name: (r"C:\Program Files\Mozilla Firefox\firefox.exe", 1),
+    )
+    monkeypatch.setattr(core, "winreg", fake_winreg)
+    backend = RegistryDiscoveryBackend(exists=lambda path: True)
+    assert backend.available()
+    assert backend.probe("firefox", "firefox.exe", ()) == r"C:\Program Files\Mozilla Firefox\firefox.exe"
+    assert backend.probe("edge", "msedge.exe", ()) is None
+    assert opened == [("HKLM", key_path)]
+
+
+class BlockingBackend(core.BrowserDiscoveryBackend):
+    """模拟卡住的查找（例如无响应的网络驱动器）"""
+    
+    name = "blocking"
+    priority = 0
+    
+    def __init__(self):
+        self.release = threading.Event()
+    
+    def probe(self, browser_name, exe_name, commands):
+        self.release.wait()
+        return "/blocked/" + exe_name
+
+
+class StaticBackend(core.BrowserDiscoveryBackend):
+    name = "static"
+    priority = 10
+    
+    def probe(self, browser_name, exe_name, commands):
+        if browser_name == "edge":
+            raise OSError("查找失败")
+        return "/static/" + exe_name
+
+
+def test_discovery_times_out_and_merges_by_priority():
+    blocking = BlockingBackend()
+    router_engine = RouterEngine(discovery_backends=[blocking, StaticBackend()])
+    router_engine.PROBE_TIMEOUT = 0.2
+    started = time.monotonic()
+    discovered = router_engine.discover_browser_paths(["chrome", "edge"])
+    assert time.monotonic() - started < 1.0
+    # 超时的高优先级后端被忽略，失败的查找回退到可执行文件名
+    assert discovered == {"chrome": "/static/chrome.exe", "edge": "msedge.exe"}
+    assert all(thread.daemon for thread in threading.enumerate() if thread.name.startswith("BrowserProbe"))
+    blocking.release.set()
+
+
+def test_blocked_probe_does_not_block_interpreter_exit(tmp_path):
+    script = tmp_path / "probe.py"
+    script.write_text(textwrap.dedent(f"""\
+        import sys, threading
+        sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})
+        import url_browser_rule_core as core
+        
+        class Hang(core.BrowserDiscoveryBackend):
+            def probe(self, *args):
+                threading.Event().wait()
+        
+        router_engine = core.RouterEngine(discovery_backends=[Hang()])
+        router_engine.PROBE_TIMEOUT = 0.1
+        print(router_engine.discover_browser_paths(["chrome"]))
+    """))
+    completed = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=10)
+    assert completed.returncode == 0
+    assert "chrome.exe" in completed.stdout
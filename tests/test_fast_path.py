@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from url_browser_rule_core import FAST_PATH_BUDGET_MS
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="假浏览器使用shell脚本")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_SCRIPT = os.path.join(REPO_DIR, "url_browser_rule_advanced_pyqt.py")
+
+# 在子进程中按命令行启动的方式运行入口脚本，结束后报告耗时和是否加载了PyQt5
+RUNNER = """
+import json, runpy, sys, time
+start = time.perf_counter()
+sys.argv = [sys.argv[1], sys.argv[2]]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+    code = 0
+except SystemExit as e:
+    code = e.code
+print(json.dumps({"code": code, "elapsed_ms": (time.perf_counter() - start) * 1000,
+                  "pyqt_loaded": "PyQt5" in sys.modules}))
+"""
+
+
+@pytest.fixture
+def environment(tmp_path):
+    """临时的用户目录（规则文件）和PATH中的假浏览器，假浏览器把收到的参数写入日志"""
+    home = tmp_path / "home"
+    app_data = home / "AppData" / "Local" / "URLBrowserRule"
+    app_data.mkdir(parents=True)
+    (app_data / "rules.json").write_text(json.dumps([
+        {"id": 1, "pattern": "example.com", "browser": "chrome"},
+    ]), encoding="utf-8")
+    
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log_file = tmp_path / "browser.log"
+    browser = bin_dir / "google-chrome"
+    browser.write_text(f'#!/bin/sh\necho "$@" >> "{log_file}"\n', encoding="utf-8")
+    browser.chmod(0o755)
+    
+    env = dict(os.environ, HOME=str(home), PATH=f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+               XDG_DATA_HOME=str(home / ".local" / "share"), XDG_DATA_DIRS=str(tmp_path / "share"))
+    return env, log_file
+
+
+def run_fast_path(env, url):
+    output = subprocess.run(
+        [sys.executable, "-c", RUNNER, ENTRY_SCRIPT, url], env=env, cwd=REPO_DIR,
+        capture_output=True, text=True, check=True, timeout=30
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def wait_for_log(log_file, lines, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if log_file.exists() and len(log_file.read_text(encoding="utf-8").splitlines()) >= lines:
+            break
+        time.sleep(0.02)
+    return log_file.read_text(encoding="utf-8").splitlines() if log_file.exists() else []
+
+
+def test_fast_path_launches_browser_within_budget(environment):
+    env, log_file = environment
+    # 第一次运行查找浏览器并写入路径缓存，第二次相当于日常点击链接
+    results = [run_fast_path(env, f"urlrule://example.com/page{i}") for i in range(2)]
+    
+    assert wait_for_log(log_file, 2) == ["http://example.com/page0", "http://example.com/page1"]
+    for result in results:
+        assert result["code"] == 0
+        assert not result["pyqt_loaded"]
+        assert result["elapsed_ms"] <= FAST_PATH_BUDGET_MS
@@ -0,0 +1,127 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+import url_browser_rule_core as core
+from url_browser_rule_core import InstanceMessageReader, encode_instance_message
+
+
+unix_only = pytest.mark.skipif(sys.platform == "win32", reason="Windows使用命名管道")
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    # 本地套接字路径长度有限，不使用pytest较长的临时目录
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "instance.sock")
+    monkeypatch.setattr(core, "INSTANCE_ENDPOINT", path)
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+    os.rmdir(directory)
+
+
+def serve_instance(path, count, ack=True):
+    """模拟常驻实例：接收count个连接，与界面进程一样分帧读取并回复ping，返回每个连接收到的消息列表"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(count)
+    received = []
+    
+    def serve():
+        with server:
+            for _ in range(count):
+                connection, _ = server.accept()
+                reader = InstanceMessageReader()
+                messages = []
+                with connection:
+                    while True:
+                        data = connection.recv(4096)
+                        if not data:
+                            break
+                        for message in reader.feed(data):
+                            messages.append(message)
+                            if message.get("ping") and ack:
+                                connection.sendall(encode_instance_message({"ack": True}))
+                    messages.extend(reader.finish())
+                received.append(messages)
+    
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return thread, received
+
+
+def test_reader_frames_messages_across_partial_reads():
+    stream = (encode_instance_message({"url": "https://例子.com/a", "started_at": 1.5}) +
+              b"\n" + b"not json\n" + b"[1, 2]\n" + b"null\n" + b'"url"\n' +
+              encode_instance_message({"ping": True}) + b'{"url": "https://example.com/tail"}')
+    reader = InstanceMessageReader()
+    messages = []
+    # 逐字节读取，多字节字符和换行符都会被拆开
+    for i in range(len(stream)):
+        messages.extend(reader.feed(stream[i:i + 1]))
+    assert messages == [{"url": "https://例子.com/a", "started_at": 1.5}, {"ping": True}]
+    assert reader.finish() == [{"url": "https://example.com/tail"}]
+    assert reader.finish() == []
+
+
+def test_reader_returns_every_message_in_one_read():
+    reader = InstanceMessageReader()
+    data = b"".join(encode_instance_message({"url": f"https://example.com/{i}"}) for i in range(3))
+    assert [message["url"] for message in reader.feed(data[:-5])] == ["https://example.com/0", "https://example.com/1"]
+    assert reader.feed(data[-5:]) == [{"url": "https://example.com/2"}]
+
+
+@unix_only
+def test_forward_and_ping_round_trip(endpoint):
+    thread, received = serve_instance(endpoint, 2)
+    
+    assert core.forward_to_running_instance("https://example.com/a")
+    assert core.ping_running_instance()
+    thread.join(5)
+    
+    assert received[0] == [{"url": "https://example.com/a", "started_at": core.PROCESS_START_TIME}]
+    assert received[1] == [{"ping": True}]
+
+
+@unix_only
+def test_ping_requires_ack(endpoint):
+    # 实例接受连接但不回复（例如界面线程无响应）时视为未运行
+    thread, received = serve_instance(endpoint, 1, ack=False)
+    started = time.perf_counter()
+    assert not core.ping_running_instance(timeout=0.2)
+    assert time.perf_counter() - started < 1.0
+    thread.join(5)
+    assert received == [[{"ping": True}]]
+
+
+@unix_only
+def test_ping_latency(endpoint):
+    count = 20
+    thread, _ = serve_instance(endpoint, count)
+    durations = []
+    for _ in range(count):
+        started = time.perf_counter()
+        assert core.ping_running_instance()
+        durations.append(time.perf_counter() - started)
+    thread.join(5)
+    # 界面进程启动时先ping，确认已有实例的耗时应远小于启动界面的耗时
+    durations.sort()
+    assert durations[count // 2] < 0.02
+    assert durations[-1] < 0.1
+
+
+@unix_only
+def test_no_running_instance(endpoint):
+    assert not core.ping_running_instance()
+    assert not core.forward_to_running_instance("https://example.com/a")
+    # 上次异常退出残留的套接字文件
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(endpoint)
+    stale.close()
+    assert not core.ping_running_instance()
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from url_browser_rule_core import LaunchDispatcher
+
+
+def collect_results():
+    results = []
+    finished = threading.Semaphore(0)
+    
+    def on_result(browser_name, urls, failures, seconds):
+        results.append((browser_name, urls, failures))
+        finished.release()
+    
+    return results, finished, on_result
+
+
+def wait_for(finished, count):
+    for _ in range(count):
+        assert finished.acquire(timeout=5)
+
+
+def test_hung_launch_times_out_and_frees_the_worker():
+    release = threading.Event()
+    
+    def launch(browser_name, entries):
+        if browser_name == "hung":
+            release.wait()
+        return []
+    
+    results, finished, on_result = collect_results()
+    dispatcher = LaunchDispatcher(launch, on_result, max_workers=1, timeout=0.1)
+    dispatcher.submit("hung", [("https://example.com/a", None)])
+    dispatcher.submit("chrome", [("https://example.com/b", None)])
+    wait_for(finished, 2)
+    
+    assert isinstance(results[0][2][0][1], TimeoutError)
+    assert results[1] == ("chrome", ["https://example.com/b"], [])
+    assert dispatcher.timeout_count == 1
+    assert len(dispatcher.runners) == 1
+    
+    release.set()
+    deadline = time.monotonic() + 5
+    while dispatcher.runners and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not dispatcher.runners
+    dispatcher.close(1)
+
+
+def test_hung_runners_are_capped():
+    release = threading.Event()
+    started = []
+    
+    def launch(browser_name, entries):
+        started.append(browser_name)
+        release.wait()
+        return []
+    
+    results, finished, on_result = collect_results()
+    dispatcher = LaunchDispatcher(launch, on_result, max_workers=2, timeout=0.1, max_hung=1)
+    for i in range(6):
+        dispatcher.submit(f"browser{i}", [(f"https://example.com/{i}", None)])
+    wait_for(finished, 6)
+    
+    # 启动线程最多比工作线程多一个，其余任务等待后报告失败
+    assert len(started) == 3
+    assert dispatcher.timeout_count == 3
+    assert dispatcher.refused_count == 3
+    assert sum(isinstance(failures[0][1], RuntimeError) for _, _, failures in results) == 3
+    
+    # 挂起的启动结束后恢复正常启动
+    release.set()
+    dispatcher.submit("chrome", [("https://example.com/ok", None)])
+    wait_for(finished, 1)
+    assert results[-1] == ("chrome", ["https://example.com/ok"], [])
+    assert "chrome" in started
+    dispatcher.close(1)
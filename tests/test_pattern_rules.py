@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from url_browser_rule_core import PatternRuleSet
+
+
+# 不含"="的长URL，字符集重叠的相邻重复在这里会反复回溯
+LONG_URL = "https://example.com/" + "a" * 394
+
+
+@pytest.mark.parametrize("pattern", [
+    r"\w*\w*\w*=",
+    r".*.*.*=",
+    r"\w*\w*=",
+    r"(?:\w*)(?:\w+)=",
+    r"\w*-?\w*=",
+    r"\w*\d+\w*",
+    r".*a.*a.*a.*b",
+    r".*-.*-.*-.*-.*!",
+    r"foo.*bar.*baz",
+])
+def test_rejects_overlapping_unbounded_repeats(pattern):
+    with pytest.raises(ValueError):
+        PatternRuleSet.compile_pattern("regex", pattern)
+
+
+@pytest.mark.parametrize("pattern", [
+    r".*=",
+    r"foo.*bar",
+    r"[^/]*/.*",
+    r"\d*[a-z]*x",
+    r"\W*\w*",
+    r"\w*-\w*-\w*!",
+    r"[^/]*/[^?]*\?id=\d+",
+])
+def test_accepts_linear_repeats(pattern):
+    PatternRuleSet.compile_pattern("regex", pattern)
+
+
+def test_accepted_rules_match_long_url_quickly():
+    rules = [{"pattern": pattern, "type": "regex", "browser": "b"}
+             for pattern in (r".*=", r"foo.*bar", r"[^/]*/.*=", r"\w*-\w*-\w*!", r"[^/]*/[^?]*\?id=\d+")]
+    pattern_set = PatternRuleSet(list(enumerate(rules)))
+    assert not pattern_set.errors
+    
+    start = time.perf_counter()
+    for url in (LONG_URL, "http://h/" + "a-" * 300, "http://h/" + "/" * 300):
+        assert pattern_set.match(url) == PatternRuleSet.NO_MATCH
+    assert time.perf_counter() - start < 0.5
+
+
+def test_rule_with_rejected_pattern_is_reported():
+    rules = [{"pattern": r"\w*\w*\w*=", "type": "regex", "browser": "b"}]
+    pattern_set = PatternRuleSet(list(enumerate(rules)))
+    assert len(pattern_set) == 0
+    assert pattern_set.errors[0][0] is rules[0]
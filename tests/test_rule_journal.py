@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+
+from url_browser_rule_core import ConfigManager
+
+
+RULES = [
+    {"id": 1, "pattern": "google.com", "browser": "chrome"},
+    {"id": 2, "pattern": "bing.com", "browser": "firefox"},
+]
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConfigManager()
+    manager.rules_file = str(tmp_path / "rules.json")
+    manager.config_file = str(tmp_path / "config.json")
+    assert manager.save_rules(RULES)
+    return manager
+
+
+def write_journal(manager, lines):
+    with open(manager.journal_file, "a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def test_replay_applies_operations_by_id():
+    lines = [
+        json.dumps({"op": "add", "rule": {"id": 3, "pattern": "a.com", "browser": "edge"}}),
+        json.dumps({"op": "update", "rule": {"id": 1, "pattern": "google.com", "browser": "edge"}}),
+        json.dumps({"op": "delete", "id": 2}),
+    ]
+    rules, op_count = ConfigManager.replay_journal(RULES, lines)
+    assert op_count == 3
+    assert rules == [
+        {"id": 1, "pattern": "google.com", "browser": "edge"},
+        {"id": 3, "pattern": "a.com", "browser": "edge"},
+    ]
+    # 重复重放已合并的操作不改变结果
+    assert ConfigManager.replay_journal(rules, lines)[0] == rules
+
+
+@pytest.mark.parametrize("line", [
+    '{"op": "add"}',
+    '{"op": "update", "rule": 5}',
+    '{"op": "rename", "id": 1}',
+    '{"rule": {"id": 9}}',
+    '[1, 2]',
+    '"add"',
+    '{"op": "add", "rule": {"id": 9',
+])
+def test_replay_skips_malformed_records(line):
+    lines = [line, json.dumps({"op": "delete", "id": 2})]
+    rules, op_count = ConfigManager.replay_journal(RULES, lines)
+    assert op_count == 1
+    assert rules == RULES[:1]
+
+
+def test_malformed_record_keeps_user_rules(manager):
+    write_journal(manager, ['{"op": "add"}'])
+    assert manager.add_rule({"id": 3, "pattern": "a.com", "browser": "edge"})
+    assert manager.read_rules() == RULES + [{"id": 3, "pattern": "a.com", "browser": "edge"}]
+
+
+def test_record_after_torn_line_is_kept(manager):
+    with open(manager.journal_file, "w", encoding="utf-8") as f:
+        f.write('{"op": "delete", "id"')
+    assert manager.delete_rule(1)
+    assert manager.read_rules() == RULES[1:]
+
+
+def test_compaction_merges_journal_into_snapshot(manager):
+    write_journal(manager, ['{"op": "update", "rule": 7}'])
+    assert manager.add_rule({"id": 3, "pattern": "a.com", "browser": "edge"})
+    assert manager.update_rule({"id": 2, "pattern": "bing.com", "browser": "chrome"})
+    assert manager.delete_rule(1)
+    expected = manager.read_rules()
+    
+    manager.compact_rules(wait=True)
+    
+    assert os.path.getsize(manager.journal_file) == 0
+    with open(manager.rules_file, encoding="utf-8") as f:
+        assert json.load(f) == expected
+    assert manager.read_rules() == expected
+    assert expected == [
+        {"id": 2, "pattern": "bing.com", "browser": "chrome"},
+        {"id": 3, "pattern": "a.com", "browser": "edge"},
+    ]
+
+
+def test_own_writes_are_followed_to_current_stamp(manager):
+    paths = (manager.rules_file, manager.journal_file, manager.config_file)
+    stamps = [ConfigManager.get_file_stamp(path) for path in paths]
+    
+    assert manager.add_rule({"id": 3, "pattern": "a.com", "browser": "edge"})
+    assert manager.delete_rule(1)
+    manager.compact_rules(wait=True)
+    assert manager.save_config({"font_size": 14})
+    
+    for path, stamp in zip(paths, stamps):
+        assert manager.follow_own_writes(path, stamp) == ConfigManager.get_file_stamp(path)
+
+
+def test_external_write_is_not_followed(manager):
+    stamp = ConfigManager.get_file_stamp(manager.journal_file)
+    write_journal(manager, [json.dumps({"op": "delete", "id": 2})])
+    assert manager.delete_rule(1)
+    assert manager.follow_own_writes(manager.journal_file, stamp) != \
+        ConfigManager.get_file_stamp(manager.journal_file)
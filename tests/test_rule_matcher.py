@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+from url_browser_rule_core import PatternRuleSet, RuleAnalyzer, RuleIndex, RuleMatcher, parse_url
+
+
+def route(matcher, url):
+    parsed_url = parse_url(url)
+    rule = matcher.match(parsed_url.match_url, parsed_url.idna_host)
+    return rule["browser"] if rule else None
+
+
+@pytest.mark.parametrize("url, browser", [
+    ("urlrule://GitHub.com/x", "host"),
+    ("https://GITHUB.COM", "host"),
+    ("http://example.com/Docs/1", "path"),
+    ("http://example.com/docs/1", None),
+])
+def test_host_part_of_literal_patterns_ignores_case(url, browser):
+    matcher = RuleMatcher([
+        {"pattern": "GitHub.com", "browser": "host"},
+        {"pattern": "/Docs", "browser": "path"},
+    ])
+    assert route(matcher, url) == browser
+
+
+def linear_scan(rules, actual_url, netloc):
+    """原有的逐条匹配逻辑，返回第一条匹配的规则"""
+    for rule in rules:
+        pattern = rule["pattern"]
+        if pattern == netloc or f".{pattern}" in netloc or pattern in actual_url:
+            return rule
+    return None
+
+
+def random_rules(rng, count):
+    # 字母表很小，模式之间大量重叠，覆盖重复、互为子串和空模式
+    rules = []
+    for i in range(count):
+        pattern = "".join(rng.choice("ab.c/") for _ in range(rng.randint(0, 6)))
+        rules.append({"id": i, "pattern": pattern, "browser": f"browser{i}"})
+    return rules
+
+
+def random_urls(rng, count):
+    urls = []
+    for _ in range(count):
+        host = "".join(rng.choice("abc.") for _ in range(rng.randint(1, 10)))
+        path = "".join(rng.choice("abc./") for _ in range(rng.randint(0, 12)))
+        urls.append((f"http://{host}/{path}", host))
+    return urls
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matcher_and_index_agree_with_linear_scan(seed, tmp_path):
+    rng = random.Random(seed)
+    rules = random_rules(rng, rng.randint(1, 40))
+    matcher = RuleMatcher(rules)
+    index_file = str(tmp_path / "rules.idx")
+    RuleIndex.build(rules, index_file)
+    rule_index = RuleIndex(index_file)
+    try:
+        for actual_url, netloc in random_urls(rng, 200):
+            expected = linear_scan(rules, actual_url, netloc)
+            assert matcher.match(actual_url, netloc) == expected
+            # 索引只保存模式和浏览器
+            indexed = rule_index.match(actual_url, netloc)
+            assert (indexed and indexed["browser"]) == (expected and expected["browser"])
+    finally:
+        rule_index.close()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matcher_without_dead_rules_agrees_with_linear_scan(seed):
+    rng = random.Random(seed)
+    rules = random_rules(rng, 60)
+    matcher = RuleAnalyzer(rules).build_matcher()
+    for actual_url, netloc in random_urls(rng, 200):
+        assert matcher.match(actual_url, netloc) == linear_scan(rules, actual_url, netloc)
+
+
+@pytest.mark.parametrize("url, browser", [
+    ("http://a.com/login", None),
+    ("http://a.com/Login", "login"),
+    ("http://login.a.com/", "login"),
+    ("http://a.com/?ref=abc", None),
+    ("http://a.com/?ref=ABC", "ref"),
+])
+def test_path_and_query_patterns_stay_case_sensitive(url, browser, tmp_path):
+    rules = [
+        {"pattern": "Login", "browser": "login"},
+        {"pattern": "ref=ABC", "browser": "ref"},
+    ]
+    assert route(RuleMatcher(rules), url) == browser
+    
+    index_file = str(tmp_path / "rules.idx")
+    RuleIndex.build(rules, index_file)
+    rule_index = RuleIndex(index_file)
+    try:
+        assert route(rule_index, url) == browser
+    finally:
+        rule_index.close()
+
+
+def test_unicode_and_punycode_hosts_share_match_url():
+    unicode_url = parse_url("http://münchen.de/a")
+    punycode_url = parse_url("http://xn--mnchen-3ya.de/a")
+    assert unicode_url.idna_host == punycode_url.idna_host == "xn--mnchen-3ya.de"
+    # 路由缓存以match_url为键，两种写法共用同一条缓存
+    assert unicode_url.match_url == punycode_url.match_url
+
+
+@pytest.mark.parametrize("rule", [
+    {"pattern": "münchen.de", "browser": "b"},
+    {"pattern": "xn--mnchen-3ya.de", "browser": "b"},
+    {"pattern": "MÜNCHEN.de", "browser": "b"},
+    {"pattern": "*.münchen.de", "type": "glob", "browser": "b"},
+    {"pattern": "*.xn--mnchen-3ya.de", "type": "glob", "browser": "b"},
+])
+@pytest.mark.parametrize("url", ["http://www.münchen.de/a", "http://www.xn--mnchen-3ya.de/a"])
+def test_rules_match_both_host_forms(rule, url, tmp_path):
+    rules = [rule]
+    assert route(RuleMatcher(rules), url) == "b"
+    
+    index_file = str(tmp_path / "rules.idx")
+    RuleIndex.build(rules, index_file)
+    rule_index = RuleIndex(index_file)
+    try:
+        assert route(rule_index, url) == "b"
+    finally:
+        rule_index.close()
+
+
+def test_unicode_and_punycode_globs_are_not_disjoint():
+    assert not PatternRuleSet.are_disjoint(
+        {"pattern": "*.münchen.de", "type": "glob"}, {"pattern": "*.xn--mnchen-3ya.de", "type": "glob"}
+    )
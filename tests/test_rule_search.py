@@ -0,0 +1,41 @@
+from url_browser_rule_core import RuleSearchIndex
+
+
+def make_rules(count):
+    return [{"id": i, "pattern": f"svc{i}.example.com", "browser": "chrome" if i % 2 else "firefox",
+             "description": ""} for i in range(count)]
+
+
+def test_search_pages_results_in_rule_order():
+    rules = make_rules(5000)
+    index = RuleSearchIndex(rules)
+    result = index.search("example chrome", limit=100)
+    assert 100 <= len(result.rules) < 2500
+    assert not result.complete
+    assert result.fetch(100) >= 100
+    assert result.fetch_all() == [rule for rule in rules if rule["browser"] == "chrome"]
+    assert index.search("   ") is None
+
+
+def test_extended_query_narrows_previous_result():
+    rules = make_rules(5000)
+    index = RuleSearchIndex(rules)
+    index.search("svc1", limit=10)
+    result = index.search("svc12", limit=10)
+    expected = [rule for rule in rules if rule["pattern"].startswith("svc12")]
+    assert result.fetch_all() == expected
+    assert index.search("svc123 fire").fetch_all() == [rule for rule in expected
+                                                       if rule["pattern"].startswith("svc123")
+                                                       and rule["browser"] == "firefox"]
+
+
+def test_rules_added_during_paging_come_after_candidates():
+    rules = make_rules(3000)
+    index = RuleSearchIndex(rules)
+    result = index.search("example", limit=10)
+    new_rule = {"id": 9999, "pattern": "new.example.com", "browser": "edge"}
+    index.add_rule(new_rule)
+    assert result.extend([new_rule]) == []
+    result.remove(rules[0])
+    assert result.fetch_all() == rules[1:] + [new_rule]
+    assert result.extend([{"id": 10000}]) == [{"id": 10000}]
@@ -1,19 +1,22 @@
 import sys
+
+# 带URL参数启动时（例如点击urlrule://链接）走不加载PyQt5的快速路径，处理完成后直接退出
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from url_browser_rule_core import run_fast_path
+    sys.exit(run_fast_path(sys.argv[1]))
+
 import os
-import json
-import subprocess
 import winreg
-from urllib.parse import urlparse
 import time
 import ctypes
-import shutil
-import webbrowser
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLineEdit, QPushButton, 
     QLabel, QVBoxLayout, QHBoxLayout, QGridLayout, QTreeWidget, 
     QTreeWidgetItem, QMenu, QAction, QInputDialog, QMessageBox,
     QTabWidget, QFrame, QComboBox, QSpinBox, QDoubleSpinBox, QSlider,
-    QSystemTrayIcon, QDialogButtonBox, QFormLayout, QDialog
+    QSystemTrayIcon, QDialogButtonBox, QFormLayout, QDialog, QTreeView,
+    QAbstractItemView
 )
 from PyQt5.QtGui import (
     QIcon, QPainter, QPen, QColor, QFont, QBrush,
@@ -21,315 +24,423 @@ from PyQt5.QtGui import (
 )
 from PyQt5.QtCore import (
     Qt, QPoint, QSize, QRect, QTimer, QEventLoop,
-    QThread, pyqtSignal, QUrl
+    QObject, QThread, pyqtSignal, QUrl, QAbstractTableModel, QModelIndex, QFileSystemWatcher
+)
+from PyQt5.QtNetwork import QLocalServer
+
+from url_browser_rule_core import (
+    APP_DATA_DIR, RULES_FILE, CONFIG_FILE, INSTANCE_ENDPOINT, PROTOCOL_NAME, METRICS_FILE,
+    BrowserPathCache, ConfigManager, ConfigStore, LaunchBatcher, LaunchDispatcher, PatternRuleSet, RouterEngine, RuleAnalyzer, RuleImporter, RuleSearchIndex,
+    SpeculativeRouter, ping_running_instance, InstanceMessageReader, encode_instance_message
 )
 
 # 依赖说明：
 # 本程序依赖PyQt5库
 # 安装命令：pip install PyQt5
 
-# 配置文件路径
-# 获取用户应用数据目录，确保配置文件持久保存
-APP_DATA_DIR = os.path.join(os.path.expanduser("~"), "AppData", "Local", "URLBrowserRule")
-# 确保目录存在
-os.makedirs(APP_DATA_DIR, exist_ok=True)
-
-# 使用应用数据目录保存配置文件
-RULES_FILE = os.path.join(APP_DATA_DIR, 'rules.json')
-CONFIG_FILE = os.path.join(APP_DATA_DIR, 'config.json')
 # 图标文件仍然使用当前目录
 ICON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'url.ico')
 
-# 配置管理器类
-class ConfigManager:
-    """负责配置文件和规则文件的读写管理"""
-    
-    # 默认规则
-    DEFAULT_RULES = [
-        {
-            "id": 1,
-            "pattern": "google.com",
-            "browser": "chrome",
-            "description": "Google使用Chrome"
-        },
-        {
-            "id": 2,
-            "pattern": "bing.com",
-            "browser": "firefox",
-            "description": "Bing使用Firefox"
-        },
-        {
-            "id": 3,
-            "pattern": "edge.microsoft.com",
-            "browser": "edge",
-            "description": "Edge官网使用Edge"
-        }
-    ]
-    
-    # 默认配置
-    DEFAULT_CONFIG = {
-        "auto_start": False,
-        "lock_position": False,
-        "lock_size": False,
-        "lock_ratio": True,
-        "window_x": 100,
-        "window_y": 100,
-        "window_width": 500,
-        "window_height": 100,
-        "font_size": 12,
-        "font_family": "Arial",
-        "opacity": 0.8,
-        "border_thickness": 2,
-        "scale_factor": 1.0
-    }
-    
-    def __init__(self):
-        self.rules_file = RULES_FILE
-        self.config_file = CONFIG_FILE
-        self.default_rules = self.DEFAULT_RULES
-        self.default_config = self.DEFAULT_CONFIG
-    
-    def read_config(self):
-        """从文件读取配置"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            # 保存默认配置
-            self.save_config(self.default_config)
-            return self.default_config
-        except Exception as e:
-            print(f"读取配置失败: {e}")
-            return self.default_config
+# 浏览器路径预扫描线程
+class BrowserScannerThread(QThread):
+    """预扫描浏览器路径的线程"""
+    # 定义信号，用于向主线程发送扫描结果
+    scan_finished = pyqtSignal(dict)
     
-    def save_config(self, config):
-        """保存配置到文件"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存配置失败: {e}")
+    def __init__(self, router_engine):
+        super().__init__()
+        self.router_engine = router_engine
     
-    def read_rules(self):
-        """从文件读取规则"""
+    def run(self):
+        """线程运行函数，重新验证缓存的浏览器路径并扫描所有支持的浏览器路径"""
+        browser_paths_scanned = {}
+        
+        # 缓存的路径在启动时已直接使用，这里检查文件状态，浏览器被移动、卸载或更新时重新查找
         try:
-            if os.path.exists(self.rules_file):
-                with open(self.rules_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            # 保存默认规则
-            self.save_rules(self.default_rules)
-            return self.default_rules
+            changed = self.router_engine.revalidate_browser_paths()
+            if changed:
+                print(f"浏览器路径已更新: {changed}")
         except Exception as e:
-            print(f"读取规则失败: {e}")
-            return self.default_rules
-    
-    def save_rules(self, rules):
-        """保存规则到文件"""
+            print(f"验证浏览器路径缓存失败: {e}")
+        
+        # 扫描所有支持的浏览器，没有缓存的浏览器由各个查找后端并行查找
         try:
-            with open(self.rules_file, 'w', encoding='utf-8') as f:
-                json.dump(rules, f, ensure_ascii=False, indent=2)
-            return True
+            browser_paths_scanned = self.router_engine.find_browser_paths(self.router_engine.browser_paths.keys())
         except Exception as e:
-            print(f"保存规则失败: {e}")
-            return False
-    
-    def get_next_rule_id(self, rules):
-        """获取下一个可用的规则ID"""
-        if not rules:
-            return 1
-        return max(rule["id"] for rule in rules) + 1
+            print(f"扫描浏览器路径失败: {e}")
+        
+        # 发送扫描结果到主线程
+        self.scan_finished.emit(browser_paths_scanned)
 
-# 路由引擎类
-class RouterEngine:
-    """负责浏览器路径扫描、URL解析和规则匹配逻辑"""
-    
-    # 浏览器可执行文件映射
-    BROWSER_PATHS = {
-        "chrome": "chrome.exe",
-        "firefox": "firefox.exe",
-        "edge": "msedge.exe",
-        "safari": "safari.exe",
-        "default": None
-    }
+# 规则批量导入线程
+class RuleImportThread(QThread):
+    """在后台流式导入规则的线程，按批写入规则日志并通知主线程"""
+    # 导入进度（百分比）
+    progress_changed = pyqtSignal(int)
+    # 一批已写入规则日志的新规则
+    chunk_imported = pyqtSignal(list)
+    # 导入结束：成功数量、重复数量、失败数量、错误信息
+    import_finished = pyqtSignal(int, int, int, str)
     
-    def __init__(self):
-        self.browser_paths = self.BROWSER_PATHS
-        self.browser_path_cache = {}
+    def __init__(self, config_manager, rules, default_browser, file_path=None, text=""):
+        super().__init__()
+        self.config_manager = config_manager
+        # 使用规则列表的副本，避免与主线程同时访问
+        self.rules = list(rules)
+        self.default_browser = default_browser
+        self.file_path = file_path
+        self.text = text
     
-    def find_browser_path(self, browser_name):
-        """查找浏览器的完整路径，优先使用注册表查找，然后使用shutil.which，最后尝试常见路径"""
-        if browser_name == "default":
-            return None
-        
-        # 检查缓存
-        if browser_name in self.browser_path_cache:
-            return self.browser_path_cache[browser_name]
-        
-        exe_name = self.browser_paths.get(browser_name)
-        if not exe_name:
-            return None
-        
-        # 1. 首先使用shutil.which快速查找，利用系统PATH
-        which_path = shutil.which(exe_name)
-        if which_path:
-            self.browser_path_cache[browser_name] = which_path
-            return which_path
-        
-        # 2. 注册表查找函数
-        def get_reg_value(key_path, value_name, hive=winreg.HKEY_LOCAL_MACHINE):
-            """获取注册表值"""
-            try:
-                with winreg.OpenKey(hive, key_path, 0, winreg.KEY_READ) as key:
-                    value, _ = winreg.QueryValueEx(key, value_name)
-                    return value
-            except Exception:
-                return None
-        
-        # 浏览器特定的注册表查找
-        browser_reg_paths = {
-            "chrome": [
-                # Chrome - App Paths
-                r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe",
-                # Chrome - Start Menu Internet
-                r"SOFTWARE\Clients\StartMenuInternet\Google Chrome\shell\open\command",
-                r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Google Chrome\shell\open\command"
-            ],
-            "firefox": [
-                # Firefox - App Paths
-                r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\firefox.exe",
-                # Firefox - Start Menu Internet
-                r"SOFTWARE\Clients\StartMenuInternet\Firefox-308046B0AF4A39CB\shell\open\command",
-                r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Firefox-308046B0AF4A39CB\shell\open\command"
-            ],
-            "edge": [
-                # Edge - App Paths
-                r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\msedge.exe",
-                # Edge - Start Menu Internet
-                r"SOFTWARE\Clients\StartMenuInternet\Microsoft Edge\shell\open\command",
-                r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Microsoft Edge\shell\open\command"
-            ],
-            "safari": [
-                # Safari - App Paths
-                r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\safari.exe"
-            ]
-        }
-        
-        # 3. 优先通过注册表查找
-        if browser_name in browser_reg_paths:
-            for reg_path in browser_reg_paths[browser_name]:
-                try:
-                    # 尝试获取注册表值
-                    reg_value = get_reg_value(reg_path, "")
-                    if reg_value:
-                        # 处理带引号的路径
-                        if reg_value.startswith('"') and '"' in reg_value[1:]:
-                            # 提取引号内的路径
-                            browser_path = reg_value.split('"')[1]
-                        else:
-                            # 提取第一个空格前的路径
-                            browser_path = reg_value.split()[0]
-                        
-                        # 检查路径是否存在
-                        if os.path.exists(browser_path):
-                            self.browser_path_cache[browser_name] = browser_path
-                            return browser_path
-                except Exception:
-                    continue
-        
-        # 4. 尝试直接检查常见路径，不进行递归搜索
-        common_paths = [
-            os.path.expanduser(r"~\AppData\Local\Microsoft\Edge\Application"),
-            r"C:\Program Files\Google\Chrome\Application",
-            r"C:\Program Files\Mozilla Firefox",
-            r"C:\Program Files (x86)\Google\Chrome\Application",
-            r"C:\Program Files (x86)\Mozilla Firefox",
-            os.path.expanduser(r"~\AppData\Local\Programs\Microsoft Edge"),
-            os.path.expanduser(r"~\AppData\Local\Programs\Firefox"),
-            os.path.expanduser(r"~\AppData\Local\Programs\Chrome")
-        ]
-        
-        # 检查常见路径
-        for path in common_paths:
-            browser_path = os.path.join(path, exe_name)
-            if os.path.exists(browser_path):
-                self.browser_path_cache[browser_name] = browser_path
-                return browser_path
-        
-        # 5. 移除递归搜索，避免UI阻塞
-        # 只有在必要时才返回原始文件名，依赖系统PATH
-        result = exe_name
-        self.browser_path_cache[browser_name] = result
-        return result
-    
-    def match_rule(self, url, rules):
-        """根据URL匹配规则，返回匹配的浏览器名称"""
+    def run(self):
+        """线程运行函数，解析、去重并分批提交规则"""
+        importer = RuleImporter(self.rules, self.default_browser)
+        committed_count = 0
+        error_message = ""
         try:
-            # 解析URL
-            actual_url = url
-            if actual_url.startswith(f"{self.protocol_name}://"):
-                actual_url = actual_url.replace(f"{self.protocol_name}://", "http://")
-            
-            parsed_url = urlparse(actual_url)
+            # 1. 确定输入来源和格式
+            if self.file_path:
+                total_size = max(1, os.path.getsize(self.file_path))
+                with open(self.file_path, 'rb') as f:
+                    first_line = f.readline().decode('utf-8-sig', errors='replace')
+                input_format = RuleImporter.detect_format(self.file_path, first_line)
+                lines = importer.iter_file_lines(self.file_path)
+            else:
+                total_size = 0
+                lines = self.text.splitlines(True)
+                input_format = RuleImporter.detect_format("", lines[0] if lines else "")
             
-            # 查找匹配的规则
-            matched_rule = None
-            for rule in rules:
-                pattern = rule["pattern"]
-                if pattern == parsed_url.netloc or f".{pattern}" in parsed_url.netloc or pattern in actual_url:
-                    matched_rule = rule
+            # 2. 每批规则一次写入规则日志，再交给主线程更新界面
+            for chunk in importer.iter_chunks(lines, input_format):
+                if self.isInterruptionRequested():
                     break
+                ops = [{"op": "add", "rule": rule} for rule in chunk]
+                if not self.config_manager.append_rule_ops(ops, compact=False):
+                    error_message = "写入规则日志失败"
+                    break
+                committed_count += len(chunk)
+                self.chunk_imported.emit(chunk)
+                if total_size:
+                    self.progress_changed.emit(min(99, importer.bytes_read * 100 // total_size))
             
-            # 选择浏览器
-            if matched_rule:
-                return matched_rule["browser"]
-            else:
-                return "default"
+            # 3. 导入结束后在后台合并规则日志
+            self.config_manager.compact_rules()
         except Exception as e:
-            print(f"匹配规则失败: {e}")
-            return "default"
+            error_message = str(e)
+        
+        self.progress_changed.emit(100)
+        self.import_finished.emit(committed_count, importer.duplicate_count, importer.error_count, error_message)
+
+# 规则搜索索引建立线程
+class RuleSearchIndexThread(QThread):
+    """在后台为规则列表建立搜索索引的线程"""
+    # 建立完成：索引、建立时的规则版本号
+    index_ready = pyqtSignal(object, int)
     
-    def set_protocol_name(self, protocol_name):
-        """设置协议名称"""
-        self.protocol_name = protocol_name
+    def __init__(self, rules, rules_version):
+        super().__init__()
+        self.rules = list(rules)
+        self.rules_version = rules_version
+    
+    def run(self):
+        """线程运行函数，建立索引并发送到主线程"""
+        self.index_ready.emit(RuleSearchIndex(self.rules), self.rules_version)
 
-# 浏览器路径预扫描线程
-class BrowserScannerThread(QThread):
-    """预扫描浏览器路径的线程"""
-    # 定义信号，用于向主线程发送扫描结果
-    scan_finished = pyqtSignal(dict)
+# 规则遮蔽分析线程
+class RuleAnalysisThread(QThread):
+    """在后台分析被遮蔽的规则，并编译去掉不可达规则、按命中次数调整尝试顺序的匹配器"""
+    # 分析完成：分析结果、匹配器、开始时的规则版本号、开始时的规则集版本号
+    analysis_ready = pyqtSignal(object, object, int, int)
     
-    def __init__(self, router_engine):
+    def __init__(self, rules, rules_version, hit_counts):
         super().__init__()
-        self.router_engine = router_engine
+        self.rules = rules
+        self.rules_version = rules_version
+        self.rules_generation = ConfigManager.rules_generation
+        self.hit_counts = hit_counts
     
     def run(self):
-        """线程运行函数，扫描所有支持的浏览器路径"""
-        browser_paths_scanned = {}
-        
-        # 扫描所有支持的浏览器
-        for browser_name in self.router_engine.browser_paths.keys():
-            if browser_name != "default":
-                try:
-                    # 调用router_engine的find_browser_path函数扫描路径
-                    path = self.router_engine.find_browser_path(browser_name)
-                    browser_paths_scanned[browser_name] = path
-                except Exception as e:
-                    print(f"扫描{browser_name}失败: {e}")
-        
-        # 发送扫描结果到主线程
-        self.scan_finished.emit(browser_paths_scanned)
+        """线程运行函数，分析规则并发送到主线程"""
+        analyzer = RuleAnalyzer(list(self.rules))
+        self.analysis_ready.emit(analyzer, analyzer.build_matcher(self.hit_counts),
+                                 self.rules_version, self.rules_generation)
+
+# 浏览器启动结果通知
+class LaunchNotifier(QObject):
+    """把启动调度器工作线程中的启动结果通过信号转到主线程"""
+    # 启动完成：浏览器名称、URL列表、失败列表[(URL列表, 异常)]、耗时秒数
+    launch_finished = pyqtSignal(str, object, object, float)
+
+# 规则和配置文件热加载线程
+class FileReloadThread(QThread):
+    """在后台重新读取被外部修改的规则和配置文件，与当前规则比较差异并编译新的匹配器"""
+    # 读取完成：结果字典、开始读取时的规则版本号
+    reload_finished = pyqtSignal(object, int)
+    
+    # 读取期间文件又被修改时的最大重试次数
+    MAX_ATTEMPTS = 3
+    
+    def __init__(self, config_manager, rules, rules_version, reload_rules, reload_config, build_search_index):
+        super().__init__()
+        # 使用独立的配置管理器读取，不影响界面线程追加规则日志
+        self.config_manager = ConfigManager()
+        self.config_manager.rules_file = config_manager.rules_file
+        self.config_manager.config_file = config_manager.config_file
+        self.rules = list(rules)
+        self.rules_version = rules_version
+        self.reload_rules = reload_rules
+        self.reload_config = reload_config
+        self.build_search_index = build_search_index
+    
+    def read_stable(self, paths, load):
+        """读取文件，读取前后文件状态不一致（写入或压缩进行中）时重新读取，返回(内容, 文件状态)"""
+        for _ in range(self.MAX_ATTEMPTS):
+            stamps = tuple(ConfigManager.get_file_stamp(path) for path in paths)
+            value = load()
+            if stamps == tuple(ConfigManager.get_file_stamp(path) for path in paths):
+                return value, stamps
+            time.sleep(0.1)
+        raise IOError("文件在读取期间持续被修改")
+    
+    def run(self):
+        """线程运行函数，读取失败时保留当前规则和配置"""
+        result = {"error": None, "rules": None, "config": None}
+        try:
+            # 1. 规则：读取快照和日志，按ID比较差异，有变化时编译新的匹配器
+            if self.reload_rules:
+                paths = (self.config_manager.rules_file, self.config_manager.journal_file)
+                new_rules, result["rules_stamp"] = self.read_stable(paths, self.config_manager.load_rules)
+                merged, added, removed, changed, reordered = ConfigManager.diff_rules(self.rules, new_rules)
+                if added or removed or changed or reordered:
+                    # 同时分析被遮蔽的规则，匹配器不包含不可达规则
+                    analyzer = RuleAnalyzer(merged)
+                    result["rules"] = {
+                        "rules": merged, "added": added, "removed": removed,
+                        "changed": changed, "reordered": reordered,
+                        "matcher": analyzer.build_matcher(), "analysis": analyzer,
+                        # 顺序变化时无法增量更新搜索索引，在这里重新建立
+                        "search_index": RuleSearchIndex(merged) if reordered and self.build_search_index else None
+                    }
+            
+            # 2. 配置
+            if self.reload_config:
+                result["config"], result["config_stamp"] = self.read_stable(
+                    (self.config_manager.config_file,), self.config_manager.load_config
+                )
+        except Exception as e:
+            result["error"] = str(e)
+        self.reload_finished.emit(result, self.rules_version)
+
+# 规则表格模型
+class RulesTableModel(QAbstractTableModel):
+    """基于内存规则列表的表格模型，按需分批加载行，只为可见行生成显示数据
+    
+    rows为显示顺序的规则列表（与规则列表共享同一批规则字典），未排序时与规则声明顺序一致；
+    设置过滤结果后只显示过滤结果中的规则。规则按对象查找所在的行，内容相同的两条规则也能区分
+    """
+    
+    HEADERS = ("ID", "匹配模式", "浏览器", "描述")
+    KEYS = ("id", "pattern", "browser", "description")
+    # 每次向视图提供的行数
+    FETCH_SIZE = 1000
+    
+    def __init__(self, rules, parent=None):
+        super().__init__(parent)
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.reset_rules(rules)
+    
+    def reset_rules(self, rules):
+        """整体替换规则列表并清除过滤"""
+        self.rules = rules
+        self.search_result = None
+        self.filter_rules = None
+        self.refresh()
+    
+    def set_filter(self, result):
+        """设置过滤结果（RuleSearchResult，只校验了第一批规则），为None时显示全部规则"""
+        self.search_result = result
+        self.filter_rules = result.rules if result is not None else None
+        self.refresh()
+    
+    def refresh(self):
+        """重新生成显示顺序，只加载第一批行"""
+        self.beginResetModel()
+        self.rows = self.sorted_rows()
+        self.row_of = None
+        self.loaded_count = min(len(self.rows), self.FETCH_SIZE)
+        self.endResetModel()
+    
+    def find_row(self, rule):
+        """返回规则对象所在的行，不在表格中时返回None；行号表在行的位置变化后重新生成"""
+        if self.row_of is None:
+            self.row_of = {id(row_rule): row for row, row_rule in enumerate(self.rows)}
+        return self.row_of.get(id(rule))
+    
+    def sort_key(self, rule):
+        """当前排序列的排序键"""
+        value = rule.get(self.KEYS[self.sort_column], "")
+        return value if self.sort_column == 0 else str(value).lower()
+    
+    def sorted_rows(self):
+        """按当前排序列生成显示顺序，未排序时保持规则声明顺序"""
+        source = self.rules if self.filter_rules is None else self.filter_rules
+        if self.sort_column < 0:
+            return list(source)
+        if self.search_result is not None:
+            # 排序需要全部过滤结果
+            self.search_result.fetch_all()
+        return sorted(source, key=self.sort_key, reverse=self.sort_order == Qt.DescendingOrder)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded_count
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return str(self.rows[index.row()].get(self.KEYS[index.column()], ""))
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self.loaded_count < len(self.rows) or
+                                         (self.search_result is not None and not self.search_result.complete))
+    
+    def fetchMore(self, parent=QModelIndex()):
+        """视图滚动到末尾时再加载一批行，过滤结果不够时先校验下一批规则"""
+        if self.search_result is not None and len(self.rows) - self.loaded_count < self.FETCH_SIZE:
+            # 未排序时显示顺序就是过滤结果的顺序，排序时已经取得全部结果
+            start = len(self.search_result.rules)
+            self.search_result.fetch(self.FETCH_SIZE)
+            self.rows.extend(self.search_result.rules[start:])
+            self.row_of = None
+        count = min(self.FETCH_SIZE, len(self.rows) - self.loaded_count)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded_count, self.loaded_count + count - 1)
+        self.loaded_count += count
+        self.endInsertRows()
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        """按列排序，column为-1时恢复规则声明顺序"""
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = column
+        self.sort_order = order
+        self.rows = self.sorted_rows()
+        self.row_of = None
+        self.layoutChanged.emit()
+    
+    def rule_at(self, row):
+        """返回指定行的规则"""
+        return self.rows[row] if 0 <= row < len(self.rows) else None
+    
+    def find_insert_row(self, rule):
+        """排序状态下二分查找新规则的插入位置"""
+        key = self.sort_key(rule)
+        descending = self.sort_order == Qt.DescendingOrder
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = self.sort_key(self.rows[middle])
+            if (key < middle_key) if descending else (middle_key <= key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def in_sort_order(self, row):
+        """该行与前后两行是否仍符合排序顺序"""
+        key = self.sort_key(self.rows[row])
+        descending = self.sort_order == Qt.DescendingOrder
+        if row > 0:
+            previous_key = self.sort_key(self.rows[row - 1])
+            if (previous_key < key) if descending else (key < previous_key):
+                return False
+        if row + 1 < len(self.rows):
+            next_key = self.sort_key(self.rows[row + 1])
+            if (key < next_key) if descending else (next_key < key):
+                return False
+        return True
+    
+    def insert_rules(self, rules):
+        """插入新规则（规则列表中已包含，过滤时只传入匹配的规则），只通知已加载范围内的行，其余的行在滚动时再加载"""
+        if self.search_result is not None:
+            # 过滤结果尚未校验完时，新规则在校验完剩余的候选规则后再显示
+            rules = self.search_result.extend(rules)
+        if self.sort_column >= 0 and len(rules) > self.FETCH_SIZE:
+            # 排序状态下批量导入时逐条插入代价过高，整体重新排序
+            self.refresh()
+            return
+        for rule in rules:
+            self.insert_row(rule, len(self.rows) if self.sort_column < 0 else self.find_insert_row(rule))
+    
+    def insert_row(self, rule, row):
+        """在显示顺序的row处插入规则，位于已加载范围内时通知视图"""
+        if row <= self.loaded_count and (row < self.loaded_count or not self.canFetchMore()):
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.insert(row, rule)
+            self.loaded_count += 1
+            self.endInsertRows()
+        else:
+            self.rows.insert(row, rule)
+        if row == len(self.rows) - 1 and self.row_of is not None:
+            # 追加到末尾时其他行的位置不变
+            self.row_of[id(rule)] = row
+        else:
+            self.row_of = None
+    
+    def remove_row(self, row):
+        """删除显示顺序中的一行"""
+        if row < self.loaded_count:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[row]
+            self.loaded_count -= 1
+            self.endRemoveRows()
+        else:
+            del self.rows[row]
+        self.row_of = None
+    
+    def update_rule(self, rule):
+        """规则修改后刷新它所在的一行，排序时排序列的值变化则移动到新的位置"""
+        row = self.find_row(rule)
+        if row is None:
+            return
+        if self.sort_column >= 0 and not self.in_sort_order(row):
+            self.remove_row(row)
+            self.insert_row(rule, self.find_insert_row(rule))
+            return
+        if row < self.loaded_count:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+    
+    def remove_rule(self, rule):
+        """删除规则所在的一行"""
+        if self.search_result is not None:
+            self.search_result.remove(rule)
+        row = self.find_row(rule)
+        if row is not None:
+            self.remove_row(row)
 
 class TransparentWindow(QMainWindow):
     """透明主窗口，只负责UI渲染和事件捕获"""
     def __init__(self):
         super().__init__()
         
-        # 初始化配置管理器和路由引擎
+        # 初始化配置管理器
         self.config_manager = ConfigManager()
-        self.router_engine = RouterEngine()
         
-        # 读取配置
-        self.config = self.config_manager.read_config()
+        # 读取配置，修改配置只更新内存，由后台写入线程合并后写入文件
+        self.config = ConfigStore(self.config_manager)
+        
+        # 初始化路由引擎，缓存容量可在配置中调整，浏览器路径使用与快速路径共用的持久化缓存
+        self.router_engine = RouterEngine(
+            self.config.get('route_cache_size', RouterEngine.ROUTE_CACHE_SIZE),
+            BrowserPathCache()
+        )
         
         # 设置窗口属性
         self.setWindowTitle("URL输入框")
@@ -355,7 +466,6 @@ class TransparentWindow(QMainWindow):
             height = self.config_manager.DEFAULT_CONFIG['window_height']
             self.config['window_width'] = width
             self.config['window_height'] = height
-            self.config_manager.save_config(self.config)
         
         self.setGeometry(x, y, width, height)
         
@@ -379,17 +489,69 @@ class TransparentWindow(QMainWindow):
         self.base_scale_factor = 1.0
         self.original_aspect_ratio = width / height  # 原始宽高比
         
-        # 延迟保存定时器
-        self.save_timer = QTimer()
-        self.save_timer.setSingleShot(True)
-        self.save_timer.timeout.connect(self.save_config)
-        self.SAVE_DELAY = 500  # 500毫秒延迟保存
+        # 帧定时器：拖动、调整大小和缩放事件合并到屏幕刷新率，每帧只处理一次
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 60.0
+        self.frame_interval = max(1, int(1000 / max(refresh_rate, 1.0)))
+        self.frame_timer = QTimer()
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.timeout.connect(self.render_frame)
+        self.pending_pos = None
+        self.pending_size = None
+        self.pending_restyle = False
+        
+        # 样式表缓存：按字体、边框和字体像素大小缓存生成的样式表，并记录每个组件当前的样式表
+        self.STYLESHEET_CACHE_SIZE = 256
+        self.stylesheet_cache = {}
+        self.applied_stylesheets = {}
+        
+        # 浏览器启动合并：合并窗口内的URL按浏览器分组，每个浏览器只启动一次
+        self.launch_batcher = LaunchBatcher(self.router_engine)
+        self.launch_timer = QTimer()
+        self.launch_timer.setSingleShot(True)
+        self.launch_timer.timeout.connect(self.flush_launches)
+        
+        # 浏览器启动调度：查找浏览器路径和启动进程都在后台工作线程中进行，结果通过信号通知
+        self.launch_notifier = LaunchNotifier()
+        self.launch_notifier.launch_finished.connect(self.on_launch_finished)
+        self.launch_dispatcher = LaunchDispatcher(self.launch_batcher.launch, self.launch_notifier.launch_finished.emit)
+        
+        # 运行统计定时导出定时器
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(self.flush_metrics)
+        self.METRICS_FLUSH_INTERVAL = 60000  # 每60秒导出一次
+        self.metrics_timer.start(self.METRICS_FLUSH_INTERVAL)
         
         # 规则管理
-        self.protocol_name = "urlrule"
+        self.protocol_name = PROTOCOL_NAME
         self.router_engine.set_protocol_name(self.protocol_name)
         self.script_path = os.path.abspath(__file__)
         self.rules = self.config_manager.read_rules()
+        # 规则表格模型，与规则列表同步增量更新，设置窗口打开时直接使用
+        self.rules_model = RulesTableModel(self.rules, self)
+        # 规则搜索索引在第一次打开设置窗口时于后台建立，之后随规则修改增量更新
+        self.rules_search_index = None
+        self.rules_search_thread = None
+        self.rules_version = 0
+        self.rules_filter = ""
+        self.rule_import_thread = None
+        # 规则遮蔽分析结果，规则变化后延迟一段时间在后台重新分析
+        self.rule_analysis = None
+        self.rule_analysis_thread = None
+        self.rules_analysis_label = None
+        self.RULE_ANALYSIS_DELAY = 1000  # 毫秒
+        self.rule_analysis_timer = QTimer()
+        self.rule_analysis_timer.setSingleShot(True)
+        self.rule_analysis_timer.timeout.connect(self.start_rule_analysis)
+        self.rule_analysis_timer.start(self.RULE_ANALYSIS_DELAY)
+        # 定时按最新的命中次数重新优化规则的尝试顺序，上次优化后有新的匹配时才重新编译
+        self.RULE_REORDER_INTERVAL = 300000  # 每5分钟一次
+        self.reordered_match_count = 0
+        self.rule_reorder_timer = QTimer()
+        self.rule_reorder_timer.timeout.connect(self.reorder_rules)
+        self.rule_reorder_timer.start(self.RULE_REORDER_INTERVAL)
+        # 预先路由：输入框或剪贴板中出现URL时在后台匹配规则并准备浏览器路径，按回车时直接使用
+        self.speculative_router = SpeculativeRouter(self.router_engine, lambda: self.rules)
         
         # 创建中央部件
         self.central_widget = QWidget()
@@ -397,6 +559,7 @@ class TransparentWindow(QMainWindow):
         
         # 创建UI
         self.setup_ui()
+        QApplication.clipboard().dataChanged.connect(self.on_clipboard_changed)
         
         # 注册URL协议
         self.register_protocol()
@@ -409,16 +572,18 @@ class TransparentWindow(QMainWindow):
         self.tray_icon = None
         self.setup_tray()
         
-        # 检查命令行参数
-        if len(sys.argv) > 1:
-            url = sys.argv[1]
-            self.handle_url(url)
+        # 启动单实例服务，接收后续进程转发的URL
+        # 命令行传入的URL由快速路径处理，不再经过主窗口
+        self.start_instance_server()
         
         # 应用初始缩放设置
         self.resize_widgets()
         
         # 启动浏览器路径预扫描线程
         self.start_browser_scanner()
+        
+        # 监视规则和配置文件，外部修改后自动热加载
+        self.start_file_watcher()
     
     def start_browser_scanner(self):
         """启动浏览器路径预扫描线程"""
@@ -435,6 +600,45 @@ class TransparentWindow(QMainWindow):
         """处理浏览器扫描完成信号"""
         print(f"浏览器路径预扫描完成: {scanned_paths}")
     
+    def start_instance_server(self):
+        """启动单实例本地服务"""
+        self.instance_server = QLocalServer(self)
+        # 清理上次异常退出残留的套接字文件
+        QLocalServer.removeServer(INSTANCE_ENDPOINT)
+        if not self.instance_server.listen(INSTANCE_ENDPOINT):
+            print(f"单实例服务启动失败: {self.instance_server.errorString()}")
+            return False
+        self.instance_server.newConnection.connect(self.on_instance_connection)
+        return True
+    
+    def on_instance_connection(self):
+        """接收新的转发连接"""
+        while self.instance_server.hasPendingConnections():
+            connection = self.instance_server.nextPendingConnection()
+            reader = InstanceMessageReader()
+            connection.readyRead.connect(lambda c=connection, r=reader: self.read_instance_messages(c, r))
+            # 发送方写完即关闭连接，断开时读取剩余数据再释放
+            connection.disconnected.connect(lambda c=connection, r=reader: self.read_instance_messages(c, r, True))
+            connection.disconnected.connect(connection.deleteLater)
+    
+    def read_instance_messages(self, connection, reader, finished=False):
+        """读取并处理转发连接中的完整消息，finished为True时连接已断开，处理没有换行结尾的剩余数据"""
+        messages = reader.feed(bytes(connection.readAll()))
+        if finished:
+            messages.extend(reader.finish())
+        for message in messages:
+            if message.get("ping"):
+                # 新启动的界面进程检查是否已有实例，回复确认后由它退出
+                if not finished:
+                    connection.write(encode_instance_message({"ack": True}))
+                    connection.flush()
+                continue
+            url = message.get("url")
+            if not isinstance(url, str) or not url:
+                continue
+            # 打开浏览器后统计从启动转发进程到打开浏览器的耗时
+            self.handle_url(url, message.get("started_at"))
+    
     def setup_ui(self):
         """设置UI组件"""
         # 设置中央部件透明
@@ -469,25 +673,8 @@ class TransparentWindow(QMainWindow):
         # 设置输入框属性，确保背景透明
         self.url_input.setAttribute(Qt.WA_TranslucentBackground, True)
         self.url_input.setAttribute(Qt.WA_NoSystemBackground, False)
-        self.url_input.setStyleSheet(f"""
-            QLineEdit {{
-                background-color: rgba(0, 0, 0, 0.01);
-                color: white;
-                border: {self.border_thickness}px solid white;
-                font-family: {self.font_family};
-                font-size: {self.base_font_size}px;
-                padding: 2px;
-                selection-background-color: white;
-                selection-color: black;
-                background-clip: padding;
-                border-radius: 0;
-            }}
-            QLineEdit:focus {{
-                outline: none;
-                border-color: white;
-            }}
-        """)
         self.url_input.returnPressed.connect(self.visit_url)
+        self.url_input.textChanged.connect(self.speculate_url)
         
         # 添加粘贴按钮
         self.add_paste_button()
@@ -499,40 +686,13 @@ class TransparentWindow(QMainWindow):
         # 冒号标签
         self.colon_label = QLabel(":")
         self.colon_label.setAttribute(Qt.WA_TranslucentBackground, True)
-        self.colon_label.setStyleSheet(f"""
-            QLabel {{
-                color: white;
-                font-family: {self.font_family};
-                font-size: {self.base_font_size * 2}px;
-                font-weight: bold;
-                background-color: rgba(0, 0, 0, 0.01);
-            }}
-        """)
         
         # 访问按钮
         self.visit_btn = QPushButton("访问")
         self.visit_btn.setAttribute(Qt.WA_TranslucentBackground, True)
-        self.visit_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: rgba(0, 0, 0, 0.01);
-                color: white;
-                border: {self.border_thickness}px solid white;
-                font-family: {self.font_family};
-                font-size: {self.base_font_size}px;
-                font-weight: bold;
-                background-clip: padding;
-                border-radius: 0;
-            }}
-            QPushButton:hover {{
-                background-color: rgba(255, 255, 255, 0.1);
-            }}
-            QPushButton:focus {{
-                outline: none;
-                border-color: white;
-            }}
-        """)
         self.visit_btn.clicked.connect(self.visit_url)
         
+        # 样式表在resize_widgets中按缩放后的字体大小统一设置
         # 布局组件
         main_layout.addWidget(self.url_input, 1)
         main_layout.addWidget(self.colon_label)
@@ -693,20 +853,17 @@ class TransparentWindow(QMainWindow):
         """鼠标移动事件"""
         if self.dragging and not self.config['lock_position']:
             # 左键拖动冒号：移动窗口
-            new_pos = event.globalPos() - self.drag_offset
-            self.move(new_pos)
+            self.pending_pos = event.globalPos() - self.drag_offset
+            self.schedule_frame()
             event.accept()
-            # 延迟保存
-            self.delay_save_config()
         elif self.resizing and not self.config['lock_size']:
             # 左键拖动边框：调整窗口大小
             delta = event.globalPos() - self.resize_start_pos
             new_width = max(200, self.resize_start_size.width() + delta.x())
             new_height = max(60, self.resize_start_size.height() + delta.y())
-            self.resize(new_width, new_height)
+            self.pending_size = (new_width, new_height)
+            self.schedule_frame()
             event.accept()
-            # 延迟保存
-            self.delay_save_config()
         elif self.scaling and not self.config['lock_size']:
             # 右键拖动冒号：调整窗口缩放比例
             # 计算鼠标Y坐标的变化量
@@ -726,16 +883,13 @@ class TransparentWindow(QMainWindow):
                     scaled_height = int(round(self.base_component_height * self.scale_factor))
                     scaled_width = int(round(scaled_height * self.original_aspect_ratio))
                     # 调整窗口大小
-                    self.resize(scaled_width, scaled_height)
-                    # 更新组件大小
-                    self.resize_widgets()
-                else:
-                    # 不锁定比例：只调整字体大小和窗口高度，宽度保持不变
-                    self.resize_widgets()
+                    self.pending_size = (scaled_width, scaled_height)
+                # 不锁定比例时只调整字体大小和窗口高度，宽度保持不变
+                # 更新组件大小
+                self.pending_restyle = True
+                self.schedule_frame()
                 
                 event.accept()
-                # 延迟保存
-                self.delay_save_config()
     
     def mouseReleaseEvent(self, event):
         """鼠标释放事件"""
@@ -743,8 +897,11 @@ class TransparentWindow(QMainWindow):
         self.dragging = False
         self.resizing = False
         self.scaling = False
-        # 立即保存
-        self.save_config()
+        # 立即应用尚未渲染的最后一帧
+        if self.frame_timer.isActive():
+            self.render_frame()
+        # 只更新内存中的配置，位置和大小有变化时由写入线程保存
+        self.update_geometry_config()
     
     def wheelEvent(self, event):
         """鼠标滚轮事件"""
@@ -758,16 +915,17 @@ class TransparentWindow(QMainWindow):
             new_scale = max(0.5, self.scale_factor - scale_step)
         
         self.scale_factor = new_scale
-        self.resize_widgets()
-        self.delay_save_config()
+        self.pending_restyle = True
+        self.schedule_frame()
     
-    def resize_widgets(self):
-        """调整所有组件大小"""
-        scaled_font_size = int(round(self.base_font_size * self.scale_factor))
-        component_height = int(round(self.base_component_height * self.scale_factor))
-        
-        # 更新输入框样式
-        self.url_input.setStyleSheet(f"""
+    def build_stylesheets(self, scaled_font_size):
+        """生成输入框、冒号标签和按钮的样式表，按字体、边框和缩放后的字体像素大小缓存"""
+        key = (self.font_family, self.border_thickness, scaled_font_size)
+        stylesheets = self.stylesheet_cache.get(key)
+        if stylesheets is not None:
+            return stylesheets
+        
+        input_stylesheet = f"""
             QLineEdit {{
                 background-color: rgba(0, 0, 0, 0.01);
                 color: white;
@@ -784,10 +942,8 @@ class TransparentWindow(QMainWindow):
                 outline: none;
                 border-color: white;
             }}
-        """)
-        
-        # 更新冒号标签样式
-        self.colon_label.setStyleSheet(f"""
+        """
+        colon_stylesheet = f"""
             QLabel {{
                 color: white;
                 font-family: {self.font_family};
@@ -795,10 +951,8 @@ class TransparentWindow(QMainWindow):
                 font-weight: bold;
                 background-color: rgba(0, 0, 0, 0.01);
             }}
-        """)
-        
-        # 更新按钮样式
-        self.visit_btn.setStyleSheet(f"""
+        """
+        button_stylesheet = f"""
             QPushButton {{
                 background-color: rgba(0, 0, 0, 0.01);
                 color: white;
@@ -816,100 +970,340 @@ class TransparentWindow(QMainWindow):
                 outline: none;
                 border-color: white;
             }}
-        """)
+        """
+        if len(self.stylesheet_cache) >= self.STYLESHEET_CACHE_SIZE:
+            self.stylesheet_cache.clear()
+        stylesheets = (input_stylesheet, colon_stylesheet, button_stylesheet)
+        self.stylesheet_cache[key] = stylesheets
+        return stylesheets
+    
+    def apply_stylesheet(self, widget, stylesheet):
+        """样式表有变化时才重新设置，避免触发不必要的样式重算和重新布局"""
+        if self.applied_stylesheets.get(widget) == stylesheet:
+            return False
+        widget.setStyleSheet(stylesheet)
+        self.applied_stylesheets[widget] = stylesheet
+        return True
+    
+    def resize_widgets(self):
+        """调整所有组件大小，只更新样式或尺寸实际变化的组件"""
+        # 缩放比例按字体像素大小量化，同一字号下的缩放只调整窗口大小
+        scaled_font_size = int(round(self.base_font_size * self.scale_factor))
+        component_height = int(round(self.base_component_height * self.scale_factor))
+        input_stylesheet, colon_stylesheet, button_stylesheet = self.build_stylesheets(scaled_font_size)
+        
+        # 更新样式
+        for widget, stylesheet in ((self.url_input, input_stylesheet),
+                                   (self.colon_label, colon_stylesheet),
+                                   (self.visit_btn, button_stylesheet)):
+            self.apply_stylesheet(widget, stylesheet)
         
         # 调整组件大小
-        self.url_input.setMinimumHeight(component_height)
-        self.visit_btn.setMinimumHeight(component_height)
-        self.colon_label.setMinimumHeight(component_height)
+        for widget in (self.url_input, self.visit_btn, self.colon_label):
+            if widget.minimumHeight() != component_height:
+                widget.setMinimumHeight(component_height)
         
         # 更新配置
-        self.config['window_width'] = self.width()
-        self.config['window_height'] = self.height()
-        self.config['window_x'] = self.x()
-        self.config['window_y'] = self.y()
-        self.config['scale_factor'] = self.scale_factor
+        self.update_geometry_config()
     
-    def delay_save_config(self):
-        """延迟保存配置"""
-        self.save_timer.start(self.SAVE_DELAY)
+    def update_geometry_config(self):
+        """把窗口位置、大小和缩放比例写入配置，没有变化的配置项不会触发写入"""
+        self.config.update({
+            'window_width': self.width(),
+            'window_height': self.height(),
+            'window_x': self.x(),
+            'window_y': self.y(),
+            'scale_factor': self.scale_factor
+        })
     
-    def save_config(self):
-        """保存配置到文件"""
-        try:
-            self.config_manager.save_config(self.config)
-        except Exception as e:
-            print(f"保存配置失败: {e}")
+    def schedule_frame(self):
+        """请求在下一帧应用挂起的移动、调整大小和缩放，同一帧内的多个事件只处理一次"""
+        if not self.frame_timer.isActive():
+            self.frame_timer.start(self.frame_interval)
     
-    def save_rules(self, rules):
-        """保存规则到文件"""
-        return self.config_manager.save_rules(rules)
+    def render_frame(self):
+        """应用挂起的窗口位置、大小和缩放"""
+        self.frame_timer.stop()
+        if self.pending_pos is not None:
+            self.move(self.pending_pos)
+            self.pending_pos = None
+        if self.pending_size is not None:
+            self.resize(*self.pending_size)
+            self.pending_size = None
+        if self.pending_restyle:
+            self.pending_restyle = False
+            self.resize_widgets()
     
-    def visit_url(self):
-        """访问输入的URL"""
-        url = self.url_input.text().strip()
-        if not url:
-            QMessageBox.warning(self, "警告", "请输入URL")
+    def flush_metrics(self):
+        """有新数据时把运行统计导出到文本文件"""
+        if self.router_engine.metrics.dirty:
+            self.router_engine.metrics.export(METRICS_FILE, self.router_engine.route_cache)
+    
+    def get_rules_files(self):
+        """规则快照和规则日志的路径"""
+        return self.config_manager.rules_file, self.config_manager.journal_file
+    
+    def get_rules_stamp(self):
+        """规则快照和规则日志的文件状态"""
+        return tuple(map(ConfigManager.get_file_stamp, self.get_rules_files()))
+    
+    def start_file_watcher(self):
+        """监视规则快照、规则日志、配置文件及其所在目录，文件变化后去抖动再检查"""
+        self.rules_stamp = self.get_rules_stamp()
+        self.config_stamp = ConfigManager.get_file_stamp(self.config_manager.config_file)
+        self.file_reload_thread = None
+        self.file_reload_pending = False
+        
+        # 编辑器保存或原子替换时会连续产生多个事件，合并为一次检查
+        self.reload_timer = QTimer()
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.timeout.connect(self.check_file_changes)
+        self.RELOAD_DELAY = 300  # 300毫秒去抖动
+        
+        # 原子替换后文件监视会失效，同时监视目录以便重新添加
+        self.file_watcher = QFileSystemWatcher()
+        directories = {os.path.dirname(os.path.abspath(path)) for path in self.get_watched_files()}
+        self.file_watcher.addPaths(sorted(directories))
+        self.watch_files()
+        self.file_watcher.fileChanged.connect(self.on_watched_file_changed)
+        self.file_watcher.directoryChanged.connect(self.on_watched_file_changed)
+    
+    def get_watched_files(self):
+        """需要热加载的文件"""
+        return (self.config_manager.rules_file, self.config_manager.journal_file, self.config_manager.config_file)
+    
+    def watch_files(self):
+        """把存在但尚未监视的文件加入监视"""
+        watched = set(self.file_watcher.files())
+        paths = [path for path in self.get_watched_files() if path not in watched and os.path.exists(path)]
+        if paths:
+            self.file_watcher.addPaths(paths)
+    
+    def on_watched_file_changed(self, path):
+        """文件或目录变化，重新添加被替换的文件并推迟检查"""
+        self.watch_files()
+        self.reload_timer.start(self.RELOAD_DELAY)
+    
+    def check_file_changes(self):
+        """比较文件状态，规则或配置文件确实变化时启动后台读取"""
+        if self.file_reload_thread is not None and self.file_reload_thread.isRunning():
+            # 上一次读取尚未结束，结束后再检查
+            self.file_reload_pending = True
             return
+        if self.rule_import_thread is not None and self.rule_import_thread.isRunning():
+            # 导入线程写入的规则日志会通过信号加入规则列表，导入结束后再检查
+            self.reload_timer.start(self.RELOAD_DELAY)
+            return
+        
+        # 界面添加/修改/删除规则、压缩规则日志和保存配置后，内存中的规则和配置已是最新，
+        # 记录的文件状态直接跟到本进程写入后的状态，只有其他程序的修改才需要重新读取
+        self.rules_stamp = tuple(map(self.config_manager.follow_own_writes, self.get_rules_files(), self.rules_stamp))
+        self.config_stamp = self.config_manager.follow_own_writes(self.config_manager.config_file, self.config_stamp)
         
-        # URL格式验证
-        if not (url.startswith(('http://', 'https://', f'{self.protocol_name}://')) or \
-                '.' in url or ':' in url):
-            QMessageBox.warning(self, "警告", "请输入有效的URL格式")
+        reload_rules = self.get_rules_stamp() != self.rules_stamp
+        reload_config = ConfigManager.get_file_stamp(self.config_manager.config_file) != self.config_stamp
+        if not reload_rules and not reload_config:
             return
         
-        # 补全协议
-        if not url.startswith(('http://', 'https://', f'{self.protocol_name}://')):
-            url = f'{self.protocol_name}://{url}'
+        self.file_reload_pending = False
+        self.file_reload_thread = FileReloadThread(
+            self.config_manager, self.rules, self.rules_version, reload_rules, reload_config,
+            self.rules_search_index is not None
+        )
+        self.file_reload_thread.reload_finished.connect(self.on_file_reload_finished)
+        self.file_reload_thread.start()
+    
+    def on_file_reload_finished(self, result, rules_version):
+        """后台读取完成，在界面线程中应用规则差异和配置修改"""
+        self.file_reload_thread.wait()
+        if result["error"]:
+            # 文件可能正在被编辑器写入或内容有误，保留当前规则和配置，下次修改时再读取
+            print(f"热加载失败: {result['error']}")
+        else:
+            if "rules_stamp" in result:
+                if rules_version != self.rules_version:
+                    # 读取期间界面修改了规则，差异已经过期，基于最新的规则列表重新比较
+                    self.file_reload_pending = True
+                else:
+                    self.rules_stamp = result["rules_stamp"]
+                    if result["rules"] is not None:
+                        self.apply_rules_diff(result["rules"])
+            if result["config"] is not None:
+                if result["config_stamp"] != ConfigManager.get_file_stamp(self.config_manager.config_file):
+                    # 读取之后界面又保存了配置，按最新的文件重新读取
+                    self.file_reload_pending = True
+                else:
+                    self.config_stamp = result["config_stamp"]
+                    self.apply_config(result["config"])
         
-        self.handle_url(url)
+        if self.file_reload_pending:
+            self.check_file_changes()
+    
+    def apply_rules_diff(self, diff):
+        """原子替换规则列表和匹配器，路由缓存、表格和搜索索引只更新变化的规则"""
+        merged = diff["rules"]
+        self.router_engine.install_rules(
+            merged, diff["matcher"], diff["added"], diff["removed"], diff["changed"], diff["reordered"]
+        )
+        self.rules = merged
+        self.rules_version += 1
+        self.set_rule_analysis(diff["analysis"])
+        print(f"规则已热加载: 新增 {len(diff['added'])} 条，删除 {len(diff['removed'])} 条，"
+              f"修改 {len(diff['changed'])} 条")
+        
+        if diff["reordered"]:
+            # 规则顺序变化，整体替换表格和搜索索引
+            self.rules_search_index = diff["search_index"]
+            self.rules_model.reset_rules(self.rules)
+            if self.rules_search_index is not None and self.rules_filter.strip():
+                self.rules_model.set_filter(self.rules_search_index.search(self.rules_filter))
+            return
+        
+        # 1. 删除的规则
+        self.rules_model.rules = self.rules
+        for rule in diff["removed"]:
+            if self.rules_search_index is not None:
+                self.rules_search_index.remove_rule(rule)
+            self.rules_model.remove_rule(rule)
+        
+        # 2. 修改的规则就地更新原规则对象，表格和搜索索引中引用的对象保持不变
+        positions = {id(rule): i for i, rule in enumerate(merged)}
+        for old_rule, new_rule in diff["changed"]:
+            merged[positions[id(new_rule)]] = old_rule
+            old_rule.clear()
+            old_rule.update(new_rule)
+            self.on_rule_changed(old_rule)
+        
+        # 3. 新增的规则都在末尾，与导入规则的处理相同
+        if diff["added"]:
+            self.on_rules_added(diff["added"])
+    
+    def apply_config(self, config):
+        """应用外部修改过的配置项，界面自己写入的配置不会被当作修改"""
+        changed_keys = self.config.apply_external(config)
+        if not changed_keys:
+            return
+        print(f"配置已热加载: {', '.join(sorted(changed_keys))}")
+        
+        # 1. 外观
+        if 'opacity' in changed_keys:
+            self.setWindowOpacity(self.config['opacity'])
+        if changed_keys & {'font_family', 'font_size', 'border_thickness', 'scale_factor'}:
+            self.font_family = self.config.get('font_family', self.font_family)
+            self.base_font_size = self.config.get('font_size', self.base_font_size)
+            self.border_thickness = self.config.get('border_thickness', self.border_thickness)
+            self.scale_factor = self.config.get('scale_factor', self.scale_factor)
+        
+        # 2. 窗口位置和大小
+        if changed_keys & {'window_x', 'window_y', 'window_width', 'window_height'}:
+            self.setGeometry(
+                self.config.get('window_x', self.x()), self.config.get('window_y', self.y()),
+                self.config.get('window_width', self.width()), self.config.get('window_height', self.height())
+            )
+        if changed_keys & {'font_family', 'font_size', 'border_thickness', 'scale_factor',
+                           'window_x', 'window_y', 'window_width', 'window_height'}:
+            self.resize_widgets()
+        
+        # 3. 路由缓存容量
+        if 'route_cache_size' in changed_keys:
+            self.router_engine.route_cache.resize(self.config['route_cache_size'])
+        
+        # 4. 开机自启动和锁定选项
+        if 'auto_start' in changed_keys:
+            self.set_auto_start(self.config['auto_start'])
+        if changed_keys & {'auto_start', 'lock_position', 'lock_size', 'lock_ratio'}:
+            self.create_tray_menu()
+    
+    def speculate_url(self, text):
+        """输入框或剪贴板中出现像URL的文本时交给后台预先路由"""
+        if not self.config.get('speculative_routing', False):
+            return
+        if any(self.router_engine.complete_url(token) for token in text.split()):
+            self.speculative_router.submit(text)
+    
+    def on_clipboard_changed(self):
+        """剪贴板内容变化时预先路由其中的URL，粘贴后按回车即可直接打开"""
+        self.speculate_url(QApplication.clipboard().text())
+    
+    def visit_url(self):
+        """访问输入的URL，粘贴的多个URL（以空白分隔）一起打开"""
+        pressed_at = time.perf_counter()
+        urls = self.url_input.text().split()
+        if not urls:
+            QMessageBox.warning(self, "警告", "请输入URL")
+            return
+        
+        # URL格式验证并补全协议
+        completed_urls = []
+        for url in urls:
+            completed_url = self.router_engine.complete_url(url)
+            if completed_url is None:
+                QMessageBox.warning(self, "警告", f"请输入有效的URL格式: {url}")
+                return
+            completed_urls.append(completed_url)
+        
+        for url in completed_urls:
+            # 已预先路由的URL直接使用路由结果
+            speculation = self.speculative_router.get(url, self.rules) \
+                if self.config.get('speculative_routing', False) else None
+            self.handle_url(url, speculation=speculation, pressed_at=pressed_at)
         # 清空输入框
         self.url_input.clear()
     
-    def handle_url(self, url):
-        """处理URL请求"""
+    def handle_url(self, url, started_at=None, speculation=None, pressed_at=None):
+        """处理URL请求：在主线程中只匹配规则并加入启动合并队列，浏览器由后台工作线程打开
+        
+        speculation为预先路由的结果(匹配的规则, 匹配耗时秒数)，pressed_at为在输入框按下回车的时间
+        """
         try:
-            # 解析URL
-            actual_url = url
-            if actual_url.startswith(f"{self.protocol_name}://"):
-                actual_url = actual_url.replace(f"{self.protocol_name}://", "http://")
+            # 解析URL，匹配、缓存和启动共用同一个解析结果
+            parsed_url = self.router_engine.parse_url(url)
             
-            # 使用RouterEngine匹配规则
-            browser = self.router_engine.match_rule(url, self.rules)
+            if speculation is not None:
+                matched_rule, seconds = speculation
+                self.router_engine.metrics.record_match(matched_rule, seconds)
+                browser = matched_rule["browser"] if matched_rule else "default"
+            else:
+                # 使用RouterEngine匹配规则，浏览器路径在工作线程中查找
+                browser = self.router_engine.match_rule(parsed_url, self.rules)
             
-            # 调用浏览器 - 使用RouterEngine的find_browser_path
-            browser_exe = None
-            if browser != "default":
-                browser_exe = self.router_engine.find_browser_path(browser)
+            if pressed_at is not None:
+                self.launch_batcher.mark_keypress(parsed_url.url, speculation is not None, pressed_at)
             
-            if browser_exe:
-                # 安全执行：去掉shell=True，直接使用列表参数
-                subprocess.Popen([browser_exe, actual_url])
+            if self.launch_timer.isActive():
+                # 合并窗口内到达的URL在窗口结束后按浏览器合并，同一浏览器的URL在一个进程中打开
+                self.launch_batcher.add(parsed_url.url, browser, started_at)
             else:
-                # 使用Python内置的os.startfile方法，安全打开默认浏览器
-                try:
-                    os.startfile(actual_url)
-                except Exception as e1:
-                    print(f"使用os.startfile打开URL失败: {e1}")
-                    try:
-                        # 回退方案1：使用webbrowser模块，这是最安全的兜底
-                        webbrowser.open(actual_url)
-                    except Exception as e2:
-                        print(f"使用webbrowser打开URL失败: {e2}")
-                        # 最后的兜底方案：使用subprocess，不使用shell=True
-                        try:
-                            # 尝试使用系统默认浏览器的通用方法
-                            subprocess.Popen(['cmd', '/c', 'start', '', actual_url], shell=False)
-                        except Exception as e3:
-                            print(f"所有打开URL的方法都失败了: {e3}")
-                            QMessageBox.critical(self, "错误", f"无法打开浏览器: {str(e3)}")
+                # 没有正在合并的URL时立即打开，同时开始合并窗口，窗口为0时合并本轮事件处理中的其余URL
+                self.launch_dispatcher.submit(browser, [(parsed_url.url, started_at)])
+                self.launch_timer.start(max(0, int(self.config.get('launch_batch_window_ms', 150))))
             
             return True
         except Exception as e:
             print(f"处理URL失败: {e}")
-            QMessageBox.critical(self, "错误", f"处理URL失败: {str(e)}")
+            self.show_notification("处理URL失败", str(e))
             return False
     
+    def flush_launches(self):
+        """合并窗口结束，把每个浏览器的一组URL交给启动调度器"""
+        for browser_name, entries in self.launch_batcher.take():
+            self.launch_dispatcher.submit(browser_name, entries)
+    
+    def on_launch_finished(self, browser_name, urls, failures, seconds):
+        """后台启动完成，失败时显示非模态通知"""
+        if not failures:
+            return
+        message = "\n".join(f"{', '.join(failed_urls)}: {error}" for failed_urls, error in failures)
+        print(f"无法打开浏览器 {browser_name}（{seconds * 1000:.0f} 毫秒）: {message}")
+        self.show_notification("无法打开浏览器", message)
+    
+    def show_notification(self, title, message):
+        """通过托盘图标显示非模态通知，托盘不可用时只输出到控制台"""
+        if self.tray_icon and QSystemTrayIcon.supportsMessages():
+            self.tray_icon.showMessage(title, message, QSystemTrayIcon.Warning, 5000)
+        else:
+            print(f"{title}: {message}")
+    
     def register_protocol(self):
         """注册URL协议"""
         try:
@@ -1023,19 +1417,16 @@ class TransparentWindow(QMainWindow):
         """切换开机自启动"""
         self.config['auto_start'] = not self.config['auto_start']
         self.set_auto_start(self.config['auto_start'])
-        self.save_config()
         self.create_tray_menu()
     
     def toggle_lock_position(self):
         """切换锁定位置"""
         self.config['lock_position'] = not self.config['lock_position']
-        self.save_config()
         self.create_tray_menu()
     
     def toggle_lock_size(self):
         """切换锁定大小"""
         self.config['lock_size'] = not self.config['lock_size']
-        self.save_config()
         self.create_tray_menu()
     
     def update_tray_menu(self):
@@ -1045,7 +1436,6 @@ class TransparentWindow(QMainWindow):
     def toggle_lock_ratio(self):
         """切换锁定比例"""
         self.config['lock_ratio'] = not self.config.get('lock_ratio', True)
-        self.save_config()
         self.create_tray_menu()
     
     def show_settings(self):
@@ -1070,6 +1460,11 @@ class TransparentWindow(QMainWindow):
         self.setup_appearance_tab(appearance_tab)
         tab_widget.addTab(appearance_tab, "外观设置")
         
+        # 统计信息标签页
+        stats_tab = QWidget()
+        self.setup_stats_tab(stats_tab)
+        tab_widget.addTab(stats_tab, "统计信息")
+        
         # 布局
         layout = QVBoxLayout(settings_dialog)
         layout.addWidget(tab_widget)
@@ -1079,17 +1474,37 @@ class TransparentWindow(QMainWindow):
     def setup_rules_tab(self, parent):
         """设置规则管理标签页"""
         layout = QHBoxLayout(parent)
-        
-        # 规则列表
-        self.rules_tree = QTreeWidget()
-        self.rules_tree.setHeaderLabels(["ID", "匹配模式", "浏览器", "描述"])
-        self.rules_tree.setColumnWidth(0, 50)
-        self.rules_tree.setColumnWidth(1, 150)
-        self.rules_tree.setColumnWidth(2, 100)
-        self.rules_tree.setColumnWidth(3, 300)
-        
-        # 加载规则
-        self.load_rules_to_tree()
+        list_layout = QVBoxLayout()
+        
+        # 搜索框，输入时按匹配模式、浏览器和描述过滤规则
+        self.rules_search_edit = QLineEdit()
+        self.rules_search_edit.setClearButtonEnabled(True)
+        self.rules_search_edit.textChanged.connect(self.filter_rules)
+        list_layout.addWidget(self.rules_search_edit)
+        self.rules_filter = ""
+        self.rules_model.set_filter(None)
+        if self.rules_search_index is None:
+            self.rules_search_edit.setEnabled(False)
+            self.rules_search_edit.setPlaceholderText("正在建立搜索索引...")
+            self.start_search_index_build()
+        else:
+            self.rules_search_edit.setPlaceholderText("搜索匹配模式、浏览器或描述，多个关键词用空格分隔")
+        
+        # 规则列表，使用模型/视图只为可见行生成数据
+        self.rules_view = QTreeView()
+        self.rules_view.setRootIsDecorated(False)
+        self.rules_view.setUniformRowHeights(True)
+        self.rules_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.rules_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.rules_view.setModel(self.rules_model)
+        self.rules_view.setColumnWidth(0, 50)
+        self.rules_view.setColumnWidth(1, 150)
+        self.rules_view.setColumnWidth(2, 100)
+        self.rules_view.setColumnWidth(3, 300)
+        
+        # 点击表头排序，初始保持规则声明顺序（即匹配优先级）
+        self.rules_view.header().setSortIndicator(-1, Qt.AscendingOrder)
+        self.rules_view.setSortingEnabled(True)
         
         # 按钮布局
         button_layout = QVBoxLayout()
@@ -1111,12 +1526,146 @@ class TransparentWindow(QMainWindow):
         import_btn.clicked.connect(self.import_rules)
         button_layout.addWidget(import_btn)
         
+        # 被遮蔽规则按钮
+        analysis_btn = QPushButton("被遮蔽规则")
+        analysis_btn.clicked.connect(self.show_rule_analysis)
+        button_layout.addWidget(analysis_btn)
+        
         button_layout.addStretch()
         
         # 组合布局
-        layout.addWidget(self.rules_tree)
+        list_layout.addWidget(self.rules_view)
+        # 规则遮蔽分析摘要
+        self.rules_analysis_label = QLabel()
+        list_layout.addWidget(self.rules_analysis_label)
+        self.update_rules_analysis_label()
+        layout.addLayout(list_layout)
         layout.addLayout(button_layout)
     
+    def start_search_index_build(self):
+        """启动后台线程建立规则搜索索引"""
+        if self.rules_search_thread is not None and self.rules_search_thread.isRunning():
+            return
+        self.rules_search_thread = RuleSearchIndexThread(self.rules, self.rules_version)
+        self.rules_search_thread.index_ready.connect(self.on_search_index_ready)
+        self.rules_search_thread.start()
+    
+    def on_search_index_ready(self, search_index, rules_version):
+        """索引建立完成，建立期间规则有变化时重新建立"""
+        if rules_version != self.rules_version:
+            self.rules_search_thread.wait()
+            self.start_search_index_build()
+            return
+        self.rules_search_index = search_index
+        self.rules_search_edit.setEnabled(True)
+        self.rules_search_edit.setPlaceholderText("搜索匹配模式、浏览器或描述，多个关键词用空格分隔")
+    
+    def start_rule_analysis(self):
+        """启动后台线程分析被遮蔽的规则，同时按当前的命中次数优化规则的尝试顺序"""
+        if self.rule_analysis_thread is not None and self.rule_analysis_thread.isRunning():
+            return
+        metrics = self.router_engine.metrics
+        self.reordered_match_count = metrics.match_latency.count
+        self.rule_analysis_thread = RuleAnalysisThread(self.rules, self.rules_version, dict(metrics.rule_hits))
+        self.rule_analysis_thread.analysis_ready.connect(self.on_rule_analysis_ready)
+        self.rule_analysis_thread.start()
+    
+    def on_rule_analysis_ready(self, analyzer, rule_matcher, rules_version, rules_generation):
+        """分析完成，换用去掉不可达规则的匹配器；分析期间规则有变化时重新分析"""
+        self.rule_analysis_thread.wait()
+        if rules_version != self.rules_version:
+            self.start_rule_analysis()
+            return
+        self.router_engine.install_equivalent_matcher(self.rules, rule_matcher, rules_generation)
+        self.set_rule_analysis(analyzer)
+    
+    def reorder_rules(self):
+        """定时重新优化规则的尝试顺序，新匹配器在后台编译后整体替换"""
+        if self.router_engine.metrics.match_latency.count != self.reordered_match_count:
+            self.start_rule_analysis()
+    
+    def set_rule_analysis(self, analyzer):
+        """保存规则遮蔽分析结果并更新摘要"""
+        self.rule_analysis = analyzer
+        self.update_rules_analysis_label()
+    
+    def update_rules_analysis_label(self):
+        """在规则管理标签页显示被遮蔽规则的数量"""
+        if self.rules_analysis_label is None:
+            return
+        if self.rule_analysis is None:
+            self.rules_analysis_label.setText("正在检查被遮蔽的规则...")
+            return
+        dead_count = len(self.rule_analysis.dead_orders)
+        partial_count = len(self.rule_analysis.shadowed) - dead_count
+        self.rules_analysis_label.setText(
+            f"{dead_count} 条规则被前面的规则完全遮蔽（不会命中，已从匹配器中省略），"
+            f"{partial_count} 条规则部分被遮蔽"
+        )
+    
+    def show_rule_analysis(self):
+        """列出被遮蔽的规则及遮蔽它们的规则"""
+        if self.rule_analysis is None:
+            QMessageBox.information(self, "提示", "正在检查被遮蔽的规则，请稍后再试")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("被遮蔽规则")
+        dialog.setGeometry(300, 300, 700, 400)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel("只使用第一条匹配的规则，下列规则被前面的规则遮蔽："))
+        
+        tree = QTreeWidget()
+        tree.setRootIsDecorated(False)
+        tree.setHeaderLabels(["ID", "匹配模式", "遮蔽情况", "遮蔽它的规则ID", "遮蔽它的匹配模式"])
+        tree.setColumnWidth(0, 50)
+        tree.setColumnWidth(1, 200)
+        tree.setColumnWidth(2, 80)
+        tree.setColumnWidth(3, 100)
+        kinds = {RuleAnalyzer.DEAD: "完全遮蔽", RuleAnalyzer.PARTIAL: "部分遮蔽"}
+        tree.addTopLevelItems([
+            QTreeWidgetItem([str(rule.get("id")), rule.get("pattern", ""), kinds[kind],
+                             str(shadowing_rule.get("id")), shadowing_rule.get("pattern", "")])
+            for rule, kind, shadowing_rule in self.rule_analysis.findings()
+        ])
+        layout.addWidget(tree)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        dialog.exec_()
+    
+    def filter_rules(self, text):
+        """按搜索框内容过滤规则列表"""
+        if self.rules_search_index is None:
+            return
+        self.rules_filter = text
+        self.rules_model.set_filter(self.rules_search_index.search(text))
+    
+    def on_rule_changed(self, rule):
+        """规则就地修改后更新搜索索引和表格：过滤时按新的内容决定是否显示，排序时移动到新的位置"""
+        if self.rules_search_index is not None:
+            self.rules_search_index.update_rule(rule)
+            if self.rules_filter.strip():
+                if not self.rules_search_index.matches(rule, self.rules_filter):
+                    self.rules_model.remove_rule(rule)
+                    return
+                if self.rules_model.find_row(rule) is None:
+                    # 修改后才匹配的规则按规则顺序出现在过滤结果中，重新过滤
+                    self.rules_model.set_filter(self.rules_search_index.search(self.rules_filter))
+                    return
+        self.rules_model.update_rule(rule)
+    
+    def on_rules_added(self, rules):
+        """新规则加入规则列表后更新搜索索引和表格，过滤时只显示匹配的规则"""
+        self.rules_version += 1
+        self.rule_analysis_timer.start(self.RULE_ANALYSIS_DELAY)
+        if self.rules_search_index is not None:
+            self.rules_search_index.add_rules(rules)
+            if self.rules_filter.strip():
+                rules = [rule for rule in rules if self.rules_search_index.matches(rule, self.rules_filter)]
+        self.rules_model.insert_rules(rules)
+    
     def setup_appearance_tab(self, parent):
         """设置外观设置标签页"""
         layout = QGridLayout(parent)
@@ -1165,19 +1714,72 @@ class TransparentWindow(QMainWindow):
         restore_btn.clicked.connect(self.restore_default_scaling)
         layout.addWidget(restore_btn, 5, 0, 1, 3)
     
-    def load_rules_to_tree(self):
-        """加载规则到树形视图"""
-        self.rules_tree.clear()
-        # 重新读取规则，确保数据最新
-        self.rules = self.config_manager.read_rules()
-        for rule in self.rules:
+    def setup_stats_tab(self, parent):
+        """设置统计信息标签页"""
+        layout = QVBoxLayout(parent)
+        
+        # 汇总信息
+        self.stats_label = QLabel()
+        layout.addWidget(self.stats_label)
+        
+        # 按规则统计的命中次数
+        self.stats_tree = QTreeWidget()
+        self.stats_tree.setHeaderLabels(["ID", "匹配模式", "浏览器", "命中次数"])
+        self.stats_tree.setColumnWidth(0, 50)
+        self.stats_tree.setColumnWidth(1, 250)
+        self.stats_tree.setColumnWidth(2, 100)
+        layout.addWidget(self.stats_tree)
+        
+        # 刷新按钮
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.load_stats_to_tree)
+        layout.addWidget(refresh_btn)
+        
+        self.load_stats_to_tree()
+    
+    def load_stats_to_tree(self):
+        """加载运行统计到统计信息标签页"""
+        metrics = self.router_engine.metrics
+        cache_stats = self.router_engine.route_cache.stats()
+        match_latency = metrics.match_latency
+        spawn_latency = metrics.spawn_latency
+        speculated_latency = metrics.keypress_latency[True]
+        cold_latency = metrics.keypress_latency[False]
+        
+        self.stats_label.setText(
+            f"使用默认浏览器（未匹配规则）: {metrics.default_count} 次\n"
+            f"规则匹配耗时: p50 ≤ {match_latency.quantile(0.5) * 1e6:.0f} 微秒，"
+            f"p99 ≤ {match_latency.quantile(0.99) * 1e6:.0f} 微秒，共 {match_latency.count} 次\n"
+            f"启动浏览器耗时: p50 ≤ {spawn_latency.quantile(0.5) * 1000:.1f} 毫秒，"
+            f"p99 ≤ {spawn_latency.quantile(0.99) * 1000:.1f} 毫秒，共 {spawn_latency.count} 次\n"
+            f"合并启动: 打开 {metrics.launched_urls} 个URL，启动 {metrics.spawn_count} 个浏览器进程，"
+            f"节省 {metrics.spawns_saved} 次\n"
+            f"回车到启动浏览器耗时: 已预先路由 p50 ≤ {speculated_latency.quantile(0.5) * 1000:.1f} 毫秒（共 "
+            f"{speculated_latency.count} 次），未预先路由 p50 ≤ {cold_latency.quantile(0.5) * 1000:.1f} 毫秒"
+            f"（共 {cold_latency.count} 次）\n"
+            f"路由缓存: 命中率 {cache_stats['hit_rate']:.1%}，命中 {cache_stats['hits']}，"
+            f"未命中 {cache_stats['misses']}，淘汰 {cache_stats['evictions']}\n"
+            f"统计文件: {METRICS_FILE}"
+        )
+        
+        self.stats_tree.clear()
+        rules_by_id = {rule.get("id"): rule for rule in self.rules}
+        for rule_id, hits in sorted(metrics.rule_hits.items(), key=lambda item: -item[1]):
+            rule = rules_by_id.get(rule_id, {})
             item = QTreeWidgetItem([
-                str(rule["id"]),
-                rule["pattern"],
-                rule["browser"],
-                rule["description"]
+                str(rule_id),
+                rule.get("pattern", ""),
+                metrics.rule_browsers.get(rule_id, ""),
+                str(hits)
             ])
-            self.rules_tree.addTopLevelItem(item)
+            self.stats_tree.addTopLevelItem(item)
+    
+    def get_selected_rule(self):
+        """返回规则列表中选中的规则，没有选中时返回None"""
+        selected_rows = self.rules_view.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        return self.rules_model.rule_at(selected_rows[0].row())
     
     def add_rule(self):
         """添加新规则"""
@@ -1193,6 +1795,11 @@ class TransparentWindow(QMainWindow):
         pattern_edit = QLineEdit()
         layout.addRow("匹配模式:", pattern_edit)
         
+        # 匹配类型
+        type_combo = QComboBox()
+        type_combo.addItems(PatternRuleSet.TYPES)
+        layout.addRow("匹配类型:", type_combo)
+        
         # 浏览器
         browser_combo = QComboBox()
         browser_combo.addItems(RouterEngine.BROWSER_PATHS.keys())
@@ -1218,10 +1825,17 @@ class TransparentWindow(QMainWindow):
             if len(pattern) < 2:
                 QMessageBox.warning(self, "警告", "匹配模式长度不能少于2个字符")
                 return
+            rule_type = type_combo.currentText()
+            try:
+                PatternRuleSet.validate_rule({"pattern": pattern, "type": rule_type})
+            except ValueError as e:
+                QMessageBox.warning(self, "警告", str(e))
+                return
             
             # 检查重复
             for rule in self.rules:
-                if rule["pattern"] == pattern and rule["browser"] == browser_combo.currentText():
+                if rule["pattern"] == pattern and rule["browser"] == browser_combo.currentText() and \
+                        PatternRuleSet.get_type(rule) == rule_type:
                     QMessageBox.warning(self, "警告", "已存在相同的规则")
                     return
             
@@ -1233,25 +1847,21 @@ class TransparentWindow(QMainWindow):
                 "browser": browser_combo.currentText(),
                 "description": description_edit.text().strip()
             }
+            # 子串规则不写type字段，与原有规则格式保持一致
+            if rule_type != "substring":
+                new_rule["type"] = rule_type
             
             self.rules.append(new_rule)
-            self.save_rules(self.rules)
-            self.load_rules_to_tree()
+            self.config_manager.add_rule(new_rule)
+            self.on_rules_added([new_rule])
     
     def edit_rule(self):
         """编辑选中的规则"""
-        selected_items = self.rules_tree.selectedItems()
-        if not selected_items:
+        rule = self.get_selected_rule()
+        if rule is None:
             QMessageBox.warning(self, "警告", "请先选择要编辑的规则")
             return
-        
-        item = selected_items[0]
-        rule_id = int(item.text(0))
-        rule = next((r for r in self.rules if r["id"] == rule_id), None)
-        
-        if not rule:
-            QMessageBox.critical(self, "错误", "未找到选中的规则")
-            return
+        rule_id = rule["id"]
         
         from PyQt5.QtWidgets import QDialog, QFormLayout, QPushButton
         
@@ -1265,6 +1875,12 @@ class TransparentWindow(QMainWindow):
         pattern_edit = QLineEdit(rule["pattern"])
         layout.addRow("匹配模式:", pattern_edit)
         
+        # 匹配类型
+        type_combo = QComboBox()
+        type_combo.addItems(PatternRuleSet.TYPES)
+        type_combo.setCurrentText(PatternRuleSet.get_type(rule))
+        layout.addRow("匹配类型:", type_combo)
+        
         # 浏览器
         browser_combo = QComboBox()
         browser_combo.addItems(RouterEngine.BROWSER_PATHS.keys())
@@ -1291,10 +1907,17 @@ class TransparentWindow(QMainWindow):
             if len(pattern) < 2:
                 QMessageBox.warning(self, "警告", "匹配模式长度不能少于2个字符")
                 return
+            rule_type = type_combo.currentText()
+            try:
+                PatternRuleSet.validate_rule({"pattern": pattern, "type": rule_type})
+            except ValueError as e:
+                QMessageBox.warning(self, "警告", str(e))
+                return
             
             # 检查重复（排除当前规则）
             for r in self.rules:
-                if r["id"] != rule_id and r["pattern"] == pattern and r["browser"] == browser_combo.currentText():
+                if r["id"] != rule_id and r["pattern"] == pattern and r["browser"] == browser_combo.currentText() \
+                        and PatternRuleSet.get_type(r) == rule_type:
                     QMessageBox.warning(self, "警告", "已存在相同的规则")
                     return
             
@@ -1302,29 +1925,33 @@ class TransparentWindow(QMainWindow):
             rule["pattern"] = pattern
             rule["browser"] = browser_combo.currentText()
             rule["description"] = description_edit.text().strip()
+            if rule_type != "substring":
+                rule["type"] = rule_type
+            else:
+                rule.pop("type", None)
             
-            self.save_rules(self.rules)
-            self.load_rules_to_tree()
+            self.config_manager.update_rule(rule)
+            self.rules_version += 1
+            self.rule_analysis_timer.start(self.RULE_ANALYSIS_DELAY)
+            self.on_rule_changed(rule)
     
     def delete_rule(self):
         """删除选中的规则"""
-        selected_items = self.rules_tree.selectedItems()
-        if not selected_items:
+        rule = self.get_selected_rule()
+        if rule is None:
             QMessageBox.warning(self, "警告", "请先选择要删除的规则")
             return
-        
-        item = selected_items[0]
-        rule_id = int(item.text(0))
-        rule = next((r for r in self.rules if r["id"] == rule_id), None)
-        
-        if not rule:
-            QMessageBox.critical(self, "错误", "未找到选中的规则")
-            return
+        rule_id = rule["id"]
         
         if QMessageBox.question(self, "确认", f"确定要删除规则 '{rule['description']}' 吗？") == QMessageBox.Yes:
-            self.rules = [r for r in self.rules if r["id"] != rule_id]
-            self.save_rules(self.rules)
-            self.load_rules_to_tree()
+            # 按对象删除，内容相同的规则不会被误删
+            del self.rules[next(i for i, item in enumerate(self.rules) if item is rule)]
+            self.config_manager.delete_rule(rule_id)
+            self.rules_version += 1
+            self.rule_analysis_timer.start(self.RULE_ANALYSIS_DELAY)
+            if self.rules_search_index is not None:
+                self.rules_search_index.remove_rule(rule)
+            self.rules_model.remove_rule(rule)
     
     def import_rules(self):
         """批量导入规则"""
@@ -1337,7 +1964,7 @@ class TransparentWindow(QMainWindow):
         layout = QVBoxLayout(dialog)
         
         # 说明
-        info_label = QLabel("请输入URL列表，每行一个，然后选择浏览器：")
+        info_label = QLabel("请输入URL列表，每行一个，然后选择浏览器；也可以从文本、CSV或JSONL文件导入：")
         layout.addWidget(info_label)
         
         # 文本编辑区
@@ -1358,23 +1985,24 @@ class TransparentWindow(QMainWindow):
         browser_layout.addStretch()
         layout.addLayout(browser_layout)
         
-        # 导入文件按钮
+        # 导入文件按钮，文件由后台线程流式读取，不再加载到文本框中
         file_btn = QPushButton("从文件导入")
+        file_label = QLabel("CSV列依次为：匹配模式、浏览器、描述、匹配类型；JSONL每行包含pattern、browser、description、type")
+        selected_file = {"path": None}
         
         def import_from_file():
             file_path, _ = QFileDialog.getOpenFileName(
-                self, "选择规则文件", "", "文本文件 (*.txt);;所有文件 (*.*)"
+                self, "选择规则文件", "",
+                "规则文件 (*.txt *.csv *.jsonl *.ndjson);;所有文件 (*.*)"
             )
             if file_path:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        text_edit.setPlainText(content)
-                except Exception as e:
-                    QMessageBox.critical(self, "错误", f"读取文件失败: {e}")
+                selected_file["path"] = file_path
+                file_label.setText(f"已选择文件：{file_path}（未指定浏览器的行使用上面选择的浏览器）")
+                text_edit.setEnabled(False)
         
         file_btn.clicked.connect(import_from_file)
         layout.addWidget(file_btn)
+        layout.addWidget(file_label)
         
         # 按钮
         btn_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -1384,55 +2012,45 @@ class TransparentWindow(QMainWindow):
         
         if dialog.exec_():
             text = text_edit.toPlainText().strip()
-            if not text:
+            if not text and not selected_file["path"]:
                 return
-            
-            # 获取选择的浏览器
-            selected_browser = browser_combo.currentText()
-            
-            # 解析规则
-            lines = text.split('\n')
-            imported_count = 0
-            error_count = 0
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                pattern = line.strip()
-                # 描述使用默认格式
-                description = f"使用{selected_browser}"
-                
-                # 检查重复
-                duplicate = False
-                for rule in self.rules:
-                    if rule["pattern"] == pattern and rule["browser"] == selected_browser:
-                        duplicate = True
-                        break
-                
-                if not duplicate:
-                    # 获取下一个ID，使用ConfigManager的方法
-                    new_id = self.config_manager.get_next_rule_id(self.rules)
-                    
-                    # 添加新规则到内存
-                    new_rule = {
-                        "id": new_id,
-                        "pattern": pattern,
-                        "browser": selected_browser,
-                        "description": description
-                    }
-                    self.rules.append(new_rule)
-                    imported_count += 1
-            
-            # 保存到文件
-            self.save_rules(self.rules)
-            
-            # 刷新规则列表
-            self.load_rules_to_tree()
-            
-            # 显示结果
-            QMessageBox.information(self, "成功", f"批量导入完成：成功 {imported_count} 条，失败 {error_count} 条")
+            self.start_rule_import(browser_combo.currentText(), selected_file["path"], text)
+    
+    def start_rule_import(self, default_browser, file_path=None, text=""):
+        """启动后台导入线程并显示进度"""
+        from PyQt5.QtWidgets import QProgressDialog
+        
+        self.import_progress = QProgressDialog("正在导入规则...", "取消", 0, 100, self)
+        self.import_progress.setWindowTitle("批量导入规则")
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+        
+        self.rule_import_thread = RuleImportThread(
+            self.config_manager, self.rules, default_browser, file_path, text
+        )
+        self.rule_import_thread.progress_changed.connect(self.import_progress.setValue)
+        self.rule_import_thread.chunk_imported.connect(self.on_rule_chunk_imported)
+        self.rule_import_thread.import_finished.connect(self.on_rule_import_finished)
+        self.import_progress.canceled.connect(self.rule_import_thread.requestInterruption)
+        self.rule_import_thread.start()
+    
+    def on_rule_chunk_imported(self, chunk):
+        """一批规则写入规则日志后加入内存中的规则列表"""
+        self.rules.extend(chunk)
+        self.on_rules_added(chunk)
+    
+    def on_rule_import_finished(self, imported_count, duplicate_count, error_count, error_message):
+        """导入线程结束后刷新规则列表并显示结果"""
+        self.import_progress.close()
+        
+        # 显示结果
+        if error_message:
+            QMessageBox.critical(self, "错误", f"批量导入中断: {error_message}\n已导入 {imported_count} 条")
+        else:
+            QMessageBox.information(
+                self, "成功",
+                f"批量导入完成：成功 {imported_count} 条，重复 {duplicate_count} 条，失败 {error_count} 条"
+            )
     
     def save_appearance_settings(self):
         """保存外观设置"""
@@ -1450,9 +2068,6 @@ class TransparentWindow(QMainWindow):
         self.border_thickness = self.border_spin.value()
         self.config['border_thickness'] = self.border_thickness
         
-        # 保存配置
-        self.save_config()
-        
         # 更新UI
         self.resize_widgets()
         
@@ -1474,7 +2089,6 @@ class TransparentWindow(QMainWindow):
         self.config['window_height'] = self.height()
         self.config['window_x'] = x
         self.config['window_y'] = y
-        self.save_config()
         
         QMessageBox.information(self, "成功", "已恢复默认缩放")
     
@@ -1499,13 +2113,34 @@ class TransparentWindow(QMainWindow):
     
     def exit_program(self):
         """退出程序"""
-        # 保存配置
-        self.save_config()
+        # 打开仍在合并窗口中的URL
+        if self.launch_timer.isActive():
+            self.launch_timer.stop()
+            self.flush_launches()
+        # 短暂等待已提交的启动开始执行，挂起的启动不阻止退出
+        self.launch_dispatcher.close(timeout=LaunchDispatcher.CLOSE_TIMEOUT)
+        self.speculative_router.close()
+        print(f"启动调度统计: 超时 {self.launch_dispatcher.timeout_count} 次，"
+              f"挂起过多未启动 {self.launch_dispatcher.refused_count} 次")
+        # 停止配置写入线程并保存尚未写入的配置
+        self.config.close()
+        print(f"配置写入统计: 写入 {self.config.write_count} 次，内容未变化跳过 {self.config.skipped_count} 次")
+        # 合并规则日志，下次启动时只需读取快照
+        self.config_manager.compact_rules(wait=True)
+        print(f"路由缓存统计: {self.router_engine.route_cache.stats()}")
+        metrics = self.router_engine.metrics
+        print(f"合并启动统计: 打开 {metrics.launched_urls} 个URL，启动 {metrics.spawn_count} 个浏览器进程，"
+              f"节省 {metrics.spawns_saved} 次")
+        self.flush_metrics()
         if hasattr(self, 'tray_icon') and self.tray_icon:
             self.tray_icon.hide()
         QApplication.quit()
 
 if __name__ == "__main__":
+    # 已有实例运行时立即退出，由常驻实例继续提供服务
+    if ping_running_instance():
+        sys.exit(0)
+    
     # 防止多个实例运行
     mutex_name = "URLBrowserRuleAdvancedMutex"
     mutex = ctypes.windll.kernel32.CreateMutexW(None, True, mutex_name)
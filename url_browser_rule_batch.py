@@ -0,0 +1,235 @@
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from url_browser_rule_core import (
+    RULES_FILE, PROTOCOL_NAME, ConfigManager, RouterEngine
+)
+
+# 模块说明：
+# 批量路由工具，按当前规则计算大量URL（例如代理日志）会使用哪个浏览器打开
+# 只做规则匹配，不启动任何浏览器；逐行流式处理，内存占用与输入大小无关
+# 用法：python url_browser_rule_batch.py [URL文件 ...] [--rules 规则文件] [--format tsv|jsonl] [--jobs N]
+# 指定--jobs时按字节范围切分输入文件，由多个进程并行处理，结果按原始顺序合并
+
+# 批量路由类
+class BatchRouter:
+    """以流的方式批量计算URL的路由结果"""
+    
+    # 支持的输出格式
+    OUTPUT_FORMATS = ("tsv", "jsonl")
+    
+    def __init__(self, rules, output_format="tsv"):
+        self.rules = rules
+        self.output_format = output_format
+        self.router_engine = RouterEngine()
+        self.router_engine.set_protocol_name(PROTOCOL_NAME)
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """清空统计信息"""
+        self.url_count = 0
+        self.error_count = 0
+        self.browser_counts = {}
+        self.rule_counts = {}
+    
+    def get_stats(self):
+        """返回统计信息"""
+        return {
+            "urls": self.url_count,
+            "errors": self.error_count,
+            "browsers": self.browser_counts,
+            "rules": self.rule_counts
+        }
+    
+    def merge_stats(self, stats):
+        """合并其他进程的统计信息"""
+        self.url_count += stats["urls"]
+        self.error_count += stats["errors"]
+        for browser, count in stats["browsers"].items():
+            self.browser_counts[browser] = self.browser_counts.get(browser, 0) + count
+        for rule_id, count in stats["rules"].items():
+            self.rule_counts[rule_id] = self.rule_counts.get(rule_id, 0) + count
+    
+    def route(self, url):
+        """计算单个URL的路由结果，返回(浏览器, 规则ID)，没有匹配时规则ID为None"""
+        try:
+            matched_rule = self.router_engine.find_rule(url, self.rules)
+        except ValueError:
+            # 无法解析的URL（例如不完整的IPv6地址）与match_rule一样按默认浏览器处理
+            self.error_count += 1
+            matched_rule = None
+        
+        if matched_rule:
+            return matched_rule["browser"], matched_rule.get("id")
+        return "default", None
+    
+    def format_result(self, url, browser, rule_id):
+        """按输出格式生成一行结果"""
+        if self.output_format == "jsonl":
+            return json.dumps({"url": url, "browser": browser, "rule_id": rule_id}, ensure_ascii=False) + "\n"
+        return f"{url}\t{browser}\t{'' if rule_id is None else rule_id}\n"
+    
+    def run(self, lines, output=None):
+        """逐行处理输入，output为None时只统计不输出"""
+        for line in lines:
+            url = line.strip()
+            if not url:
+                continue
+            
+            browser, rule_id = self.route(url)
+            self.url_count += 1
+            self.browser_counts[browser] = self.browser_counts.get(browser, 0) + 1
+            if rule_id is not None:
+                self.rule_counts[rule_id] = self.rule_counts.get(rule_id, 0) + 1
+            
+            if output is not None:
+                output.write(self.format_result(url, browser, rule_id))
+
+# 工作进程中的批量路由对象，每个进程只加载一次规则
+worker_router = None
+
+def init_worker(rules_file, output_format):
+    """工作进程初始化：加载规则并创建批量路由对象"""
+    global worker_router
+    config_manager = ConfigManager()
+    config_manager.rules_file = rules_file
+    worker_router = BatchRouter(config_manager.read_rules(), output_format)
+
+def iter_chunk_lines(path, start, end):
+    """读取字节范围[start, end)内开始的所有行，跨越边界的行归属于它开始的分块"""
+    with open(path, 'rb') as f:
+        if start > 0:
+            # 跳过属于上一个分块的半行
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode('utf-8', errors='replace')
+
+def classify_chunk(task):
+    """在工作进程中处理一个分块，返回统计信息和结果临时文件路径"""
+    path, start, end, temp_dir = task
+    worker_router.reset_stats()
+    
+    temp_path = None
+    if temp_dir is None:
+        worker_router.run(iter_chunk_lines(path, start, end))
+    else:
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n', dir=temp_dir,
+                                         suffix='.part', delete=False) as output:
+            temp_path = output.name
+            worker_router.run(iter_chunk_lines(path, start, end), output)
+    return worker_router.get_stats(), temp_path
+
+def split_chunks(inputs, jobs, chunk_size):
+    """按字节范围把输入文件切分为分块，分块数量至少为进程数的4倍以便均衡负载"""
+    chunks = []
+    for path in inputs:
+        file_size = os.path.getsize(path)
+        size = max(64 * 1024, min(chunk_size, -(-file_size // (jobs * 4))))
+        for start in range(0, file_size, size):
+            chunks.append((path, start, min(start + size, file_size)))
+    return chunks
+
+def run_parallel(batch_router, rules_file, inputs, jobs, chunk_size, output=None):
+    """多进程并行处理输入文件，合并统计信息，并按原始顺序写出结果"""
+    chunks = split_chunks(inputs, jobs, chunk_size)
+    
+    with tempfile.TemporaryDirectory(prefix='url_batch_') as temp_dir:
+        tasks = [(path, start, end, temp_dir if output is not None else None)
+                 for path, start, end in chunks]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(rules_file, batch_router.output_format)) as executor:
+            # map按提交顺序返回结果，逐块合并，临时文件用完即删除
+            for stats, temp_path in executor.map(classify_chunk, tasks):
+                batch_router.merge_stats(stats)
+                if temp_path is not None:
+                    with open(temp_path, 'r', encoding='utf-8', newline='\n') as part:
+                        shutil.copyfileobj(part, output)
+                    os.remove(temp_path)
+
+def iter_input_lines(inputs):
+    """依次读取输入文件的每一行，"-"表示标准输入"""
+    for path in inputs:
+        if path == "-":
+            sys.stdin.reconfigure(encoding='utf-8', errors='replace')
+            yield from sys.stdin
+        else:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                yield from f
+
+def main(argv=None):
+    """批量路由命令行入口，返回进程退出码"""
+    parser = argparse.ArgumentParser(description="按规则批量计算URL的路由结果，不启动浏览器")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="URL文件，每行一个，缺省或-表示标准输入")
+    parser.add_argument("--rules", default=RULES_FILE, help="规则文件路径，默认为应用数据目录中的rules.json")
+    parser.add_argument("--format", choices=BatchRouter.OUTPUT_FORMATS, default="tsv", help="输出格式")
+    parser.add_argument("--output", default="-", help="输出文件，缺省为标准输出")
+    parser.add_argument("--quiet", action="store_true", help="只输出统计信息，不输出每个URL的结果")
+    parser.add_argument("--jobs", type=int, default=1, help="并行进程数，0表示使用全部CPU核心")
+    parser.add_argument("--chunk-size", type=int, default=16, help="并行处理时每个分块的最大大小（MB）")
+    parser.add_argument("--summary", help="把按浏览器和按规则的统计结果写入指定的JSON文件")
+    args = parser.parse_args(argv)
+    
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if jobs > 1 and "-" in args.inputs:
+        # 标准输入无法按字节范围切分，退回单进程处理
+        sys.stderr.write("从标准输入读取时不支持并行处理，使用单进程\n")
+        jobs = 1
+    
+    if not os.path.exists(args.rules):
+        parser.error(f"规则文件不存在: {args.rules}")
+    config_manager = ConfigManager()
+    config_manager.rules_file = args.rules
+    rules = config_manager.read_rules()
+    
+    batch_router = BatchRouter(rules, args.format)
+    start_time = time.perf_counter()
+    
+    def process(output):
+        """按进程数选择单进程或多进程处理"""
+        if jobs > 1:
+            run_parallel(batch_router, args.rules, args.inputs, jobs, args.chunk_size * 1024 * 1024, output)
+        else:
+            batch_router.run(iter_input_lines(args.inputs), output)
+    
+    try:
+        if args.quiet:
+            process(None)
+        elif args.output == "-":
+            sys.stdout.reconfigure(encoding='utf-8', newline='\n')
+            process(sys.stdout)
+            sys.stdout.flush()
+        else:
+            with open(args.output, 'w', encoding='utf-8', newline='\n') as output:
+                process(output)
+    except BrokenPipeError:
+        # 输出被提前关闭（例如通过管道交给head），停止处理
+        sys.stderr.write("输出管道已关闭，提前结束\n")
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    
+    # 统计信息输出到标准错误，不影响结果输出
+    elapsed = time.perf_counter() - start_time
+    rate = batch_router.url_count / elapsed if elapsed > 0 else 0.0
+    sys.stderr.write(
+        f"批量路由完成: {batch_router.url_count} 条URL，耗时 {elapsed:.2f} 秒，"
+        f"吞吐量 {rate:.0f} URL/秒，无法解析 {batch_router.error_count} 条，进程数 {jobs}\n"
+    )
+    for browser, count in sorted(batch_router.browser_counts.items(), key=lambda item: -item[1]):
+        sys.stderr.write(f"  {browser}: {count}\n")
+    
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(batch_router.get_stats(), f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+import sys
+import os
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+from url_browser_rule_core import (
+    FAST_PATH_BUDGET_MS, PROTOCOL_NAME, BrowserPathCache, ConfigManager, RuleMatcher, RuleIndex, RuleOrderOptimizer,
+    RuleSearchIndex, RouterEngine
+)
+
+# 模块说明：
+# 路由引擎基准测试，使用合成的规则集和URL语料测量匹配延迟、规则加载耗时、每条规则的内存、规则搜索延迟、
+# 按命中次数调整规则顺序的效果和模块导入耗时
+# 结果写入JSON文件，比较模式下与保存的基线对比，发现性能回退时以非零退出码结束
+# 用法：python url_browser_rule_bench.py [--sizes 10,1000,100000] [--output bench.json] [--compare baseline.json]
+
+# 默认规则集规模
+DEFAULT_SIZES = (10, 1000, 100000)
+# 小于该值的绝对变化视为噪声，不判定为回退（单位与指标相同）
+NOISE_FLOOR = {"us": 1.0, "ms": 2.0, "bytes": 16.0}
+
+# 基准测试类
+class RouterBenchmark:
+    """生成合成数据并测量路由引擎各项指标，所有指标均为越小越好"""
+    
+    BROWSERS = ("chrome", "firefox", "edge", "safari", "default")
+    
+    def __init__(self, url_count=20000, seed=20240101):
+        self.url_count = url_count
+        self.random = random.Random(seed)
+        self.metrics = {}
+    
+    def make_rules(self, size):
+        """生成规则集：约70%为域名规则，其余为路径或参数中的子串规则"""
+        rules = []
+        for i in range(size):
+            if self.random.random() < 0.7:
+                pattern = f"svc{i}.team{i % 97}.example.com"
+            elif i % 2:
+                pattern = f"/app{i}/"
+            else:
+                pattern = f"token{i}="
+            rules.append({
+                "id": i + 1,
+                "pattern": pattern,
+                "browser": self.BROWSERS[i % len(self.BROWSERS)],
+                "description": f"合成规则{i + 1}"
+            })
+        return rules
+    
+    def make_urls(self, rules):
+        """生成URL语料：一半命中随机规则，一半不命中任何规则"""
+        urls = []
+        for i in range(self.url_count):
+            if rules and i % 2 == 0:
+                pattern = self.random.choice(rules)["pattern"]
+                if pattern.startswith("/"):
+                    url = f"https://portal.example.net{pattern}index.html?page={i}"
+                elif pattern.endswith("="):
+                    url = f"https://login.example.net/auth?{pattern}{i}&next=/home"
+                else:
+                    url = f"https://{pattern}/path/{i}?q=search"
+            else:
+                url = f"https://www.unmatched{i}.example.org/some/long/path/{i}?utm_source=bench"
+            urls.append(f"{PROTOCOL_NAME}://{url.split('://', 1)[1]}" if i % 3 == 0 else url)
+        return urls
+    
+    @staticmethod
+    def percentile(sorted_values, ratio):
+        """计算已排序数据的百分位数"""
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(round(ratio * (len(sorted_values) - 1))))
+        return sorted_values[index]
+    
+    def bench_match(self, prefix, rules, urls):
+        """测量单个URL的匹配延迟（不使用路由缓存）以及命中缓存时的延迟"""
+        router_engine = RouterEngine(cache_size=0)
+        router_engine.set_protocol_name(PROTOCOL_NAME)
+        router_engine.get_rule_matcher(rules)
+        
+        timings = []
+        perf_counter_ns = time.perf_counter_ns
+        for url in urls:
+            start = perf_counter_ns()
+            router_engine.match_rule(url, rules)
+            timings.append((perf_counter_ns() - start) / 1000)
+        timings.sort()
+        self.metrics[f"{prefix}.match_p50_us"] = self.percentile(timings, 0.5)
+        self.metrics[f"{prefix}.match_p99_us"] = self.percentile(timings, 0.99)
+        self.metrics[f"{prefix}.match_mean_us"] = sum(timings) / len(timings)
+        
+        # 命中缓存：重复查询同一批少量URL
+        cached_engine = RouterEngine()
+        cached_engine.set_protocol_name(PROTOCOL_NAME)
+        hot_urls = urls[:100]
+        for url in hot_urls:
+            cached_engine.match_rule(url, rules)
+        start = perf_counter_ns()
+        for _ in range(10):
+            for url in hot_urls:
+                cached_engine.match_rule(url, rules)
+        self.metrics[f"{prefix}.match_cached_mean_us"] = (perf_counter_ns() - start) / 1000 / (10 * len(hot_urls))
+    
+    def bench_load(self, prefix, rules, temp_dir):
+        """测量规则文件读取、编译和二进制索引加载的耗时"""
+        rules_file = os.path.join(temp_dir, f"{prefix}.json")
+        index_file = os.path.join(temp_dir, f"{prefix}.idx")
+        with open(rules_file, 'w', encoding='utf-8') as f:
+            json.dump(rules, f, ensure_ascii=False, indent=2)
+        
+        config_manager = ConfigManager()
+        config_manager.rules_file = rules_file
+        start = time.perf_counter()
+        loaded_rules = config_manager.read_rules()
+        self.metrics[f"{prefix}.read_rules_ms"] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        RuleMatcher(loaded_rules)
+        self.metrics[f"{prefix}.compile_ms"] = (time.perf_counter() - start) * 1000
+        
+        # 首次加载会生成索引，之后测量的是冷启动时的映射加载
+        RuleIndex.load(rules_file, index_file).close()
+        start = time.perf_counter()
+        rule_index = RuleIndex.load(rules_file, index_file)
+        self.metrics[f"{prefix}.index_load_ms"] = (time.perf_counter() - start) * 1000
+        rule_index.close()
+    
+    def bench_memory(self, prefix, rules):
+        """测量编译后匹配器中每条规则平均占用的内存"""
+        tracemalloc.start()
+        matcher = RuleMatcher(rules)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.metrics[f"{prefix}.memory_per_rule_bytes"] = current / max(1, len(rules))
+        del matcher
+    
+    def bench_search(self, prefix, rules):
+        """测量规则搜索索引的建立耗时，以及模拟逐字输入关键词时每次按键的过滤耗时"""
+        start = time.perf_counter()
+        search_index = RuleSearchIndex(rules)
+        self.metrics[f"{prefix}.search_build_ms"] = (time.perf_counter() - start) * 1000
+        
+        queries = [self.random.choice(rules)["pattern"] for _ in range(20)] if rules else []
+        queries += ["example.com", "chrome", "合成规则", "/app1"]
+        timings = []
+        for query in queries:
+            search_index.search("")
+            for length in range(1, len(query) + 1):
+                start = time.perf_counter()
+                search_index.search(query[:length])
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.metrics[f"{prefix}.search_keystroke_p50_ms"] = self.percentile(timings, 0.5)
+        self.metrics[f"{prefix}.search_keystroke_p99_ms"] = self.percentile(timings, 0.99)
+    
+    def bench_ordering(self, rule_count=200):
+        """测量按命中次数调整glob规则尝试顺序前后，每个URL平均尝试的规则数和匹配延迟
+        
+        命中次数按Zipf分布集中在声明靠后的规则上，模拟常用规则排在规则文件底部的情况
+        """
+        rules = [{
+            "id": i + 1,
+            "pattern": f"*.zone{i}.example.com",
+            "type": "glob",
+            "browser": self.BROWSERS[i % len(self.BROWSERS)],
+            "description": f"合成glob规则{i + 1}"
+        } for i in range(rule_count)]
+        weights = [1.0 / (rule_count - i) for i in range(rule_count)]
+        picked = self.random.choices(range(rule_count), weights=weights, k=self.url_count)
+        urls = [f"https://host{i}.zone{order}.example.com/page/{i}" for i, order in enumerate(picked)]
+        # 一部分URL不命中任何规则，需要尝试全部规则
+        urls[::10] = [f"https://www.unmatched{i}.example.org/" for i in range(len(urls[::10]))]
+        
+        # 用前一半URL统计命中次数，在后一半URL上比较
+        hit_counts = {}
+        for order in picked[:len(picked) // 2]:
+            hit_counts[order + 1] = hit_counts.get(order + 1, 0) + 1
+        test_urls = urls[len(urls) // 2:]
+        
+        for name, matcher in (("declared", RuleMatcher(rules)), ("adaptive", RuleMatcher(rules, hit_counts=hit_counts))):
+            comparisons = 0
+            timings = []
+            perf_counter_ns = time.perf_counter_ns
+            for url in test_urls:
+                netloc = url.split("/", 3)[2]
+                start = perf_counter_ns()
+                matched_rule = matcher.match(url, netloc)
+                timings.append((perf_counter_ns() - start) / 1000)
+                order = matched_rule["id"] - 1 if matched_rule else None
+                comparisons += RuleOrderOptimizer.count_comparisons(matcher.pattern_set, order)
+            self.metrics[f"ordering.{name}_comparisons_per_url"] = comparisons / len(test_urls)
+            self.metrics[f"ordering.{name}_match_mean_us"] = sum(timings) / len(timings)
+    
+    def bench_browser_lookup(self, temp_dir):
+        """测量冷启动时查找浏览器路径的耗时（逐个和并行查找全部），以及新进程从持久化缓存读取全部浏览器路径的耗时"""
+        cache_file = os.path.join(temp_dir, "browsers.json")
+        router_engine = RouterEngine(browser_cache=BrowserPathCache(cache_file))
+        for browser_name in router_engine.browser_paths:
+            if browser_name == "default":
+                continue
+            start = time.perf_counter()
+            router_engine.find_browser_path(browser_name)
+            self.metrics[f"browser_lookup.{browser_name}_ms"] = (time.perf_counter() - start) * 1000
+        
+        # 没有缓存时一次并行查找全部浏览器，耗时取决于最慢的一次查找
+        router_engine = RouterEngine()
+        start = time.perf_counter()
+        router_engine.find_browser_paths(router_engine.browser_paths)
+        self.metrics["browser_lookup.all_parallel_ms"] = (time.perf_counter() - start) * 1000
+        
+        # 新的路由引擎相当于新进程，只读取缓存文件
+        router_engine = RouterEngine(browser_cache=BrowserPathCache(cache_file))
+        start = time.perf_counter()
+        for browser_name in router_engine.browser_paths:
+            router_engine.find_browser_path(browser_name)
+        self.metrics["browser_lookup.cached_ms"] = (time.perf_counter() - start) * 1000
+    
+    def bench_startup(self, rules, temp_dir):
+        """在新进程中测量核心模块导入耗时，以及快速路径的导入、索引加载和匹配总耗时"""
+        rules_file = os.path.join(temp_dir, "startup.json")
+        with open(rules_file, 'w', encoding='utf-8') as f:
+            json.dump(rules, f, ensure_ascii=False)
+        RuleIndex.load(rules_file, rules_file + ".idx").close()
+        
+        script = (
+            "import time, json, sys\n"
+            "start = time.perf_counter()\n"
+            "import url_browser_rule_core as core\n"
+            "imported = time.perf_counter()\n"
+            "engine = core.RouterEngine()\n"
+            "engine.set_protocol_name(core.PROTOCOL_NAME)\n"
+            f"engine.set_rule_index(core.RuleIndex.load({rules_file!r}, {rules_file + '.idx'!r}))\n"
+            "engine.match_rule('urlrule://www.example.com/path', None)\n"
+            "done = time.perf_counter()\n"
+            "print(json.dumps({'import_ms': (imported - start) * 1000, 'fast_path_ms': (done - start) * 1000, "
+            "'pyqt_loaded': 'PyQt5' in sys.modules}))\n"
+        )
+        samples = []
+        for _ in range(5):
+            output = subprocess.run(
+                [sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+        self.metrics["startup.core_import_ms"] = min(sample["import_ms"] for sample in samples)
+        self.metrics["startup.fast_path_ms"] = min(sample["fast_path_ms"] for sample in samples)
+        return any(sample["pyqt_loaded"] for sample in samples)
+    
+    def run(self, sizes):
+        """运行全部基准测试，返回(指标, 问题列表)"""
+        problems = []
+        with tempfile.TemporaryDirectory(prefix='url_bench_') as temp_dir:
+            for size in sizes:
+                prefix = f"rules_{size}"
+                rules = self.make_rules(size)
+                urls = self.make_urls(rules)
+                print(f"测试规则集 {size} 条...", file=sys.stderr)
+                self.bench_match(prefix, rules, urls)
+                self.bench_load(prefix, rules, temp_dir)
+                self.bench_memory(prefix, rules)
+                self.bench_search(prefix, rules)
+            
+            self.bench_ordering()
+            self.bench_browser_lookup(temp_dir)
+            if self.bench_startup(self.make_rules(1000), temp_dir):
+                problems.append("快速路径加载了PyQt5")
+        
+        if self.metrics["startup.fast_path_ms"] > FAST_PATH_BUDGET_MS:
+            problems.append(
+                f"快速路径耗时 {self.metrics['startup.fast_path_ms']:.1f} ms 超出目标 {FAST_PATH_BUDGET_MS} ms"
+            )
+        return self.metrics, problems
+
+def compare_metrics(baseline, current, threshold):
+    """与基线比较，返回回退的指标列表[(名称, 基线值, 当前值, 变化比例)]"""
+    regressions = []
+    for name, value in sorted(current.items()):
+        base_value = baseline.get(name)
+        if base_value is None:
+            continue
+        unit = name.rsplit("_", 1)[-1]
+        if value - base_value <= NOISE_FLOOR.get(unit, 0.0):
+            continue
+        change = (value - base_value) / base_value if base_value else float("inf")
+        if change > threshold:
+            regressions.append((name, base_value, value, change))
+    return regressions
+
+def main(argv=None):
+    """基准测试命令行入口，返回进程退出码"""
+    parser = argparse.ArgumentParser(description="路由引擎基准测试")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="规则集规模，逗号分隔")
+    parser.add_argument("--urls", type=int, default=20000, help="每个规则集使用的URL数量")
+    parser.add_argument("--output", default="bench_output.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="与指定的基线JSON文件比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为回退的变化比例，默认20%%")
+    args = parser.parse_args(argv)
+    
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    metrics, problems = RouterBenchmark(args.urls).run(sizes)
+    
+    result = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sizes": sizes,
+            "urls": args.urls
+        },
+        "metrics": metrics
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    
+    for name, value in sorted(metrics.items()):
+        print(f"{name:45s} {value:12.2f}")
+    print(f"结果已保存到 {args.output}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare_metrics(baseline, metrics, args.threshold)
+        for name, base_value, value, change in regressions:
+            problems.append(f"性能回退 {name}: {base_value:.2f} -> {value:.2f} (+{change:.0%})")
+        if not regressions:
+            print(f"与基线 {args.compare} 相比没有超过 {args.threshold:.0%} 的回退")
+    
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3355 @@
+import sys
+import os
+import json
+import subprocess
+from urllib.parse import urlparse
+import time
+import shutil
+import csv
+import re
+import webbrowser
+import socket
+import mmap
+import struct
+import hashlib
+import threading
+import queue
+from array import array
+from bisect import bisect_left, insort
+from itertools import chain, compress, filterfalse, repeat
+from collections import OrderedDict
+from functools import lru_cache
+
+try:
+    # Python 3.11起正则表达式解析器移入re包内部
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# 进程启动时间，在加载其他模块之前记录，用于统计从点击链接到打开浏览器的耗时
+PROCESS_START_TIME = time.time()
+
+try:
+    # 注册表只在Windows上可用，其他系统跳过注册表查找
+    import winreg
+except ImportError:
+    winreg = None
+
+# 模块说明：
+# 路由核心，负责规则读写、规则匹配、浏览器查找和启动，不依赖PyQt5
+# 图形界面和命令行快速路径共用本模块，带URL参数启动时只加载本模块即可完成路由
+
+# 配置文件路径
+# 获取用户应用数据目录，确保配置文件持久保存
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), "AppData", "Local", "URLBrowserRule")
+# 确保目录存在
+os.makedirs(APP_DATA_DIR, exist_ok=True)
+
+# 使用应用数据目录保存配置文件
+RULES_FILE = os.path.join(APP_DATA_DIR, 'rules.json')
+CONFIG_FILE = os.path.join(APP_DATA_DIR, 'config.json')
+# 规则二进制索引，由rules.json编译生成，供冷启动时直接映射查询
+RULE_INDEX_FILE = os.path.join(APP_DATA_DIR, 'rules.idx')
+# 浏览器路径缓存，记录查找到的浏览器路径和文件状态，供各个进程直接使用
+BROWSER_CACHE_FILE = os.path.join(APP_DATA_DIR, 'browsers.json')
+# 运行统计，Prometheus文本文件格式（可由node_exporter的textfile采集器读取）
+METRICS_FILE = os.path.join(APP_DATA_DIR, 'url_browser_rule.prom')
+
+# 单实例通信端点：Windows使用当前用户的命名管道，其他系统使用应用数据目录下的本地套接字
+INSTANCE_SERVER_NAME = f"URLBrowserRuleAdvanced-{os.path.basename(os.path.expanduser('~'))}"
+if sys.platform == "win32":
+    INSTANCE_ENDPOINT = INSTANCE_SERVER_NAME
+else:
+    INSTANCE_ENDPOINT = os.path.join(APP_DATA_DIR, 'instance.sock')
+
+# URL协议名称
+PROTOCOL_NAME = "urlrule"
+# 命令行快速路径的耗时目标（毫秒），从进程启动到浏览器进程创建完成，由基准测试检查，运行时不做限制
+FAST_PATH_BUDGET_MS = 150
+
+def forward_to_running_instance(url, timeout=0.5):
+    """把URL转发给已运行的实例处理，成功返回True"""
+    # 附带进程启动时间，便于常驻实例统计点击到启动的耗时
+    return send_instance_message({"url": url, "started_at": PROCESS_START_TIME}, timeout)
+
+def ping_running_instance(timeout=0.5):
+    """检查是否已有实例在运行，需要在timeout内收到常驻实例的确认，残留的套接字或无响应的实例视为未运行"""
+    return send_instance_message({"ping": True}, timeout, wait_ack=True)
+
+def send_instance_message(payload, timeout=0.5, wait_ack=False):
+    """向已运行的实例发送一条消息，成功返回True；wait_ack为True时还需收到实例回复的确认消息"""
+    # 每条消息一行JSON
+    message = encode_instance_message(payload)
+    try:
+        if sys.platform == "win32":
+            # QLocalServer在Windows上监听同名的命名管道
+            with open(rf"\\.\pipe\{INSTANCE_ENDPOINT}", 'r+b' if wait_ack else 'wb', buffering=0) as pipe:
+                pipe.write(message)
+                # 命名管道的读取不支持超时，在守护线程中等待确认，超时后关闭管道
+                return not wait_ack or wait_instance_ack(pipe.read, timeout)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(INSTANCE_ENDPOINT)
+            client.sendall(message)
+            return not wait_ack or wait_instance_ack(client.recv)
+    except OSError:
+        return False
+
+def encode_instance_message(payload):
+    """把消息编码为一行UTF-8 JSON"""
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8')
+
+def wait_instance_ack(read, timeout=None):
+    """读取实例的回复直到收到确认消息，连接关闭或超时返回False；timeout不为None时在守护线程中读取"""
+    if timeout is not None:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(wait_instance_ack(read)), daemon=True)
+        thread.start()
+        thread.join(timeout)
+        return bool(result and result[0])
+    reader = InstanceMessageReader()
+    while True:
+        data = read(4096)
+        if not data:
+            return False
+        if any(message.get("ack") for message in reader.feed(data)):
+            return True
+
+# 单实例消息读取类
+class InstanceMessageReader:
+    """单实例连接上的消息分帧：每条消息一行JSON，数据可能在任意字节处被拆分到多次读取中
+    
+    不依赖Qt，常驻实例和发送方共用；无效的JSON和不是对象的消息会被跳过
+    """
+    
+    def __init__(self):
+        self.buffer = b""
+    
+    def feed(self, data):
+        """加入新读到的数据，返回其中完整的消息列表，不完整的最后一行留到下次读取"""
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()
+        return self.parse_lines(lines)
+    
+    def finish(self):
+        """连接关闭时处理缓冲区中没有换行结尾的最后一条消息"""
+        lines = [self.buffer]
+        self.buffer = b""
+        return self.parse_lines(lines)
+    
+    @staticmethod
+    def parse_lines(lines):
+        """解析多行消息，跳过空行、无效的JSON和不是对象的消息"""
+        messages = []
+        for line in lines:
+            # 按行拆分后再解码，拆开的多字节字符不会被替换为乱码
+            line = line.decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                print(f"解析转发消息失败: {e}")
+                continue
+            if not isinstance(message, dict):
+                print(f"忽略无效的转发消息: {line[:100]}")
+                continue
+            messages.append(message)
+        return messages
+
+# 配置管理器类
+class ConfigManager:
+    """负责配置文件和规则文件的读写管理"""
+    
+    # 默认规则
+    DEFAULT_RULES = [
+        {
+            "id": 1,
+            "pattern": "google.com",
+            "browser": "chrome",
+            "description": "Google使用Chrome"
+        },
+        {
+            "id": 2,
+            "pattern": "bing.com",
+            "browser": "firefox",
+            "description": "Bing使用Firefox"
+        },
+        {
+            "id": 3,
+            "pattern": "edge.microsoft.com",
+            "browser": "edge",
+            "description": "Edge官网使用Edge"
+        }
+    ]
+    
+    # 默认配置
+    DEFAULT_CONFIG = {
+        "auto_start": False,
+        "lock_position": False,
+        "lock_size": False,
+        "lock_ratio": True,
+        "window_x": 100,
+        "window_y": 100,
+        "window_width": 500,
+        "window_height": 100,
+        "font_size": 12,
+        "font_family": "Arial",
+        "opacity": 0.8,
+        "border_thickness": 2,
+        "scale_factor": 1.0,
+        "route_cache_size": 1024,
+        "launch_batch_window_ms": 150,
+        "speculative_routing": False
+    }
+    
+    # 规则集版本号，每次保存规则或追加规则日志后递增，用于让编译后的匹配器和路由缓存失效
+    rules_generation = 0
+    
+    # 规则日志累计的操作数达到该值时在后台压缩为新的快照
+    JOURNAL_COMPACT_THRESHOLD = 500
+    # 每个文件保留的本进程写入记录数
+    OWN_WRITE_LIMIT = 64
+    
+    def __init__(self):
+        self.rules_file = RULES_FILE
+        self.config_file = CONFIG_FILE
+        self.default_rules = self.DEFAULT_RULES
+        self.default_config = self.DEFAULT_CONFIG
+        
+        # 规则日志状态：追加和压缩共用一把锁，快照版本号用于丢弃过期的压缩结果
+        self.rules_lock = threading.Lock()
+        self.journal_ops = 0
+        self.snapshot_version = 0
+        self.compact_thread = None
+        # 本进程写入文件前后的状态：路径 -> {写入前状态: 写入后状态}，文件监视据此区分自己的写入和外部修改
+        self.own_writes = {}
+    
+    @property
+    def journal_file(self):
+        """规则日志文件路径，与规则快照放在同一目录"""
+        return self.get_journal_file(self.rules_file)
+    
+    @staticmethod
+    def get_journal_file(rules_file):
+        """根据规则快照路径得到规则日志路径，例如rules.json对应rules.journal"""
+        return os.path.splitext(rules_file)[0] + ".journal"
+    
+    @staticmethod
+    def get_file_stamp(path):
+        """返回文件的(修改时间, 大小)，文件不存在时返回None，用于判断文件是否被修改"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def record_write(self, path, before):
+        """记录本进程写入文件前后的状态，before为写入前的状态"""
+        writes = self.own_writes.setdefault(path, OrderedDict())
+        writes[before] = self.get_file_stamp(path)
+        if len(writes) > self.OWN_WRITE_LIMIT:
+            writes.popitem(last=False)
+    
+    def follow_own_writes(self, path, stamp):
+        """从文件状态stamp开始沿本进程的写入记录前进，返回只经过本进程写入能到达的最新状态
+        
+        其他程序修改过文件时记录在中途断开，返回的状态与文件的当前状态不同
+        """
+        writes = self.own_writes.get(path, {})
+        seen = set()
+        while stamp in writes and stamp not in seen:
+            seen.add(stamp)
+            stamp = writes[stamp]
+        return stamp
+    
+    @staticmethod
+    def replay_journal(rules, lines):
+        """在规则快照上按顺序重放日志操作，返回(规则列表, 操作数)
+        
+        操作按规则ID幂等：add/update替换同ID的规则（不存在时追加到末尾），delete删除同ID的规则，
+        因此压缩写完快照、清理日志之前崩溃时，重复重放已合并的操作不会改变结果
+        """
+        rules = list(rules)
+        positions = {rule.get("id"): i for i, rule in enumerate(rules) if isinstance(rule, dict)}
+        op_count = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                op = json.loads(line)
+                action = op["op"]
+                if action in ("add", "update"):
+                    rule = op["rule"]
+                    if not isinstance(rule, dict):
+                        raise TypeError("规则不是对象")
+                elif action != "delete":
+                    raise ValueError(f"未知的操作: {action}")
+            except (ValueError, KeyError, TypeError):
+                # 写入过程中崩溃只会留下不完整的最后一行，缺少字段的记录同样逐条跳过，不影响其他操作
+                print("跳过损坏的规则日志记录")
+                continue
+            
+            if action in ("add", "update"):
+                index = positions.get(rule.get("id"))
+                if index is None:
+                    positions[rule.get("id")] = len(rules)
+                    rules.append(rule)
+                else:
+                    rules[index] = rule
+            elif action == "delete":
+                index = positions.pop(op.get("id"), None)
+                if index is not None:
+                    rules[index] = None
+            op_count += 1
+        return [rule for rule in rules if rule is not None], op_count
+    
+    @staticmethod
+    def diff_rules(old_rules, new_rules):
+        """按规则ID比较两个规则列表，返回(合并后的规则列表, 新增, 删除, 修改[(旧规则, 新规则)], 顺序是否变化)
+        
+        合并后的规则列表按新列表的顺序排列，未变化的规则沿用旧的规则对象，
+        这样缓存和界面中引用的规则对象不受影响；没有ID的规则视为整体删除后重新添加
+        """
+        old_by_id = {rule.get("id"): rule for rule in old_rules if isinstance(rule, dict)}
+        new_ids = set()
+        merged, added, changed = [], [], []
+        for rule in new_rules:
+            if not isinstance(rule, dict):
+                continue
+            rule_id = rule.get("id")
+            new_ids.add(rule_id)
+            old_rule = old_by_id.get(rule_id) if rule_id is not None else None
+            if old_rule is None:
+                added.append(rule)
+                merged.append(rule)
+            elif old_rule == rule:
+                merged.append(old_rule)
+            else:
+                changed.append((old_rule, rule))
+                merged.append(rule)
+        removed = [rule for rule in old_rules if isinstance(rule, dict) and
+                   (rule.get("id") is None or rule.get("id") not in new_ids)]
+        
+        # 保留下来的规则相对顺序不变、新增规则都在末尾时，界面和索引可以增量更新
+        removed_ids = {id(rule) for rule in removed}
+        expected = [rule.get("id") for rule in old_rules if isinstance(rule, dict) and id(rule) not in removed_ids]
+        expected.extend(rule.get("id") for rule in added)
+        reordered = expected != [rule.get("id") for rule in merged]
+        return merged, added, removed, changed, reordered
+    
+    def load_config(self):
+        """读取配置文件，文件不存在或解析失败时抛出异常"""
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError("配置文件格式错误")
+        return config
+    
+    def read_config(self):
+        """从文件读取配置"""
+        try:
+            if os.path.exists(self.config_file):
+                return self.load_config()
+            # 保存默认配置
+            self.save_config(self.default_config)
+            return self.default_config
+        except Exception as e:
+            print(f"读取配置失败: {e}")
+            return self.default_config
+    
+    def save_config(self, config):
+        """保存配置到文件"""
+        return self.write_config_text(json.dumps(config, ensure_ascii=False, indent=2))
+    
+    def write_config_text(self, text):
+        """把序列化后的配置先写入临时文件再原子替换配置文件，返回是否成功"""
+        temp_file = f"{self.config_file}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(text)
+            before = self.get_file_stamp(self.config_file)
+            os.replace(temp_file, self.config_file)
+            self.record_write(self.config_file, before)
+            return True
+        except Exception as e:
+            print(f"保存配置失败: {e}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
+    
+    def read_journal_lines(self, limit=None):
+        """读取规则日志的前limit个字节并按行拆分，日志不存在时返回空列表"""
+        try:
+            with open(self.journal_file, 'rb') as f:
+                data = f.read() if limit is None else f.read(limit)
+        except FileNotFoundError:
+            return []
+        return data.decode('utf-8', errors='replace').splitlines()
+    
+    def load_rules(self):
+        """读取规则快照并重放规则日志，文件不存在或解析失败时抛出异常"""
+        with open(self.rules_file, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        if not isinstance(rules, list):
+            raise ValueError("规则文件格式错误")
+        rules, self.journal_ops = self.replay_journal(rules, self.read_journal_lines())
+        return rules
+    
+    def read_rules(self):
+        """从文件读取规则：加载最近的快照，再重放规则日志中的操作"""
+        try:
+            if os.path.exists(self.rules_file):
+                return self.load_rules()
+            # 保存默认规则
+            self.save_rules(self.default_rules)
+            return self.default_rules
+        except Exception as e:
+            print(f"读取规则失败: {e}")
+            return self.default_rules
+    
+    def write_snapshot(self, rules, temp_file):
+        """把完整规则写入临时文件并刷新到磁盘，由调用者原子替换为快照"""
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(rules, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def save_rules(self, rules):
+        """保存完整规则为新的快照并清空规则日志，用于批量修改"""
+        temp_file = f"{self.rules_file}.{os.getpid()}.tmp"
+        try:
+            self.write_snapshot(rules, temp_file)
+            with self.rules_lock:
+                before = self.get_file_stamp(self.rules_file), self.get_file_stamp(self.journal_file)
+                os.replace(temp_file, self.rules_file)
+                if os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+                self.record_write(self.rules_file, before[0])
+                self.record_write(self.journal_file, before[1])
+                self.journal_ops = 0
+                # 正在进行的压缩基于旧快照，让它放弃结果
+                self.snapshot_version += 1
+            ConfigManager.rules_generation += 1
+            return True
+        except Exception as e:
+            print(f"保存规则失败: {e}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
+    
+    def append_rule_op(self, op):
+        """追加一条规则日志记录，写入量与规则总数无关"""
+        return self.append_rule_ops([op])
+    
+    def append_rule_ops(self, ops, compact=True):
+        """一次写入并刷新多条规则日志记录，compact为False时由调用者在结束后自行压缩"""
+        data = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode('utf-8')
+        try:
+            with self.rules_lock:
+                before = self.get_file_stamp(self.journal_file)
+                with open(self.journal_file, 'a+b') as f:
+                    # 上次写入中途崩溃留下的不完整行先补上换行，避免与新记录连在一起
+                    if f.seek(0, os.SEEK_END):
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            data = b"\n" + data
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.record_write(self.journal_file, before)
+                self.journal_ops += len(ops)
+            ConfigManager.rules_generation += 1
+        except Exception as e:
+            print(f"保存规则失败: {e}")
+            return False
+        
+        if compact and self.journal_ops >= self.JOURNAL_COMPACT_THRESHOLD:
+            self.compact_rules()
+        return True
+    
+    def add_rule(self, rule):
+        """添加单条规则"""
+        return self.append_rule_op({"op": "add", "rule": rule})
+    
+    def update_rule(self, rule):
+        """按ID更新单条规则"""
+        return self.append_rule_op({"op": "update", "rule": rule})
+    
+    def delete_rule(self, rule_id):
+        """按ID删除单条规则"""
+        return self.append_rule_op({"op": "delete", "id": rule_id})
+    
+    def compact_rules(self, wait=False):
+        """在后台线程中把快照和规则日志合并为新的快照，wait为True时等待压缩完成"""
+        if wait and self.compact_thread is not None:
+            # 等待正在进行的压缩结束，再合并它开始之后追加的记录
+            self.compact_thread.join()
+        
+        with self.rules_lock:
+            if self.compact_thread is None or not self.compact_thread.is_alive():
+                try:
+                    journal_size = os.path.getsize(self.journal_file)
+                except OSError:
+                    journal_size = 0
+                if journal_size:
+                    self.compact_thread = threading.Thread(
+                        target=self.run_compaction, args=(journal_size, self.snapshot_version),
+                        name="RulesCompaction"
+                    )
+                    self.compact_thread.start()
+            compact_thread = self.compact_thread
+        
+        if wait and compact_thread is not None:
+            compact_thread.join()
+    
+    def run_compaction(self, journal_size, snapshot_version):
+        """合并快照和日志的前journal_size个字节，压缩期间追加的记录保留在新日志中"""
+        temp_file = f"{self.rules_file}.{os.getpid()}.compact.tmp"
+        journal_temp_file = f"{self.journal_file}.{os.getpid()}.tmp"
+        try:
+            # 1. 在锁外读取并合并，不阻塞界面线程追加日志
+            with open(self.rules_file, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+            rules, _ = self.replay_journal(rules, self.read_journal_lines(journal_size))
+            self.write_snapshot(rules, temp_file)
+            
+            with self.rules_lock:
+                # 2. 压缩期间整体保存过规则时，当前结果已经过期
+                if self.snapshot_version != snapshot_version:
+                    os.remove(temp_file)
+                    return
+                
+                # 3. 先原子替换快照，再把压缩期间新追加的记录写入新日志并替换旧日志
+                before = self.get_file_stamp(self.rules_file), self.get_file_stamp(self.journal_file)
+                os.replace(temp_file, self.rules_file)
+                with open(self.journal_file, 'rb') as f:
+                    f.seek(journal_size)
+                    remaining = f.read()
+                with open(journal_temp_file, 'wb') as f:
+                    f.write(remaining)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(journal_temp_file, self.journal_file)
+                self.record_write(self.rules_file, before[0])
+                self.record_write(self.journal_file, before[1])
+                self.journal_ops = len(remaining.splitlines())
+                self.snapshot_version += 1
+        except Exception as e:
+            print(f"压缩规则日志失败: {e}")
+            for path in (temp_file, journal_temp_file):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def get_next_rule_id(self, rules):
+        """获取下一个可用的规则ID"""
+        if not rules:
+            return 1
+        return max(rule["id"] for rule in rules) + 1
+
+# 配置存储类
+class ConfigStore:
+    """内存中的应用配置，由后台写入线程合并短时间内的多次修改后写入配置文件
+    
+    支持字典式读写（config["key"]、config.get），取值按默认配置的类型转换，缺少的配置项使用默认值；
+    修改配置只更新内存并记录修改过的配置项，序列化结果与文件内容相同时跳过写入，界面线程不进行磁盘读写
+    """
+    
+    # 第一次修改后等待的时间（秒），期间的修改合并为一次写入
+    WRITE_DELAY = 0.5
+    
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+        self.defaults = config_manager.default_config
+        self.values = {key: self.coerce(key, value) for key, value in config_manager.read_config().items()}
+        self.dirty_keys = set()
+        # 最近一次读取或写入配置文件的内容
+        self.saved_values = dict(self.values)
+        self.saved_text = self.serialize(self.values)
+        self.write_count = 0
+        self.skipped_count = 0
+        
+        # 修改配置和写入线程共用一把锁，写入文件在锁外进行
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.closed = False
+        self.writer_thread = threading.Thread(target=self.run_writer, name="ConfigWriter", daemon=True)
+        self.writer_thread.start()
+    
+    @staticmethod
+    def serialize(values):
+        """配置的序列化结果，与写入文件的内容一致"""
+        return json.dumps(values, ensure_ascii=False, indent=2)
+    
+    def coerce(self, key, value):
+        """按默认配置的类型转换配置值，无法转换时使用默认值"""
+        default = self.defaults.get(key)
+        try:
+            if isinstance(default, bool):
+                return value if isinstance(value, bool) else bool(value)
+            if isinstance(default, int):
+                return int(value)
+            if isinstance(default, float):
+                return float(value)
+        except (TypeError, ValueError):
+            return default
+        return value
+    
+    def __getitem__(self, key):
+        if key in self.values:
+            return self.values[key]
+        return self.defaults[key]
+    
+    def __setitem__(self, key, value):
+        self.set(key, value)
+    
+    def __contains__(self, key):
+        return key in self.values or key in self.defaults
+    
+    def get(self, key, default=None):
+        """读取配置项，不存在时返回default"""
+        if key in self.values:
+            return self.values[key]
+        return self.defaults.get(key, default)
+    
+    def set(self, key, value):
+        """修改配置项，值有变化时通知写入线程"""
+        value = self.coerce(key, value)
+        with self.condition:
+            if key in self.values and self.values[key] == value:
+                return
+            self.values[key] = value
+            self.dirty_keys.add(key)
+            self.condition.notify()
+    
+    def update(self, values):
+        """批量修改配置项"""
+        for key, value in values.items():
+            self.set(key, value)
+    
+    def apply_external(self, config):
+        """合并被外部修改的配置文件内容，返回与最近一次读写内容不同的配置项"""
+        with self.condition:
+            changed_keys = {key for key in config if config[key] != self.saved_values.get(key)}
+            self.saved_values = dict(config)
+            self.saved_text = self.serialize(config)
+            for key in changed_keys:
+                self.values[key] = self.coerce(key, config[key])
+                self.dirty_keys.discard(key)
+        return changed_keys
+    
+    def run_writer(self):
+        """写入线程：等待配置修改，合并WRITE_DELAY内的后续修改后写入文件"""
+        while True:
+            with self.condition:
+                while not self.dirty_keys and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                # 拖动窗口等连续操作会不断修改配置，等待一段时间后一起写入
+                if self.condition.wait_for(lambda: self.closed, self.WRITE_DELAY):
+                    return
+            self.flush()
+    
+    def flush(self, force=False):
+        """把修改过的配置写入文件，force为True时只要内容与文件不同就写入，返回是否写入"""
+        with self.write_lock:
+            with self.condition:
+                if not self.dirty_keys and not force:
+                    return False
+                values = dict(self.values)
+                self.dirty_keys.clear()
+                text = self.serialize(values)
+                if text == self.saved_text:
+                    self.skipped_count += 1
+                    return False
+                # 写入前记录文件内容，热加载读到本次写入时不会当作外部修改
+                previous = self.saved_values, self.saved_text
+                self.saved_values, self.saved_text = values, text
+            
+            if self.config_manager.write_config_text(text):
+                self.write_count += 1
+                return True
+            with self.condition:
+                if self.saved_text == text:
+                    self.saved_values, self.saved_text = previous
+            return False
+    
+    def close(self):
+        """停止写入线程并同步写入尚未保存的配置，程序退出时调用"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.writer_thread.join()
+        self.flush(force=True)
+
+# 规则导入类
+class RuleImporter:
+    """流式解析规则文件并去重，支持纯文本（每行一个匹配模式）、CSV和JSONL格式
+    
+    CSV的列依次为匹配模式、浏览器、描述、匹配类型，第一行包含pattern时按表头取列；
+    JSONL每行一个包含pattern、browser、description、type的对象。缺少浏览器时使用默认浏览器，
+    缺少匹配类型时按子串匹配
+    """
+    
+    # 支持的输入格式
+    FORMATS = ("text", "csv", "jsonl")
+    # 每批提交的规则数量
+    CHUNK_SIZE = 5000
+    # CSV表头和JSONL对象中的字段
+    FIELDS = ("pattern", "browser", "description", "type")
+    
+    def __init__(self, rules, default_browser="chrome", next_id=None, browsers=None):
+        self.default_browser = default_browser
+        self.browsers = set(browsers if browsers is not None else RouterEngine.BROWSER_PATHS)
+        # 已有规则的(匹配模式, 浏览器, 匹配类型)集合，查重只需一次哈希查找
+        self.seen = {(rule.get("pattern"), rule.get("browser"), PatternRuleSet.get_type(rule))
+                     for rule in rules if isinstance(rule, dict)}
+        # 规则ID使用递增计数器，不再每条规则都求一次最大值
+        if next_id is None:
+            next_id = max((rule.get("id", 0) for rule in rules if isinstance(rule, dict)), default=0) + 1
+        self.next_id = next_id
+        self.bytes_read = 0
+        self.imported_count = 0
+        self.duplicate_count = 0
+        self.error_count = 0
+    
+    @staticmethod
+    def detect_format(path, first_line=""):
+        """根据扩展名或第一行内容判断输入格式"""
+        extension = os.path.splitext(path)[1].lower() if path else ""
+        if extension == ".csv":
+            return "csv"
+        if extension in (".jsonl", ".ndjson"):
+            return "jsonl"
+        if first_line.lstrip("\ufeff \t").startswith("{"):
+            return "jsonl"
+        return "text"
+    
+    def iter_file_lines(self, path):
+        """逐行读取文件，同时记录已读取的字节数用于显示进度"""
+        self.bytes_read = 0
+        with open(path, 'rb') as f:
+            for raw_line in f:
+                self.bytes_read += len(raw_line)
+                yield raw_line.decode('utf-8-sig' if self.bytes_read == len(raw_line) else 'utf-8',
+                                      errors='replace')
+    
+    def iter_rows(self, lines, input_format):
+        """把输入行解析为(匹配模式, 浏览器, 描述, 匹配类型)，无法解析的行返回None"""
+        if input_format == "csv":
+            columns = None
+            for row in csv.reader(lines):
+                if not row or not any(cell.strip() for cell in row):
+                    continue
+                if columns is None:
+                    # 第一行为表头时按列名取值
+                    header = [cell.strip().lower() for cell in row]
+                    columns = {name: header.index(name) for name in self.FIELDS
+                               if name in header} if "pattern" in header else {}
+                    if columns:
+                        continue
+                if columns:
+                    yield tuple(row[columns[name]] if name in columns and columns[name] < len(row) else ""
+                                for name in self.FIELDS)
+                else:
+                    yield tuple((row + ["", "", ""])[:4])
+        elif input_format == "jsonl":
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                    yield (item["pattern"], item.get("browser") or "", item.get("description") or "",
+                           item.get("type") or "")
+                except (ValueError, KeyError, TypeError):
+                    yield None
+        else:
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield line, "", "", ""
+    
+    def make_rule(self, row):
+        """校验一行并创建新规则，重复或无效时返回None"""
+        if row is None or not isinstance(row[0], str):
+            self.error_count += 1
+            return None
+        
+        pattern = row[0].strip()
+        browser = str(row[1]).strip() or self.default_browser
+        rule_type = str(row[3]).strip().lower() or "substring"
+        if not pattern or browser not in self.browsers:
+            self.error_count += 1
+            return None
+        try:
+            PatternRuleSet.validate_rule({"pattern": pattern, "type": rule_type})
+        except ValueError:
+            self.error_count += 1
+            return None
+        
+        key = (pattern, browser, rule_type)
+        if key in self.seen:
+            self.duplicate_count += 1
+            return None
+        self.seen.add(key)
+        
+        rule = {
+            "id": self.next_id,
+            "pattern": pattern,
+            "browser": browser,
+            "description": str(row[2]).strip() or f"使用{browser}"
+        }
+        if rule_type != "substring":
+            rule["type"] = rule_type
+        self.next_id += 1
+        self.imported_count += 1
+        return rule
+    
+    def iter_chunks(self, lines, input_format="text", chunk_size=None):
+        """逐批生成新规则，每批最多chunk_size条"""
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        chunk = []
+        for row in self.iter_rows(lines, input_format):
+            rule = self.make_rule(row)
+            if rule is None:
+                continue
+            chunk.append(rule)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+# 规则搜索索引类
+class RuleSearchIndex:
+    """规则管理界面的增量搜索索引，按匹配模式、浏览器和描述过滤规则
+    
+    规则文本切分为词（连续的字母和数字，中文等其他文字每个字为一个词），索引保存每个词和每个词的
+    前几个字符（短前缀）所在的规则位置，以及排好序的词表。关键词需要从词首开始匹配，例如google可以
+    找到mail.google.com，oogle则不能；查询时短前缀直接查表，较长的前缀在词表中二分查找，
+    关键词由多个词组成时再在候选规则的文本上校验
+    """
+    
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[^\W_a-z0-9]")
+    # 单独建立倒排表的前缀最大长度，输入前几个字符时匹配的词最多，直接查表避免合并大量倒排表
+    SHORT_PREFIX = 3
+    # 用正则表达式校验一条规则文本的代价，约为复制一个倒排表元素的倍数
+    VERIFY_COST = 4
+    # 每次搜索先校验出的结果数，与界面表格每批加载的行数一致
+    PAGE_SIZE = 1000
+    
+    def __init__(self, rules=()):
+        self.build(rules)
+    
+    @staticmethod
+    def get_text(rule):
+        """规则的搜索文本（小写），字段之间用换行分隔，关键词不会跨字段匹配"""
+        return f"{rule.get('pattern', '')}\n{rule.get('browser', '')}\n{rule.get('description', '')}".lower()
+    
+    def get_keys(self, text):
+        """返回文本中的词集合和短前缀集合"""
+        tokens = set(self.TOKEN_PATTERN.findall(text))
+        prefixes = {token[:length] for token in tokens for length in range(1, min(len(token), self.SHORT_PREFIX) + 1)}
+        return tokens, prefixes
+    
+    def build(self, rules):
+        """重新建立索引，规则位置即规则在列表中的顺序"""
+        self.rules = [rule for rule in rules if isinstance(rule, dict)]
+        self.texts = [self.get_text(rule) for rule in self.rules]
+        self.slot_of = {rule.get("id"): slot for slot, rule in enumerate(self.rules)}
+        # 修改或删除过的规则位置，这些位置在倒排表中可能残留过期的词，查询时需要校验
+        self.dirty = set()
+        self.last_query = None
+        self.last_result = None
+        
+        self.postings = {}
+        self.prefix_postings = {}
+        for slot, text in enumerate(self.texts):
+            self.append_keys(slot, *self.get_keys(text))
+        self.tokens = sorted(self.postings)
+    
+    def append_keys(self, slot, tokens, prefixes):
+        """把新规则位置追加到倒排表末尾，新出现的词返回给调用者加入词表"""
+        new_tokens = []
+        for key_postings, keys in ((self.postings, tokens), (self.prefix_postings, prefixes)):
+            for key in keys:
+                posting = key_postings.get(key)
+                if posting is None:
+                    key_postings[key] = [slot]
+                    if key_postings is self.postings:
+                        new_tokens.append(key)
+                else:
+                    posting.append(slot)
+        return new_tokens
+    
+    def insert_keys(self, slot, tokens, prefixes):
+        """把已有规则位置按顺序插入倒排表"""
+        for key_postings, keys in ((self.postings, tokens), (self.prefix_postings, prefixes)):
+            for key in keys:
+                posting = key_postings.setdefault(key, [])
+                if not posting and key_postings is self.postings:
+                    insort(self.tokens, key)
+                index = bisect_left(posting, slot)
+                if index == len(posting) or posting[index] != slot:
+                    posting.insert(index, slot)
+    
+    def add_rules(self, rules):
+        """新规则追加到末尾，与规则列表的声明顺序一致"""
+        new_tokens = []
+        for rule in rules:
+            slot = len(self.rules)
+            self.rules.append(rule)
+            self.texts.append(self.get_text(rule))
+            self.slot_of[rule.get("id")] = slot
+            new_tokens.extend(self.append_keys(slot, *self.get_keys(self.texts[slot])))
+        if len(new_tokens) > 16:
+            # 批量导入时整体合并词表，两段有序序列的排序是线性的
+            new_tokens.sort()
+            self.tokens = sorted(self.tokens + new_tokens)
+        else:
+            for token in new_tokens:
+                insort(self.tokens, token)
+        self.last_query = None
+    
+    def add_rule(self, rule):
+        """添加单条规则"""
+        self.add_rules([rule])
+    
+    def update_rule(self, rule):
+        """规则修改后更新索引，只补充新出现的词，消失的词留在倒排表中由查询校验"""
+        slot = self.slot_of.get(rule.get("id"))
+        if slot is None:
+            self.add_rule(rule)
+            return
+        text = self.get_text(rule)
+        if text != self.texts[slot]:
+            old_tokens, old_prefixes = self.get_keys(self.texts[slot])
+            tokens, prefixes = self.get_keys(text)
+            self.texts[slot] = text
+            self.insert_keys(slot, tokens - old_tokens, prefixes - old_prefixes)
+            self.mark_dirty(slot)
+        self.rules[slot] = rule
+        self.last_query = None
+    
+    def remove_rule(self, rule):
+        """删除规则，位置保留为空文本，过期位置较多时重建索引"""
+        slot = self.slot_of.pop(rule.get("id"), None)
+        if slot is None:
+            return
+        self.rules[slot] = None
+        self.texts[slot] = ""
+        self.mark_dirty(slot)
+        self.last_query = None
+    
+    def mark_dirty(self, slot):
+        """记录过期位置，数量过多时按当前规则重建，让查询不必逐个校验"""
+        self.dirty.add(slot)
+        if len(self.dirty) > max(1024, len(self.rules) // 4):
+            self.build([rule for rule in self.rules if rule is not None])
+    
+    def prefix_range(self, token):
+        """以token开头的词在词表中的范围"""
+        start = bisect_left(self.tokens, token)
+        return start, bisect_left(self.tokens, token + "\U0010ffff", start)
+    
+    def estimate_cost(self, token, prefix):
+        """估计查索引的代价：倒排表长度，较长的前缀还需合并多个词的倒排表"""
+        if not prefix:
+            return len(self.postings.get(token, ()))
+        if len(token) <= self.SHORT_PREFIX:
+            return len(self.prefix_postings.get(token, ()))
+        start, end = self.prefix_range(token)
+        return 5 * (end - start) + sum(map(len, map(self.postings.__getitem__, self.tokens[start:end])))
+    
+    def lookup(self, token, prefix):
+        """返回包含词token（prefix为True时为以token开头的词）的规则位置（升序）"""
+        if not prefix:
+            slots = self.postings.get(token, [])
+        elif len(token) <= self.SHORT_PREFIX:
+            slots = self.prefix_postings.get(token, [])
+        else:
+            start, end = self.prefix_range(token)
+            if end - start == 1:
+                slots = self.postings[self.tokens[start]]
+            else:
+                # 多个词的倒排表合并去重，排序后恢复规则顺序
+                slots = sorted(set(chain.from_iterable(map(self.postings.__getitem__, self.tokens[start:end]))))
+        
+        if self.dirty:
+            # 修改或删除过的规则重新校验是否仍然包含该词
+            stale = set()
+            for slot in self.dirty:
+                words = self.TOKEN_PATTERN.findall(self.texts[slot])
+                if not any(word.startswith(token) if prefix else word == token for word in words):
+                    stale.add(slot)
+            if stale:
+                slots = list(filterfalse(stale.__contains__, slots))
+        return slots
+    
+    @staticmethod
+    def compile_term(term):
+        """关键词的校验表达式：从词首开始出现在规则文本中"""
+        if "a" <= term[0] <= "z" or "0" <= term[0] <= "9":
+            # 词首判断放在关键词之后，正则引擎可以先快速查找关键词字面量
+            return re.compile(re.escape(term) + r"(?<![a-z0-9].{%d})" % len(term))
+        return re.compile(re.escape(term))
+    
+    def matches(self, rule, query):
+        """单条规则是否匹配查询，用于新增规则时判断是否显示在过滤结果中"""
+        text = self.get_text(rule)
+        return all(self.compile_term(term).search(text) for term in query.lower().split())
+    
+    def search(self, query, limit=None):
+        """按空格分隔的关键词过滤规则，返回RuleSearchResult（按规则顺序，先校验出前limit条），查询为空时返回None"""
+        query = query.lower()
+        terms = query.split()
+        if not terms:
+            return None
+        
+        # 1. 在关键词的词中选代价最小的一个查索引：关键词开头的词和中间的词是完整的词，最后一个词按前缀查找
+        best = None
+        for term in terms:
+            tokens = self.TOKEN_PATTERN.findall(term)
+            for i, token in enumerate(tokens):
+                prefix = i == len(tokens) - 1
+                cost = self.estimate_cost(token, prefix)
+                if best is None or cost < best[0]:
+                    best = (cost, token, prefix)
+        
+        # 2. 在上一次的查询后继续输入时结果只会变少，只需校验上一次已确认的结果和尚未校验的候选规则
+        if self.last_query is not None and query.startswith(self.last_query) and \
+                len(terms) >= len(self.last_query.split()):
+            last_result = self.last_result
+            scan_count = last_result.remaining_count
+        else:
+            last_result = None
+            scan_count = len(self.slot_of)
+        
+        if best is not None and best[0] <= self.VERIFY_COST * scan_count:
+            cost, token, prefix = best
+            candidates = self.lookup(token, prefix)
+            # 只有一个关键词且它本身就是一个词时索引结果是精确的，不需要校验
+            verify_terms = [] if terms == [token] and prefix else terms
+        else:
+            # 已删除规则的文本为空字符串，校验时被跳过
+            candidates = last_result.get_remaining_slots() if last_result is not None else range(len(self.texts))
+            verify_terms = terms
+        
+        # 3. 候选规则在结果中按需校验，每次按键只校验到界面需要显示的行数
+        result = RuleSearchResult(self, candidates, [self.compile_term(term) for term in verify_terms])
+        result.fetch(self.PAGE_SIZE if limit is None else limit)
+        self.last_query = query
+        self.last_result = result
+        return result
+
+# 规则搜索结果类
+class RuleSearchResult:
+    """规则搜索的结果，保持规则顺序，候选规则按需分批校验
+    
+    rules为已确认匹配的规则，界面表格滚动到末尾时再用fetch校验下一批，
+    排序等需要全部结果时调用fetch_all；搜索之后新增的匹配规则排在所有候选规则之后
+    """
+    
+    # 每次至少校验的候选规则数，避免逐条切片的开销
+    MIN_CHUNK = 256
+    
+    def __init__(self, index, candidates, patterns):
+        self.index = index
+        # 候选规则位置（升序）及已校验到的位置，候选列表可能是索引中的倒排表，之后新增的规则不在候选范围内
+        self.candidates = candidates
+        self.candidate_count = len(candidates)
+        self.position = 0
+        # 每个关键词的校验表达式，为空时候选规则就是结果
+        self.patterns = patterns
+        self.slots = []
+        self.rules = []
+        # 候选规则尚未校验完时新增的匹配规则
+        self.pending = []
+    
+    @property
+    def complete(self):
+        """是否已校验完所有候选规则"""
+        return self.position >= self.candidate_count
+    
+    @property
+    def remaining_count(self):
+        """已确认的结果和尚未校验的候选规则总数"""
+        return len(self.slots) + self.candidate_count - self.position
+    
+    def get_remaining_slots(self):
+        """已确认的结果和尚未校验的候选规则，用于在本次查询后继续输入时缩小范围"""
+        return self.slots + list(self.candidates[self.position:self.candidate_count])
+    
+    def fetch(self, count):
+        """继续校验候选规则，直到新确认至少count条结果或候选规则用完，返回新确认的规则数"""
+        texts = self.index.texts
+        start = len(self.rules)
+        found = 0
+        while found < count and not self.complete:
+            end = min(self.position + max(count - found, self.MIN_CHUNK), self.candidate_count)
+            # 已删除规则的文本为空字符串，直接跳过
+            chunk = self.candidates[self.position:end]
+            slots = list(compress(chunk, map(texts.__getitem__, chunk)))
+            self.position = end
+            for pattern in self.patterns:
+                slots = list(compress(slots, map(pattern.search, map(texts.__getitem__, slots))))
+            self.slots.extend(slots)
+            self.rules.extend(map(self.index.rules.__getitem__, slots))
+            found += len(slots)
+        if self.complete and self.pending:
+            self.rules.extend(self.pending)
+            self.pending = []
+        return len(self.rules) - start
+    
+    def fetch_all(self):
+        """校验全部候选规则，返回全部结果"""
+        self.fetch(sys.maxsize)
+        return self.rules
+    
+    def extend(self, rules):
+        """加入搜索之后新增的匹配规则，返回立即加入结果的规则（候选规则尚未校验完时暂存，校验完后再加入）"""
+        if self.complete:
+            self.rules.extend(rules)
+            return list(rules)
+        self.pending.extend(rules)
+        return []
+    
+    def remove(self, rule):
+        """从结果中删除规则"""
+        for rules in (self.rules, self.pending):
+            for i, item in enumerate(rules):
+                if item is rule:
+                    del rules[i]
+                    return
+
+# URL解析结果类
+class ParsedURL:
+    """解析一次后在匹配、路由缓存、日志和启动之间共用的URL对象，创建后不再修改
+    
+    url为浏览器实际打开的URL（自定义协议已替换为http），match_url为匹配规则用的URL：
+    去掉用户信息、主机名转为小写的IDNA（punycode）形式，其余部分与url相同，避免http://google.com@evil.com这样的URL
+    命中google.com规则，也避免主机名大小写或写法（münchen.de与xn--mnchen-3ya.de）不同时匹配不到规则
+    """
+    
+    __slots__ = ("raw", "url", "match_url", "netloc", "host", "idna_host", "port", "reversed_labels")
+    
+    # URL协议名称允许的字符，与urllib.parse一致
+    SCHEME_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+-.")
+    # urlparse会去掉或特殊处理的字符，URL中出现时交给urlparse解析
+    UNSAFE_CHARS = ("\t", "\r", "\n")
+    
+    def __init__(self, raw, protocol_name=PROTOCOL_NAME):
+        self.raw = raw
+        # 只替换开头的自定义协议，URL参数中出现的同名协议保持不变
+        prefix = f"{protocol_name}://"
+        self.url = f"http://{raw[len(prefix):]}" if raw.startswith(prefix) else raw
+        
+        netloc_range = self.split_netloc(self.url)
+        if netloc_range is None:
+            # 不常见的URL（含制表符/换行符、IPv6地址或非ASCII主机名）使用urlparse，无效时抛出ValueError
+            parsed_url = urlparse(self.url)
+            self.netloc = parsed_url.netloc
+            host = parsed_url.hostname or ""
+            port = parsed_url.port
+            start = self.url.find(self.netloc) if self.netloc else -1
+        else:
+            start, end = netloc_range
+            self.netloc = self.url[start:end]
+            host_port = self.netloc.rpartition("@")[2]
+            host, colon, port_text = host_port.rpartition(":")
+            if not colon or not port_text.isdigit():
+                host, port_text = host_port, ""
+            host = host.lower()
+            port = int(port_text) if port_text else None
+        
+        self.host = host
+        self.idna_host = self.encode_host(host)
+        self.port = port
+        # 主机名各级标签倒序排列（顶级域名在前），IPv6地址没有标签
+        self.reversed_labels = tuple(reversed(host.split("."))) if host and ":" not in host else ()
+        
+        # 匹配用的URL：去掉用户信息，主机名小写并转为IDNA形式，保留端口
+        if start >= 0 and self.netloc:
+            idna_host = self.idna_host
+            normalized_netloc = idna_host if port is None else f"{idna_host}:{port}"
+            if ":" in idna_host and not idna_host.startswith("["):
+                # IPv6地址需要保留方括号
+                normalized_netloc = f"[{idna_host}]" if port is None else f"[{idna_host}]:{port}"
+            self.match_url = self.url[:start] + normalized_netloc + self.url[start + len(self.netloc):]
+        else:
+            self.match_url = self.url
+    
+    @staticmethod
+    def encode_host(host):
+        """把主机名转为小写的IDNA（punycode）形式，各级标签分别编码，无法编码的标签只转为小写"""
+        if host.isascii():
+            return host.lower()
+        labels = []
+        for label in host.split("."):
+            if not label.isascii():
+                try:
+                    label = label.encode("idna").decode("ascii")
+                except UnicodeError:
+                    pass
+            labels.append(label.lower())
+        return ".".join(labels)
+    
+    @classmethod
+    def split_netloc(cls, url):
+        """快速找到URL中netloc的位置，返回(开始, 结束)，结果与urlparse一致；需要urlparse处理时返回None"""
+        if not url or url[0] <= " " or any(char in url for char in cls.UNSAFE_CHARS):
+            return None
+        # 协议名称：第一个冒号之前，以字母开头
+        start = 0
+        colon = url.find(":")
+        if colon > 0 and url[0].isascii() and url[0].isalpha() and all(char in cls.SCHEME_CHARS for char in url[:colon]):
+            start = colon + 1
+        if not url.startswith("//", start):
+            return start, start
+        start += 2
+        end = len(url)
+        for delimiter in "/?#":
+            position = url.find(delimiter, start)
+            if 0 <= position < end:
+                end = position
+        netloc = url[start:end]
+        if not netloc.isascii() or "[" in netloc or "]" in netloc:
+            return None
+        return start, end
+    
+    def __eq__(self, other):
+        return isinstance(other, ParsedURL) and self.raw == other.raw and self.url == other.url
+    
+    def __hash__(self):
+        return hash(self.url)
+    
+    def __repr__(self):
+        return f"ParsedURL({self.url!r}, host={self.host!r}, port={self.port!r})"
+
+@lru_cache(maxsize=4096)
+def parse_url(url, protocol_name=PROTOCOL_NAME):
+    """解析URL并缓存结果，同一个URL重复路由（例如路由缓存命中、批量审计重复的URL）时不再解析"""
+    return ParsedURL(url, protocol_name)
+
+# 模式规则集类
+class PatternRuleSet:
+    """把glob和正则表达式规则编译为一个组合正则表达式，一次匹配即可得到声明顺序最靠前的模式规则
+    
+    每条规则是组合表达式中的一个分支，分支按声明顺序排列并各自包在一个分组中，
+    re.match按顺序尝试分支，第一个成功的分支就是最靠前的规则，由分组编号换算回规则序号。
+    正则表达式规则在完整URL中查找；glob规则从主机开始匹配，不含"/"时需匹配整个主机名（忽略大小写），
+    含"/"时还需匹配之后的路径和参数，*匹配任意字符（主机部分不跨越端口和路径）
+    不像主机名的子串规则含大写字母时，转为小写后作为一个分支只在主机名中查找
+    """
+    
+    # 规则的匹配类型，缺少type字段的规则按子串匹配
+    TYPES = ("substring", "glob", "regex")
+    NO_MATCH = sys.maxsize
+    # 模式的最大长度
+    MAX_PATTERN_LENGTH = 1000
+    # 放在组合表达式中不会改变含义的行内标志
+    SCOPED_FLAGS = re.compile(r"\(\?([imsx]+)\)")
+    # glob的主机部分：可选的协议和用户信息，之后的*和?不跨越主机名
+    GLOB_PREFIX = r"(?:[A-Za-z][A-Za-z0-9+.\-]*://)?(?:[^/?#@]*@)?"
+    # glob中的通配符
+    GLOB_WILDCARDS = re.compile(r"[*?\[]")
+    # 子串规则在主机名中查找时，匹配位置之前的部分：协议、用户信息和主机名中的其他字符
+    HOST_TEXT_PREFIX = r"[A-Za-z][A-Za-z0-9+.\-]*://(?:[^/?#@]*@)?[^/?#]*?"
+    
+    def __init__(self, entries):
+        """entries为(规则序号, 规则)列表，按列表顺序尝试各个分支，无效的规则记录在errors中并跳过
+        
+        列表不必按规则序号排列，但调用者需保证：顺序颠倒的两条规则不会匹配同一个URL，
+        这样按列表顺序第一个匹配的规则仍是规则序号最小的规则
+        """
+        self.rules = {}
+        # 实际参与匹配的规则序号，按尝试顺序排列
+        self.evaluation_orders = []
+        self.errors = []
+        # 组合表达式中每个规则分组的编号对应的规则序号
+        self.group_orders = {}
+        self.first_order = self.NO_MATCH
+        
+        branches = []
+        group_count = 0
+        for order, rule in entries:
+            try:
+                source = self.compile_pattern(self.get_type(rule), rule["pattern"])
+            except ValueError as e:
+                self.errors.append((rule, str(e)))
+                continue
+            group_count += 1
+            self.group_orders[group_count] = order
+            group_count += re.compile(source).groups
+            branches.append(f"({source})")
+            self.rules[order] = rule
+            self.evaluation_orders.append(order)
+            if order < self.first_order:
+                self.first_order = order
+        self.regex = re.compile("|".join(branches)) if branches else None
+    
+    def __len__(self):
+        return len(self.rules)
+    
+    @classmethod
+    def get_type(cls, rule):
+        """返回规则的匹配类型"""
+        return rule.get("type") or "substring"
+    
+    @classmethod
+    def is_pattern_rule(cls, rule):
+        """规则是否需要编译为正则表达式（glob或正则表达式规则）"""
+        return cls.get_type(rule) != "substring"
+    
+    @classmethod
+    def get_glob_host_bounds(cls, pattern):
+        """返回glob主机部分第一个通配符之前和最后一个通配符之后的固定文本（小写），没有通配符时两者都是整个主机名"""
+        host = cls.encode_glob_host(pattern.partition("/")[0]).lower()
+        parts = cls.GLOB_WILDCARDS.split(host)
+        return parts[0], parts[-1].rpartition("]")[2] if len(parts) > 1 else parts[-1]
+    
+    @classmethod
+    def are_disjoint(cls, rule, other_rule):
+        """两条规则能否证明不会匹配同一个URL，无法证明时返回False
+        
+        目前只能判断两条glob规则：glob需匹配整个主机名，主机部分开头或结尾的固定文本互不为前缀（后缀）时不相交
+        """
+        if cls.get_type(rule) != "glob" or cls.get_type(other_rule) != "glob":
+            return False
+        prefix, suffix = cls.get_glob_host_bounds(rule["pattern"])
+        other_prefix, other_suffix = cls.get_glob_host_bounds(other_rule["pattern"])
+        return not (prefix.startswith(other_prefix) or other_prefix.startswith(prefix)) or \
+            not (suffix.endswith(other_suffix) or other_suffix.endswith(suffix))
+    
+    @classmethod
+    def validate_rule(cls, rule):
+        """校验规则的匹配类型和模式，有问题时抛出ValueError"""
+        rule_type = cls.get_type(rule)
+        if rule_type not in cls.TYPES:
+            raise ValueError(f"不支持的匹配类型: {rule_type}")
+        if rule_type != "substring":
+            cls.compile_pattern(rule_type, rule.get("pattern"))
+    
+    @classmethod
+    def compile_pattern(cls, rule_type, pattern):
+        """把glob或正则表达式规则转换为组合表达式中的一个分支，模式无效时抛出ValueError"""
+        if not isinstance(pattern, str) or not pattern:
+            raise ValueError("匹配模式不能为空")
+        if len(pattern) > cls.MAX_PATTERN_LENGTH:
+            raise ValueError(f"匹配模式长度不能超过{cls.MAX_PATTERN_LENGTH}个字符")
+        if rule_type == "glob":
+            source = cls.translate_glob(pattern)
+        elif rule_type == "substring":
+            # 不像主机名的子串规则：转为小写后只在主机名中查找（RuleMatcher.get_host_text）
+            host_text = RuleMatcher.get_host_text(pattern)
+            if host_text is None:
+                raise ValueError("子串规则不需要在主机名中单独匹配")
+            source = cls.HOST_TEXT_PREFIX + re.escape(host_text)
+        elif rule_type == "regex":
+            # 开头的全局行内标志改写为只作用于本规则的标志分组
+            flags = cls.SCOPED_FLAGS.match(pattern)
+            if flags:
+                pattern = f"(?{flags.group(1)}:{pattern[flags.end():]})"
+            try:
+                parsed = sre_parse.parse(pattern)
+            except re.error as e:
+                raise ValueError(f"正则表达式无效: {e}")
+            if parsed.state.groupdict:
+                raise ValueError("正则表达式不支持命名分组")
+            cls.check_backtracking(parsed)
+            # 在URL任意位置查找
+            source = rf"[\s\S]*?(?:{pattern})"
+        else:
+            raise ValueError(f"不支持的匹配类型: {rule_type}")
+        try:
+            re.compile(source)
+        except re.error as e:
+            raise ValueError(f"正则表达式无效: {e}")
+        return source
+    
+    @classmethod
+    def translate_glob(cls, pattern):
+        """把glob转换为正则表达式，主机部分忽略大小写"""
+        host, slash, path = pattern.partition("/")
+        host = cls.encode_glob_host(host)
+        source = cls.GLOB_PREFIX + f"(?i:{cls.translate_glob_part(host, '[^/?#@:]')})(?::[0-9]+)?"
+        if slash:
+            return source + "/" + cls.translate_glob_part(path, ".") + r"\Z"
+        return source + r"(?=[/?#]|\Z)"
+    
+    @classmethod
+    def encode_glob_host(cls, host):
+        """把glob主机部分中不含通配符的非ASCII标签转为IDNA形式，与ParsedURL.match_url一致"""
+        if host.isascii():
+            return host
+        return ".".join(label if cls.GLOB_WILDCARDS.search(label) else ParsedURL.encode_host(label)
+                        for label in host.split("."))
+    
+    @staticmethod
+    def translate_glob_part(pattern, any_char):
+        """转换glob的一部分，*和?匹配any_char表示的字符，连续的*合并为一个"""
+        parts = []
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            i += 1
+            if char == "*":
+                if not parts or parts[-1] != f"{any_char}*":
+                    parts.append(f"{any_char}*")
+            elif char == "?":
+                parts.append(any_char)
+            elif char == "[":
+                end = pattern.find("]", i + 1 if pattern[i:i + 1] in ("!", "]") else i)
+                if end < 0:
+                    parts.append(re.escape(char))
+                    continue
+                body = pattern[i:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                elif body.startswith("^"):
+                    body = "\\" + body
+                parts.append(f"[{body}]")
+                i = end + 1
+            else:
+                parts.append(re.escape(char))
+        return "".join(parts)
+    
+    @classmethod
+    def check_backtracking(cls, items, outer_max=None):
+        """拒绝可能导致灾难性回溯的正则表达式：嵌套的无上限重复、无上限重复中的分支、
+        字符集重叠的相邻无上限重复和反向引用"""
+        cls.check_adjacent_repeats(items)
+        for op, av in items:
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                low, high, body = av
+                if high > 1 and outer_max is not None and \
+                        (high == sre_parse.MAXREPEAT or outer_max == sre_parse.MAXREPEAT):
+                    raise ValueError("正则表达式包含嵌套的重复，可能导致灾难性回溯")
+                cls.check_backtracking(body, high if high > 1 else outer_max)
+            elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+                raise ValueError("正则表达式不支持反向引用")
+            elif op == sre_parse.BRANCH:
+                if outer_max == sre_parse.MAXREPEAT:
+                    raise ValueError("正则表达式在无上限的重复中包含分支，可能导致灾难性回溯")
+                for branch in av[1]:
+                    cls.check_backtracking(branch, outer_max)
+            elif op == sre_parse.SUBPATTERN:
+                cls.check_backtracking(av[-1], outer_max)
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                cls.check_backtracking(av[1], outer_max)
+    
+    # 用于比较字符集是否重叠的样本字符：Latin-1范围和几个常见的非ASCII字符
+    SAMPLE_CHARS = tuple(map(chr, range(256))) + ("\u2028", "\u3000", "\u4e2d", "\U0001f600")
+    
+    @classmethod
+    def check_adjacent_repeats(cls, items):
+        """拒绝同一序列中字符集重叠的多个无上限重复，如 \\w*\\w*、.*a.*a 和 .*-.*-.*!
+        
+        前一个重复能吞下两者之间的内容时，两个重复可以用任意方式瓜分同一段文本，
+        匹配失败时每多一个重复回溯次数就乘以URL长度。两者之间出现前一个重复不能匹配的字符时
+        （如 [^/]*/.* 中的/），前一个重复的结束位置是确定的，不再计入
+        """
+        previous = None
+        for op, av in cls.flatten_sequence(items):
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[1] == sre_parse.MAXREPEAT:
+                chars = cls.get_possible_chars(av[2])
+                if previous is not None and not previous.isdisjoint(chars):
+                    raise ValueError("正则表达式包含多个字符集重叠的无上限重复，可能导致灾难性回溯")
+                previous = chars
+            elif previous is not None:
+                chars = cls.get_possible_chars([(op, av)])
+                if not cls.is_nullable([(op, av)]) and previous.isdisjoint(chars):
+                    previous = None
+                else:
+                    # 前一个重复也能匹配中间的内容，它与后面的重复仍可能瓜分同一段文本
+                    previous = previous | chars
+    
+    @classmethod
+    def flatten_sequence(cls, items):
+        """展开不带重复的分组，返回按顺序排列的匹配项"""
+        for op, av in items:
+            if op == sre_parse.SUBPATTERN:
+                yield from cls.flatten_sequence(av[-1])
+            else:
+                yield op, av
+    
+    @classmethod
+    def is_nullable(cls, items):
+        """匹配项序列能否匹配空字符串"""
+        for op, av in items:
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                if av[0] > 0 and not cls.is_nullable(av[2]):
+                    return False
+            elif op == sre_parse.SUBPATTERN:
+                if not cls.is_nullable(av[-1]):
+                    return False
+            elif op == sre_parse.BRANCH:
+                if not any(cls.is_nullable(branch) for branch in av[1]):
+                    return False
+            elif op not in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                return False
+        return True
+    
+    @classmethod
+    def get_possible_chars(cls, items):
+        """返回匹配项序列可能匹配的样本字符集合，无法判断的匹配项按匹配任意字符处理"""
+        chars = set()
+        for op, av in items:
+            if op == sre_parse.LITERAL:
+                chars.add(chr(av))
+            elif op == sre_parse.NOT_LITERAL:
+                chars.update(char for char in cls.SAMPLE_CHARS if char != chr(av))
+            elif op == sre_parse.IN:
+                chars.update(char for char in cls.SAMPLE_CHARS if cls.in_char_class(av, char))
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                chars |= cls.get_possible_chars(av[2])
+            elif op == sre_parse.SUBPATTERN:
+                chars |= cls.get_possible_chars(av[-1])
+            elif op == sre_parse.BRANCH:
+                for branch in av[1]:
+                    chars |= cls.get_possible_chars(branch)
+            elif op not in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                chars.update(cls.SAMPLE_CHARS)
+        return frozenset(chars)
+    
+    # 字符类别对应的判断函数
+    CATEGORY_TESTS = {
+        sre_parse.CATEGORY_DIGIT: str.isdigit,
+        sre_parse.CATEGORY_NOT_DIGIT: lambda char: not char.isdigit(),
+        sre_parse.CATEGORY_SPACE: str.isspace,
+        sre_parse.CATEGORY_NOT_SPACE: lambda char: not char.isspace(),
+        sre_parse.CATEGORY_WORD: lambda char: char.isalnum() or char == "_",
+        sre_parse.CATEGORY_NOT_WORD: lambda char: not (char.isalnum() or char == "_"),
+    }
+    
+    @classmethod
+    def in_char_class(cls, items, char):
+        """字符是否属于[...]表示的字符集"""
+        negate = False
+        matched = False
+        for op, av in items:
+            if op == sre_parse.NEGATE:
+                negate = True
+            elif op == sre_parse.LITERAL:
+                matched = matched or char == chr(av)
+            elif op == sre_parse.RANGE:
+                matched = matched or av[0] <= ord(char) <= av[1]
+            elif op == sre_parse.CATEGORY:
+                test = cls.CATEGORY_TESTS.get(av)
+                matched = matched or test is None or test(char)
+            else:
+                matched = True
+        return matched != negate
+    
+    def match(self, actual_url, found=NO_MATCH):
+        """返回匹配的最靠前的模式规则序号与found中较小的一个"""
+        if self.regex is None or self.first_order >= found:
+            return found
+        matched = self.regex.match(actual_url)
+        if matched is None:
+            return found
+        return min(found, self.group_orders[matched.lastindex])
+
+# 规则匹配器类
+class RuleMatcher:
+    """将规则列表编译为多模式匹配自动机（Aho-Corasick），单次匹配耗时只与URL长度相关
+    
+    原有逻辑对每条规则依次判断 pattern == netloc、f".{pattern}" in netloc、pattern in url，
+    由于netloc本身就是url的子串，三者等价于"pattern是url的子串"，取声明顺序最靠前的规则。
+    自动机的每个节点记录以该节点结尾的所有模式中最小的规则序号，扫描一遍URL即可得到结果。
+    glob和正则表达式规则编译为PatternRuleSet，只在其中可能有更靠前的规则时才匹配，两者取较小的序号。
+    匹配用的URL主机名已转为小写，像主机名的子串规则的主机部分同样转为小写后一并加入自动机（get_match_texts），
+    其他含大写字母的子串规则转为小写后编译进PatternRuleSet，只在主机名中查找（get_host_text）。
+    """
+    
+    NO_MATCH = sys.maxsize
+    # 子串规则中主机部分的结束位置
+    HOST_END = re.compile(r"[/?#]")
+    
+    def __init__(self, rules, excluded=(), hit_counts=None):
+        """excluded为不参与编译的规则序号（例如被前面规则完全遮蔽、永远不会命中的规则），
+        hit_counts为{规则ID: 命中次数}，给出时glob/正则表达式规则按RuleOrderOptimizer的顺序尝试"""
+        self.rules = rules
+        self.excluded = frozenset(excluded)
+        # 自动机：转移表、失败指针、节点可匹配的最小规则序号
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [self.NO_MATCH]
+        # 有效规则中最小的序号，命中后即可提前结束扫描
+        self.first_order = self.NO_MATCH
+        
+        # 1. 构建模式树，每个模式结尾节点记录规则序号（重复模式保留最靠前的规则）
+        pattern_entries = []
+        for order, rule in enumerate(rules):
+            pattern = rule.get("pattern") if isinstance(rule, dict) else None
+            if not isinstance(pattern, str) or "browser" not in rule or order in self.excluded:
+                continue
+            if PatternRuleSet.is_pattern_rule(rule):
+                pattern_entries.append((order, rule))
+                continue
+            if self.get_host_text(pattern) is not None:
+                pattern_entries.append((order, rule))
+            for text in self.get_match_texts(pattern):
+                node = 0
+                for char in text:
+                    next_node = self.goto[node].get(char)
+                    if next_node is None:
+                        next_node = len(self.goto)
+                        self.goto[node][char] = next_node
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.best.append(self.NO_MATCH)
+                    node = next_node
+                if order < self.best[node]:
+                    self.best[node] = order
+            if order < self.first_order:
+                self.first_order = order
+        
+        # 2. 广度优先构建失败指针，并沿失败指针合并最小规则序号
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.best[self.fail[child]] < self.best[child]:
+                    self.best[child] = self.best[self.fail[child]]
+                queue.append(child)
+        
+        # 3. glob和正则表达式规则编译为一个组合表达式，无效的规则跳过
+        if hit_counts:
+            pattern_entries = RuleOrderOptimizer.get_evaluation_order(pattern_entries, hit_counts)
+        self.pattern_set = PatternRuleSet(pattern_entries)
+        for rule, error in self.pattern_set.errors:
+            print(f"跳过无效规则 {rule.get('id')}: {error}")
+        if self.pattern_set.first_order < self.first_order:
+            self.first_order = self.pattern_set.first_order
+    
+    @classmethod
+    def split_host_part(cls, pattern):
+        """像主机名的子串规则（带协议，或第一个/?#之前的部分含"."）返回主机部分的(开始, 结束)，否则返回None"""
+        start = pattern.find("://")
+        start = start + 3 if start >= 0 else 0
+        host_end = cls.HOST_END.search(pattern, start)
+        end = host_end.start() if host_end else len(pattern)
+        if not start and "." not in pattern[:end]:
+            return None
+        return start, end
+    
+    @classmethod
+    def get_match_texts(cls, pattern):
+        """返回子串规则在整个URL中查找的文本：模式本身，像主机名的模式还包括主机部分转为小写IDNA形式的模式"""
+        host_part = cls.split_host_part(pattern)
+        if host_part is None:
+            return (pattern,)
+        start, end = host_part
+        lowered = pattern[:start].lower() + ParsedURL.encode_host(pattern[start:end]) + pattern[end:]
+        return (pattern,) if lowered == pattern else (pattern, lowered)
+    
+    @classmethod
+    def get_host_text(cls, pattern):
+        """不像主机名的子串规则（如Login）转为小写后只在主机名中查找，不影响区分大小写的路径和参数；
+        不需要时返回None"""
+        # 含/?#的模式不可能出现在主机名中
+        if not pattern or cls.HOST_END.search(pattern) or cls.split_host_part(pattern) is not None:
+            return None
+        lowered = ParsedURL.encode_host(pattern)
+        return lowered if lowered != pattern else None
+    
+    @classmethod
+    def match_literal(cls, pattern, actual_url, netloc):
+        """按原逻辑判断子串规则是否匹配，主机部分忽略大小写"""
+        host_text = cls.get_host_text(pattern)
+        return any(text == netloc or f".{text}" in netloc or text in actual_url
+                   for text in cls.get_match_texts(pattern)) or \
+            (host_text is not None and host_text in netloc.lower())
+    
+    def match(self, actual_url, netloc):
+        """返回第一条匹配的规则，没有匹配时返回None"""
+        if netloc not in actual_url:
+            # urlparse会去掉URL中的制表符/换行符，此时netloc不再是url的子串，按原逻辑逐条判断
+            found = self.NO_MATCH
+            for order, rule in enumerate(self.rules):
+                pattern = rule.get("pattern") if isinstance(rule, dict) else None
+                if not isinstance(pattern, str) or "browser" not in rule or \
+                        PatternRuleSet.is_pattern_rule(rule) or order in self.excluded:
+                    continue
+                if self.match_literal(pattern, actual_url, netloc):
+                    found = order
+                    break
+            found = self.pattern_set.match(actual_url, found)
+            return self.rules[found] if found != self.NO_MATCH else None
+        
+        goto = self.goto
+        fail = self.fail
+        best = self.best
+        found = best[0]
+        node = 0
+        for char in actual_url:
+            if found == self.first_order:
+                break
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best[node] < found:
+                found = best[node]
+        
+        found = self.pattern_set.match(actual_url, found)
+        if found == self.NO_MATCH:
+            return None
+        return self.rules[found]
+    
+    def find_literal(self, text):
+        """返回text中出现的子串规则的最小序号，没有时返回NO_MATCH"""
+        goto = self.goto
+        fail = self.fail
+        best = self.best
+        found = best[0]
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best[node] < found:
+                found = best[node]
+        return found
+
+# 规则顺序优化类
+class RuleOrderOptimizer:
+    """按命中次数调整glob/正则表达式规则的尝试顺序，命中多的规则先尝试
+    
+    组合表达式按分支顺序逐条尝试，声明靠后的常用规则要先尝试完前面所有的规则。
+    调整时一条规则只越过命中更少、且能证明与它不会匹配同一个URL的规则（PatternRuleSet.are_disjoint），
+    任何两条顺序颠倒的规则都不会同时匹配，因此第一个匹配的规则与按声明顺序匹配的结果相同
+    """
+    
+    @staticmethod
+    def get_evaluation_order(entries, hit_counts):
+        """entries为按声明顺序排列的(规则序号, 规则)列表，返回调整后的列表"""
+        ordered = []
+        hits = []
+        for entry in entries:
+            entry_hits = hit_counts.get(entry[1].get("id"), 0)
+            # 插入排序：向前越过命中更少且不相交的规则，遇到可能相交的规则时停止
+            position = len(ordered)
+            while position and hits[position - 1] < entry_hits and \
+                    PatternRuleSet.are_disjoint(ordered[position - 1][1], entry[1]):
+                position -= 1
+            ordered.insert(position, entry)
+            hits.insert(position, entry_hits)
+        return ordered
+    
+    @staticmethod
+    def count_comparisons(pattern_set, order):
+        """按当前尝试顺序匹配到规则序号order（None表示没有匹配）之前需要尝试的规则数"""
+        if order is None or order not in pattern_set.rules:
+            return len(pattern_set.evaluation_orders)
+        return pattern_set.evaluation_orders.index(order) + 1
+
+# 规则遮蔽分析类
+class RuleAnalyzer:
+    """找出被前面的规则遮蔽的规则，由于只取第一条匹配的规则，这些规则永远或有时不会命中
+    
+    不可达（dead）：子串规则的模式包含前面某条子串规则的模式（例如x.com之后的netflix.com），
+    或与前面的glob/正则表达式规则的类型和模式完全相同，或glob规则路径部分的固定文本包含前面的子串规则；
+    这些规则不参与运行时匹配器的编译。
+    部分遮蔽（partial）：前面的glob/正则表达式规则能匹配包含该子串规则模式的URL，
+    或glob规则主机部分的固定文本包含前面的子串规则（主机名忽略大小写，只能说明部分URL被遮蔽）。
+    每条规则在子串规则的自动机上扫描一遍，总耗时与模式总长度成正比
+    """
+    
+    DEAD = "dead"
+    PARTIAL = "partial"
+    # glob中的通配符
+    GLOB_WILDCARDS = re.compile(r"\[[^\]]*\]|[*?\[\]]")
+    
+    def __init__(self, rules):
+        self.rules = rules
+        # 规则序号 -> (遮蔽类型, 遮蔽它的规则序号)
+        self.shadowed = {}
+        # 在完整规则集上编译的匹配器，用于查找每条规则的模式中出现的前面的子串规则
+        self.matcher = RuleMatcher(rules)
+        self.analyze()
+    
+    @staticmethod
+    def get_probe_url(pattern):
+        """构造包含子串规则模式的URL，用于检查前面的glob/正则表达式规则"""
+        if "://" in pattern:
+            return pattern
+        if pattern.startswith("/"):
+            return f"http://localhost{pattern}"
+        return f"http://{pattern}"
+    
+    def analyze(self):
+        """分析每条规则，结果保存在shadowed中"""
+        matcher = self.matcher
+        pattern_set = matcher.pattern_set
+        # 已出现的glob/正则表达式规则的(类型, 模式) -> 规则序号
+        seen_patterns = {}
+        for order, rule in enumerate(self.rules):
+            pattern = rule.get("pattern") if isinstance(rule, dict) else None
+            if not isinstance(pattern, str) or "browser" not in rule:
+                continue
+            
+            if not PatternRuleSet.is_pattern_rule(rule):
+                # 1. 子串规则：模式（包括主机部分转为小写的模式）中都出现了更靠前的子串规则时，
+                #    任何能命中它的URL都会先命中那条规则
+                texts = RuleMatcher.get_match_texts(pattern) + tuple(filter(None, [RuleMatcher.get_host_text(pattern)]))
+                found = max(map(matcher.find_literal, texts))
+                if found < order:
+                    self.shadowed[order] = (self.DEAD, found)
+                    continue
+                found = pattern_set.match(self.get_probe_url(pattern), order)
+                if found < order:
+                    self.shadowed[order] = (self.PARTIAL, found)
+                continue
+            
+            # 2. glob/正则表达式规则：与前面的规则完全相同时不可达
+            key = (PatternRuleSet.get_type(rule), pattern)
+            if key in seen_patterns:
+                self.shadowed[order] = (self.DEAD, seen_patterns[key])
+                continue
+            seen_patterns[key] = order
+            
+            # 3. glob规则的固定文本一定出现在匹配的URL中，主机部分忽略大小写
+            if key[0] == "glob":
+                host, slash, path = pattern.partition("/")
+                found = min((matcher.find_literal(text) for text in self.GLOB_WILDCARDS.split(path)),
+                            default=RuleMatcher.NO_MATCH) if slash else RuleMatcher.NO_MATCH
+                if found < order:
+                    self.shadowed[order] = (self.DEAD, found)
+                    continue
+                found = min((matcher.find_literal(text) for text in self.GLOB_WILDCARDS.split(host)),
+                            default=RuleMatcher.NO_MATCH)
+                if found < order:
+                    self.shadowed[order] = (self.PARTIAL, found)
+    
+    @property
+    def dead_orders(self):
+        """不可达规则的序号集合"""
+        return {order for order, (kind, _) in self.shadowed.items() if kind == self.DEAD}
+    
+    def build_matcher(self, hit_counts=None):
+        """编译不包含不可达规则的运行时匹配器，给出命中次数时同时优化规则的尝试顺序，匹配结果与完整规则集相同"""
+        return RuleMatcher(self.rules, self.dead_orders, hit_counts)
+    
+    def findings(self):
+        """按规则顺序返回[(规则, 遮蔽类型, 遮蔽它的规则)]"""
+        return [(self.rules[order], kind, self.rules[by]) for order, (kind, by) in sorted(self.shadowed.items())]
+
+# 规则索引类
+class RuleIndex:
+    """规则的二进制索引文件，保存编译后的匹配自动机和字符串表，通过mmap直接查询而无需解析JSON
+    
+    文件结构（本机字节序）：
+    文件头  魔数、版本、源文件修改时间/大小/SHA1、规则数、节点数、边数、最小规则序号、模式规则数
+    规则表  每条规则5个uint32：模式偏移、模式长度、浏览器偏移、浏览器长度、匹配类型（声明顺序）
+    节点表  每个节点4个uint32：失败指针、最小规则序号、边起始位置、边数量
+    边表    所有边的字符编码（每个节点内按编码排序，用于二分查找），随后是对应的目标节点
+    模式表  glob、正则表达式规则和需要在主机名中单独匹配的子串规则的序号，首次匹配时读取这些规则编译为PatternRuleSet
+    字符串表 模式和浏览器名称的UTF-8编码
+    """
+    
+    MAGIC = b"URIX"
+    VERSION = 5
+    HEADER = struct.Struct("=4sIQQ20sIIIII")
+    # 规则表中每条规则占用的uint32个数
+    RULE_WORDS = 5
+    NO_MATCH = 0xFFFFFFFF
+    
+    def __init__(self, index_file):
+        with open(index_file, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.source_mtime_ns, self.source_size, self.source_sha1,
+             self.rule_count, self.node_count, self.edge_count, self.first_order,
+             self.pattern_count) = self.HEADER.unpack_from(self.mm, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("规则索引格式不匹配")
+            
+            # 各段的起始位置（以uint32为单位）
+            word_count = self.rule_count * self.RULE_WORDS + self.node_count * 4 + self.edge_count * 2 + \
+                self.pattern_count
+            self.words = memoryview(self.mm)[self.HEADER.size:self.HEADER.size + word_count * 4].cast('I')
+            self.nodes_base = self.rule_count * self.RULE_WORDS
+            self.chars_base = self.nodes_base + self.node_count * 4
+            self.targets_base = self.chars_base + self.edge_count
+            self.patterns_base = self.targets_base + self.edge_count
+            self.strings_base = self.HEADER.size + word_count * 4
+            # 模式规则集在第一次匹配时编译
+            self.pattern_set = None
+        except Exception:
+            self.close()
+            raise
+    
+    def close(self):
+        """释放内存映射"""
+        if getattr(self, 'words', None) is not None:
+            self.words.release()
+            self.words = None
+        self.mm.close()
+    
+    @classmethod
+    def load(cls, rules_file=RULES_FILE, index_file=RULE_INDEX_FILE):
+        """打开与规则快照和规则日志一致的索引，任一文件变化时自动重建，失败时返回None"""
+        journal_file = ConfigManager.get_journal_file(rules_file)
+        try:
+            stat = os.stat(rules_file)
+        except OSError:
+            return None
+        try:
+            journal_stat = os.stat(journal_file)
+            journal_mtime_ns, journal_size = journal_stat.st_mtime_ns, journal_stat.st_size
+        except OSError:
+            journal_mtime_ns, journal_size = 0, 0
+        
+        # 快照和日志合并为一个文件标识：取较新的修改时间和大小之和
+        source_mtime_ns = max(stat.st_mtime_ns, journal_mtime_ns)
+        source_size = stat.st_size + journal_size
+        
+        try:
+            index = cls(index_file)
+        except (OSError, ValueError):
+            index = None
+        
+        # 1. 修改时间和大小一致时直接使用，无需读取规则文件
+        if index is not None and index.source_mtime_ns == source_mtime_ns and \
+                index.source_size == source_size:
+            return index
+        
+        try:
+            with open(rules_file, 'rb') as f:
+                data = f.read()
+            journal_data = b""
+            if journal_size:
+                with open(journal_file, 'rb') as f:
+                    journal_data = f.read()
+            digest = hashlib.sha1(data + b"\0" + journal_data).digest()
+            source_size = len(data) + len(journal_data)
+            
+            # 2. 内容未变（只是修改时间变化）时只更新索引中的文件标识
+            if index is not None and index.source_sha1 == digest:
+                index.close()
+                with open(index_file, 'r+b') as f:
+                    header = bytearray(f.read(cls.HEADER.size))
+                    struct.pack_into("=QQ", header, 8, source_mtime_ns, source_size)
+                    f.seek(0)
+                    f.write(header)
+                return cls(index_file)
+            
+            # 3. 内容变化时重放规则日志并重新编译索引
+            if index is not None:
+                index.close()
+            rules, _ = ConfigManager.replay_journal(
+                json.loads(data.decode('utf-8')), journal_data.decode('utf-8', errors='replace').splitlines()
+            )
+            cls.build(rules, index_file, source_mtime_ns, source_size, digest)
+            return cls(index_file)
+        except Exception as e:
+            print(f"加载规则索引失败: {e}")
+            return None
+    
+    @classmethod
+    def build(cls, rules, index_file, source_mtime_ns=0, source_size=0, source_sha1=b""):
+        """编译规则并写入索引文件，先写临时文件再替换，避免读到写了一半的索引"""
+        # 只保留有效规则，规则序号即在有效规则中的声明顺序
+        rules = [rule for rule in rules if isinstance(rule, dict) and
+                 isinstance(rule.get("pattern"), str) and isinstance(rule.get("browser"), str)]
+        # 被前面规则完全遮蔽的规则不编译进自动机和模式表
+        matcher = RuleAnalyzer(rules).build_matcher()
+        
+        strings = bytearray()
+        string_offsets = {}
+        
+        def add_string(text):
+            """写入字符串表，相同字符串只保存一份"""
+            if text not in string_offsets:
+                encoded = text.encode('utf-8')
+                string_offsets[text] = (len(strings), len(encoded))
+                strings.extend(encoded)
+            return string_offsets[text]
+        
+        words = array('I')
+        pattern_orders = array('I')
+        for order, rule in enumerate(rules):
+            words.extend(add_string(rule["pattern"]))
+            words.extend(add_string(rule["browser"]))
+            rule_type = PatternRuleSet.get_type(rule)
+            words.append(PatternRuleSet.TYPES.index(rule_type) if rule_type in PatternRuleSet.TYPES
+                         else len(PatternRuleSet.TYPES))
+            # 模式表还包括需要在主机名中单独匹配的子串规则
+            if order in matcher.pattern_set.rules or \
+                    PatternRuleSet.is_pattern_rule(rule) and order not in matcher.excluded:
+                pattern_orders.append(order)
+        
+        # 节点的边按字符编码排序后连续存放
+        chars = array('I')
+        targets = array('I')
+        for node, edges in enumerate(matcher.goto):
+            best = matcher.best[node]
+            words.extend((matcher.fail[node], best if best != matcher.NO_MATCH else cls.NO_MATCH,
+                          len(chars), len(edges)))
+            for char, target in sorted(edges.items(), key=lambda item: ord(item[0])):
+                chars.append(ord(char))
+                targets.append(target)
+        words.extend(chars)
+        words.extend(targets)
+        words.extend(pattern_orders)
+        
+        first_order = matcher.first_order if matcher.first_order != matcher.NO_MATCH else cls.NO_MATCH
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, source_mtime_ns, source_size,
+                                 source_sha1.ljust(20, b"\0"), len(rules), len(matcher.goto),
+                                 len(chars), first_order, len(pattern_orders))
+        
+        temp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(header)
+            f.write(words.tobytes())
+            f.write(strings)
+        os.replace(temp_file, index_file)
+    
+    def get_string(self, offset, length):
+        """从字符串表读取字符串"""
+        start = self.strings_base + offset
+        return self.mm[start:start + length].decode('utf-8')
+    
+    def get_rule(self, order):
+        """按规则序号读取规则的模式、浏览器和匹配类型"""
+        base = order * self.RULE_WORDS
+        words = self.words
+        rule = {
+            "pattern": self.get_string(words[base], words[base + 1]),
+            "browser": self.get_string(words[base + 2], words[base + 3])
+        }
+        type_code = words[base + 4]
+        if type_code:
+            rule["type"] = PatternRuleSet.TYPES[type_code] if type_code < len(PatternRuleSet.TYPES) else "invalid"
+        return rule
+    
+    def get_pattern_set(self):
+        """读取模式表中的规则并编译为PatternRuleSet"""
+        if self.pattern_set is None:
+            orders = self.words[self.patterns_base:self.patterns_base + self.pattern_count]
+            self.pattern_set = PatternRuleSet([(order, self.get_rule(order)) for order in orders])
+        return self.pattern_set
+    
+    def next_node(self, node, code):
+        """在节点的有序边表中二分查找字符对应的目标节点，不存在时返回None"""
+        words = self.words
+        base = self.nodes_base + node * 4
+        low = self.chars_base + words[base + 2]
+        high = low + words[base + 3]
+        while low < high:
+            middle = (low + high) // 2
+            value = words[middle]
+            if value < code:
+                low = middle + 1
+            elif value > code:
+                high = middle
+            else:
+                return words[middle + self.edge_count]
+        return None
+    
+    def match(self, actual_url, netloc):
+        """返回第一条匹配的规则，没有匹配时返回None，语义与RuleMatcher.match一致"""
+        if netloc not in actual_url:
+            # urlparse会去掉URL中的制表符/换行符，此时按原逻辑逐条判断
+            found = self.NO_MATCH
+            for order in range(self.rule_count):
+                rule = self.get_rule(order)
+                if "type" in rule:
+                    continue
+                if RuleMatcher.match_literal(rule["pattern"], actual_url, netloc):
+                    found = order
+                    break
+            if self.pattern_count:
+                found = self.get_pattern_set().match(actual_url, found)
+            return self.get_rule(found) if found != self.NO_MATCH else None
+        
+        words = self.words
+        nodes_base = self.nodes_base
+        found = words[nodes_base + 1]
+        node = 0
+        for char in actual_url:
+            if found == self.first_order:
+                break
+            code = ord(char)
+            target = self.next_node(node, code)
+            while target is None and node:
+                node = words[nodes_base + node * 4]
+                target = self.next_node(node, code)
+            node = target or 0
+            best = words[nodes_base + node * 4 + 1]
+            if best < found:
+                found = best
+        
+        if self.pattern_count:
+            found = self.get_pattern_set().match(actual_url, found)
+        if found == self.NO_MATCH:
+            return None
+        return self.get_rule(found)
+
+# 路由结果缓存类
+class RouteCache:
+    """有容量上限的LRU路由结果缓存，记录命中、未命中和淘汰次数，便于调整容量"""
+    
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """读取缓存，未命中时返回None，命中时将条目移到最近使用的位置"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if self.max_size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        """清空缓存条目，保留统计计数"""
+        self.entries.clear()
+    
+    def resize(self, max_size):
+        """修改缓存容量，容量变小时淘汰最久未使用的条目"""
+        self.max_size = max_size
+        while self.entries and len(self.entries) > max(max_size, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def stats(self):
+        """返回缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+# 延迟直方图类
+class LatencyHistogram:
+    """按对数分桶的延迟直方图，每个桶的上界是前一个的2倍，单位为秒"""
+    
+    def __init__(self, first_bound, bucket_count):
+        self.bounds = [first_bound * 2 ** i for i in range(bucket_count)]
+        # 最后一个计数对应超出所有上界的数据（+Inf桶）
+        self.counts = [0] * (bucket_count + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, seconds):
+        """记录一次耗时"""
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+    
+    def quantile(self, ratio):
+        """估算分位数，返回所在桶的上界，没有数据时返回0"""
+        if not self.count:
+            return 0.0
+        target = ratio * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+    
+    def to_prometheus(self, name):
+        """生成Prometheus直方图格式的行"""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.total:.9f}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+# 路由统计类
+class RouterMetrics:
+    """记录每条规则的命中次数、使用默认浏览器的次数，以及匹配和启动浏览器的耗时分布"""
+    
+    def __init__(self):
+        self.rule_hits = {}
+        self.rule_browsers = {}
+        self.default_count = 0
+        # 匹配耗时：1微秒到约1秒；启动浏览器耗时：100微秒到约100秒
+        self.match_latency = LatencyHistogram(1e-6, 21)
+        self.spawn_latency = LatencyHistogram(1e-4, 21)
+        # 打开的URL数量和实际启动的浏览器进程数量，多个URL合并启动时后者更少
+        self.launched_urls = 0
+        self.spawn_count = 0
+        # 在输入框按下回车到浏览器进程创建完成的耗时，按回车前是否已预先路由分别统计
+        self.keypress_latency = {True: LatencyHistogram(1e-4, 21), False: LatencyHistogram(1e-4, 21)}
+        # 自上次导出后是否有新数据
+        self.dirty = False
+        # 浏览器在后台工作线程中启动，启动统计需要加锁
+        self.spawn_lock = threading.Lock()
+    
+    def record_match(self, matched_rule, seconds):
+        """记录一次规则匹配结果和耗时"""
+        if matched_rule:
+            rule_id = matched_rule.get("id")
+            self.rule_hits[rule_id] = self.rule_hits.get(rule_id, 0) + 1
+            self.rule_browsers[rule_id] = matched_rule["browser"]
+        else:
+            self.default_count += 1
+        self.match_latency.observe(seconds)
+        self.dirty = True
+    
+    def record_spawn(self, seconds, url_count=1):
+        """记录一次启动浏览器的耗时，url_count为这次启动打开的URL数量"""
+        with self.spawn_lock:
+            self.spawn_latency.observe(seconds)
+            self.launched_urls += url_count
+            self.spawn_count += 1
+            self.dirty = True
+    
+    def record_keypress(self, seconds, speculated):
+        """记录一次从按下回车到浏览器进程创建完成的耗时，speculated表示按回车前已预先路由"""
+        with self.spawn_lock:
+            self.keypress_latency[bool(speculated)].observe(seconds)
+            self.dirty = True
+    
+    @property
+    def spawns_saved(self):
+        """合并启动节省的浏览器进程数量"""
+        return self.launched_urls - self.spawn_count
+    
+    @staticmethod
+    def escape_label(value):
+        """转义Prometheus标签值"""
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    
+    def to_prometheus(self, route_cache=None):
+        """生成Prometheus文本格式的统计内容"""
+        lines = [
+            "# HELP url_browser_rule_hits_total 按规则统计的命中次数",
+            "# TYPE url_browser_rule_hits_total counter"
+        ]
+        for rule_id, hits in sorted(self.rule_hits.items(), key=lambda item: str(item[0])):
+            lines.append(
+                f'url_browser_rule_hits_total{{rule_id="{self.escape_label(rule_id)}",'
+                f'browser="{self.escape_label(self.rule_browsers.get(rule_id, ""))}"}} {hits}'
+            )
+        lines += [
+            "# HELP url_browser_rule_default_total 没有匹配任何规则、使用默认浏览器的次数",
+            "# TYPE url_browser_rule_default_total counter",
+            f"url_browser_rule_default_total {self.default_count}",
+            "# HELP url_browser_rule_match_seconds 规则匹配耗时",
+            "# TYPE url_browser_rule_match_seconds histogram"
+        ]
+        lines += self.match_latency.to_prometheus("url_browser_rule_match_seconds")
+        lines += [
+            "# HELP url_browser_rule_spawn_seconds 启动浏览器进程耗时",
+            "# TYPE url_browser_rule_spawn_seconds histogram"
+        ]
+        lines += self.spawn_latency.to_prometheus("url_browser_rule_spawn_seconds")
+        lines += [
+            "# HELP url_browser_rule_launched_urls_total 打开的URL数量",
+            "# TYPE url_browser_rule_launched_urls_total counter",
+            f"url_browser_rule_launched_urls_total {self.launched_urls}",
+            "# HELP url_browser_rule_spawns_saved_total 多个URL合并到一个浏览器进程启动而节省的进程数量",
+            "# TYPE url_browser_rule_spawns_saved_total counter",
+            f"url_browser_rule_spawns_saved_total {self.spawns_saved}"
+        ]
+        for speculated, name in ((True, "speculated"), (False, "cold")):
+            lines += [
+                f"# HELP url_browser_rule_keypress_{name}_seconds 按下回车到启动浏览器进程的耗时"
+                f"（{'已' if speculated else '未'}预先路由）",
+                f"# TYPE url_browser_rule_keypress_{name}_seconds histogram"
+            ]
+            lines += self.keypress_latency[speculated].to_prometheus(f"url_browser_rule_keypress_{name}_seconds")
+        
+        if route_cache is not None:
+            stats = route_cache.stats()
+            for key in ("hits", "misses", "evictions"):
+                lines += [
+                    f"# TYPE url_browser_rule_route_cache_{key}_total counter",
+                    f"url_browser_rule_route_cache_{key}_total {stats[key]}"
+                ]
+        return "\n".join(lines) + "\n"
+    
+    def export(self, metrics_file=METRICS_FILE, route_cache=None):
+        """把统计写入文本文件，先写临时文件再替换，避免采集器读到写了一半的内容"""
+        try:
+            temp_file = f"{metrics_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(self.to_prometheus(route_cache))
+            os.replace(temp_file, metrics_file)
+            self.dirty = False
+            return True
+        except Exception as e:
+            print(f"导出运行统计失败: {e}")
+            return False
+
+# 浏览器路径缓存类
+class BrowserPathCache:
+    """持久化的浏览器路径缓存，保存在应用数据目录中，由界面进程和命令行快速路径共用
+    
+    每条记录附带浏览器可执行文件的大小和修改时间，文件被删除、移动或更新后状态不再一致，
+    据此判断是否需要重新查找。缓存文件在第一次使用时才读取
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, cache_file=BROWSER_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = None
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def get_stamp(path):
+        """返回文件的(大小, 修改时间)，文件不存在时返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def load(self):
+        """读取缓存文件，文件不存在或内容有误时使用空缓存"""
+        if self.entries is not None:
+            return self.entries
+        entries = {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION and isinstance(data.get("browsers"), dict):
+                entries = data["browsers"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取浏览器路径缓存失败: {e}")
+        self.entries = entries
+        return entries
+    
+    def get(self, browser_name):
+        """返回缓存的浏览器路径，不检查文件状态，没有缓存时返回None"""
+        entry = self.load().get(browser_name)
+        return entry.get("path") if isinstance(entry, dict) else None
+    
+    def is_valid(self, browser_name):
+        """缓存的文件状态与当前文件一致时返回True"""
+        entry = self.load().get(browser_name)
+        if not isinstance(entry, dict) or not entry.get("path"):
+            return False
+        return self.get_stamp(entry["path"]) == (entry.get("size"), entry.get("mtime_ns"))
+    
+    def browser_names(self):
+        """缓存中的浏览器名称"""
+        return list(self.load())
+    
+    def put(self, browser_name, path):
+        """记录浏览器路径及其文件状态并保存，只缓存存在的绝对路径"""
+        stamp = self.get_stamp(path) if path and os.path.isabs(path) else None
+        with self.lock:
+            entries = self.load()
+            if stamp is None:
+                if entries.pop(browser_name, None) is None:
+                    return False
+            else:
+                entry = {"path": path, "size": stamp[0], "mtime_ns": stamp[1]}
+                if entries.get(browser_name) == entry:
+                    return False
+                entries[browser_name] = entry
+            return self.save()
+    
+    def remove(self, browser_name):
+        """删除一条缓存记录并保存"""
+        with self.lock:
+            if self.load().pop(browser_name, None) is None:
+                return False
+            return self.save()
+    
+    def save(self):
+        """先写入临时文件再原子替换缓存文件，多个进程同时写入时以最后一次为准"""
+        temp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.VERSION, "browsers": self.entries}, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.cache_file)
+            return True
+        except Exception as e:
+            print(f"保存浏览器路径缓存失败: {e}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return False
+
+# 浏览器查找后端基类
+class BrowserDiscoveryBackend:
+    """浏览器查找后端，probe返回浏览器可执行文件的完整路径，找不到时返回None
+    
+    priority越小优先级越高；后端的文件系统位置和系统调用都可以在构造时替换，便于在任意系统上测试
+    """
+    
+    name = "base"
+    priority = 0
+    
+    def available(self):
+        """当前系统是否支持该后端"""
+        return True
+    
+    def probe(self, browser_name, exe_name, commands):
+        """查找浏览器，exe_name为Windows可执行文件名，commands为其他系统的命令名"""
+        raise NotImplementedError
+
+# PATH查找后端
+class PathDiscoveryBackend(BrowserDiscoveryBackend):
+    """在系统PATH中查找浏览器可执行文件或命令"""
+    
+    name = "path"
+    priority = 0
+    
+    def __init__(self, search_path=None):
+        # 为None时使用环境变量PATH
+        self.search_path = search_path
+    
+    def probe(self, browser_name, exe_name, commands):
+        for command in (exe_name,) + tuple(commands):
+            path = shutil.which(command, path=self.search_path)
+            if path:
+                return path
+        return None
+
+# Windows注册表查找后端
+class RegistryDiscoveryBackend(BrowserDiscoveryBackend):
+    """通过注册表的App Paths和StartMenuInternet项查找浏览器（仅Windows）"""
+    
+    name = "registry"
+    priority = 10
+    
+    # 浏览器特定的注册表查找
+    REGISTRY_PATHS = {
+        "chrome": [
+            # Chrome - App Paths
+            r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe",
+            # Chrome - Start Menu Internet
+            r"SOFTWARE\Clients\StartMenuInternet\Google Chrome\shell\open\command",
+            r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Google Chrome\shell\open\command"
+        ],
+        "firefox": [
+            # Firefox - App Paths
+            r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\firefox.exe",
+            # Firefox - Start Menu Internet
+            r"SOFTWARE\Clients\StartMenuInternet\Firefox-308046B0AF4A39CB\shell\open\command",
+            r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Firefox-308046B0AF4A39CB\shell\open\command"
+        ],
+        "edge": [
+            # Edge - App Paths
+            r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\msedge.exe",
+            # Edge - Start Menu Internet
+            r"SOFTWARE\Clients\StartMenuInternet\Microsoft Edge\shell\open\command",
+            r"SOFTWARE\WOW6432Node\Clients\StartMenuInternet\Microsoft Edge\shell\open\command"
+        ],
+        "safari": [
+            # Safari - App Paths
+            r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\safari.exe"
+        ]
+    }
+    
+    def __init__(self, read_value=None, exists=os.path.exists):
+        # read_value(注册表路径) 返回默认值，测试时可以替换为字典查找
+        self.read_value = read_value or self.get_reg_value
+        self.exists = exists
+    
+    def available(self):
+        return winreg is not None or self.read_value is not self.get_reg_value
+    
+    @staticmethod
+    def get_reg_value(key_path):
+        """获取HKEY_LOCAL_MACHINE下注册表项的默认值"""
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path, 0, winreg.KEY_READ) as key:
+                value, _ = winreg.QueryValueEx(key, "")
+                return value
+        except Exception:
+            return None
+    
+    def probe(self, browser_name, exe_name, commands):
+        for reg_path in self.REGISTRY_PATHS.get(browser_name, ()):
+            reg_value = self.read_value(reg_path)
+            if not reg_value:
+                continue
+            if reg_value.startswith('"') and '"' in reg_value[1:]:
+                # 提取引号内的路径
+                browser_path = reg_value.split('"')[1]
+            elif self.exists(reg_value):
+                # App Paths的默认值通常是不带引号的完整路径，路径中可能有空格
+                browser_path = reg_value
+            else:
+                # 提取第一个空格前的路径
+                browser_path = reg_value.split()[0]
+            # 检查路径是否存在
+            if self.exists(browser_path):
+                return browser_path
+        return None
+
+# 常见安装目录查找后端
+class CommonPathDiscoveryBackend(BrowserDiscoveryBackend):
+    """直接检查浏览器的常见安装目录，不进行递归搜索（仅Windows）"""
+    
+    name = "common_paths"
+    priority = 20
+    
+    def __init__(self, directories=None, exists=os.path.exists):
+        if directories is None:
+            directories = [
+                os.path.expanduser(r"~\AppData\Local\Microsoft\Edge\Application"),
+                r"C:\Program Files\Google\Chrome\Application",
+                r"C:\Program Files\Mozilla Firefox",
+                r"C:\Program Files (x86)\Google\Chrome\Application",
+                r"C:\Program Files (x86)\Mozilla Firefox",
+                os.path.expanduser(r"~\AppData\Local\Programs\Microsoft Edge"),
+                os.path.expanduser(r"~\AppData\Local\Programs\Firefox"),
+                os.path.expanduser(r"~\AppData\Local\Programs\Chrome")
+            ]
+            self.default_directories = True
+        else:
+            self.default_directories = False
+        self.directories = directories
+        self.exists = exists
+    
+    def available(self):
+        return sys.platform == "win32" or not self.default_directories
+    
+    def probe(self, browser_name, exe_name, commands):
+        for directory in self.directories:
+            browser_path = os.path.join(directory, exe_name)
+            if self.exists(browser_path):
+                return browser_path
+        return None
+
+# XDG桌面文件查找后端
+class DesktopEntryDiscoveryBackend(BrowserDiscoveryBackend):
+    """扫描XDG数据目录下applications中的.desktop文件，按Exec命令或文件名识别浏览器（Linux等系统）
+    
+    用户目录（XDG_DATA_HOME）优先于系统目录（XDG_DATA_DIRS），与桌面环境的查找顺序一致；
+    目录只扫描一次，同一后端的多次查找共用扫描结果
+    """
+    
+    name = "desktop_entry"
+    priority = 30
+    
+    def __init__(self, data_dirs=None, search_path=None):
+        if data_dirs is None:
+            data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+            system_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+            data_dirs = [data_home] + [path for path in system_dirs.split(os.pathsep) if path]
+            self.default_dirs = True
+        else:
+            self.default_dirs = False
+        self.data_dirs = data_dirs
+        self.search_path = search_path
+        self.entries = None
+        self.lock = threading.Lock()
+    
+    def available(self):
+        return sys.platform not in ("win32", "darwin") or not self.default_dirs
+    
+    @staticmethod
+    def parse_desktop_file(path):
+        """读取.desktop文件[Desktop Entry]段中的键值，返回字典"""
+        values = {}
+        in_entry = False
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                elif in_entry and "=" in line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    values.setdefault(key.strip(), value.strip())
+        return values
+    
+    @staticmethod
+    def get_exec_command(exec_value):
+        """取Exec值中的可执行文件部分，去掉参数和%u等占位符"""
+        if exec_value.startswith('"') and '"' in exec_value[1:]:
+            return exec_value.split('"')[1]
+        return exec_value.split()[0] if exec_value.split() else ""
+    
+    def load_entries(self):
+        """扫描所有数据目录，返回[(文件名去掉扩展名, 可执行文件)]，同名文件只保留优先的目录"""
+        with self.lock:
+            if self.entries is not None:
+                return self.entries
+            entries = []
+            seen = set()
+            for data_dir in self.data_dirs:
+                applications_dir = os.path.join(data_dir, "applications")
+                try:
+                    file_names = sorted(os.listdir(applications_dir))
+                except OSError:
+                    continue
+                for file_name in file_names:
+                    if not file_name.endswith(".desktop") or file_name in seen:
+                        continue
+                    seen.add(file_name)
+                    try:
+                        values = self.parse_desktop_file(os.path.join(applications_dir, file_name))
+                    except OSError:
+                        continue
+                    if values.get("Type", "Application") != "Application" or values.get("Hidden") == "true":
+                        continue
+                    command = self.get_exec_command(values.get("TryExec") or values.get("Exec", ""))
+                    if command:
+                        entries.append((file_name[:-len(".desktop")], command))
+            self.entries = entries
+            return entries
+    
+    def probe(self, browser_name, exe_name, commands):
+        if not commands:
+            return None
+        for desktop_name, command in self.load_entries():
+            if desktop_name not in commands and os.path.basename(command) not in commands:
+                continue
+            # Exec可以是绝对路径或PATH中的命令
+            if os.path.isabs(command):
+                if os.path.exists(command):
+                    return command
+                continue
+            path = shutil.which(command, path=self.search_path)
+            if path:
+                return path
+        return None
+
+def get_default_discovery_backends():
+    """当前系统可用的浏览器查找后端"""
+    backends = [PathDiscoveryBackend(), RegistryDiscoveryBackend(),
+                CommonPathDiscoveryBackend(), DesktopEntryDiscoveryBackend()]
+    return [backend for backend in backends if backend.available()]
+
+# 路由引擎类
+class RouterEngine:
+    """负责浏览器路径扫描、URL解析和规则匹配逻辑"""
+    
+    # 浏览器可执行文件映射
+    BROWSER_PATHS = {
+        "chrome": "chrome.exe",
+        "firefox": "firefox.exe",
+        "edge": "msedge.exe",
+        "safari": "safari.exe",
+        "default": None
+    }
+    
+    # 其他系统上浏览器的命令名，也用于识别.desktop文件
+    BROWSER_COMMANDS = {
+        "chrome": ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser"),
+        "firefox": ("firefox", "firefox-esr"),
+        "edge": ("microsoft-edge", "microsoft-edge-stable"),
+        "safari": ()
+    }
+    
+    # 单次浏览器查找的超时时间（秒）和并行线程数上限
+    PROBE_TIMEOUT = 2.0
+    MAX_PROBE_WORKERS = 16
+    
+    # 路由结果缓存默认容量
+    ROUTE_CACHE_SIZE = 1024
+    
+    def __init__(self, cache_size=ROUTE_CACHE_SIZE, browser_cache=None, discovery_backends=None):
+        self.browser_paths = self.BROWSER_PATHS
+        self.browser_path_cache = {}
+        # 持久化的浏览器路径缓存，为None时只在内存中缓存
+        self.browser_cache = browser_cache
+        # 浏览器查找后端，并行运行后按优先级合并
+        self.discovery_backends = discovery_backends if discovery_backends is not None \
+            else get_default_discovery_backends()
+        # 编译后的规则匹配器，规则列表或规则集版本变化时重新编译
+        self.rule_matcher = None
+        self.compiled_rules = None
+        self.compiled_generation = None
+        # 路由结果缓存，随匹配器一起失效
+        self.route_cache = RouteCache(cache_size)
+        # 二进制规则索引，设置后直接使用索引匹配，不再编译规则列表
+        self.rule_index = None
+        # 运行统计
+        self.metrics = RouterMetrics()
+    
+    def set_rule_index(self, rule_index):
+        """设置二进制规则索引"""
+        self.rule_index = rule_index
+        self.route_cache.clear()
+    
+    def get_rule_matcher(self, rules):
+        """获取规则列表对应的匹配器，必要时重新编译"""
+        if self.rule_index is not None:
+            return self.rule_index
+        # 保存规则会递增规则集版本号；未保存的原地修改按列表对象和长度判断
+        if self.rule_matcher is None or rules is not self.compiled_rules or \
+                ConfigManager.rules_generation != self.compiled_generation or \
+                len(rules) != len(self.rule_matcher.rules):
+            self.rule_matcher = RuleMatcher(list(rules))
+            self.compiled_rules = rules
+            self.compiled_generation = ConfigManager.rules_generation
+            self.route_cache.clear()
+        return self.rule_matcher
+    
+    def install_equivalent_matcher(self, rules, rule_matcher, generation):
+        """换用后台编译的等价匹配器（去掉了不可达规则或调整了尝试顺序），匹配结果不变，路由缓存保持有效
+        
+        只替换一个属性，正在路由的URL使用旧匹配器或新匹配器都得到相同的结果；
+        编译期间规则已变化（规则集版本或规则列表不同）时不替换，返回是否已替换
+        """
+        if self.rule_index is not None or generation != ConfigManager.rules_generation or \
+                (self.compiled_rules is not None and rules is not self.compiled_rules) or \
+                len(rules) != len(rule_matcher.rules):
+            return False
+        self.rule_matcher = rule_matcher
+        self.compiled_rules = rules
+        self.compiled_generation = generation
+        return True
+    
+    def install_rules(self, rules, rule_matcher, added=(), removed=(), changed=(), reordered=False):
+        """一次性替换规则列表和后台编译好的匹配器，路由缓存只淘汰受变化影响的条目
+        
+        替换在调用线程中一步完成，正在路由的URL只会看到旧规则集或新规则集
+        """
+        self.rule_matcher = rule_matcher
+        self.compiled_rules = rules
+        self.compiled_generation = ConfigManager.rules_generation
+        
+        if reordered:
+            self.route_cache.clear()
+            return
+        # 1. 结果是被删除或修改的规则的条目
+        stale_ids = {rule.get("id") for rule in removed}
+        stale_ids.update(old_rule.get("id") for old_rule, _ in changed)
+        # 2. 新增或修改后的规则能匹配的URL，可能优先于缓存中的结果或原来的不匹配
+        new_rules = list(added) + [new_rule for _, new_rule in changed]
+        new_matcher = RuleMatcher(new_rules) if new_rules else None
+        # 缓存键是匹配用的URL（已规范化），再次解析得到的仍是同一个URL
+        entries = self.route_cache.entries
+        for match_url, matched_rule in list(entries.items()):
+            if (matched_rule and matched_rule.get("id") in stale_ids) or \
+                    (new_matcher is not None and new_matcher.match(match_url, parse_url(match_url).idna_host)):
+                del entries[match_url]
+    
+    def find_browser_path(self, browser_name):
+        """查找浏览器的完整路径，依次使用内存缓存、持久化缓存，都没有时重新查找"""
+        if browser_name == "default":
+            return None
+        
+        # 检查缓存
+        if browser_name in self.browser_path_cache:
+            return self.browser_path_cache[browser_name]
+        
+        # 持久化缓存中的路径直接使用，由后台重新验证或启动失败时重新查找
+        if self.browser_cache is not None:
+            cached_path = self.browser_cache.get(browser_name)
+            if cached_path:
+                self.browser_path_cache[browser_name] = cached_path
+                return cached_path
+        
+        browser_path = self.discover_browser_path(browser_name)
+        if browser_path is None:
+            return None
+        self.browser_path_cache[browser_name] = browser_path
+        if self.browser_cache is not None:
+            self.browser_cache.put(browser_name, browser_path)
+        return browser_path
+    
+    def find_browser_paths(self, browser_names):
+        """查找多个浏览器的路径，没有缓存的浏览器一起并行查找，返回{浏览器名称: 路径}"""
+        result = {}
+        missing = []
+        for browser_name in browser_names:
+            if browser_name == "default":
+                continue
+            if browser_name in self.browser_path_cache or \
+                    (self.browser_cache is not None and self.browser_cache.get(browser_name)):
+                result[browser_name] = self.find_browser_path(browser_name)
+            else:
+                missing.append(browser_name)
+        
+        for browser_name, browser_path in self.discover_browser_paths(missing).items():
+            self.browser_path_cache[browser_name] = browser_path
+            if self.browser_cache is not None:
+                self.browser_cache.put(browser_name, browser_path)
+            result[browser_name] = browser_path
+        return result
+    
+    def prepare_browser_path(self, browser_name):
+        """确保浏览器路径已找到，持久化缓存中的文件状态不一致（浏览器已移动或更新）时重新查找，返回路径"""
+        if browser_name == "default":
+            return None
+        if self.browser_cache is not None and self.browser_cache.get(browser_name) and \
+                not self.browser_cache.is_valid(browser_name):
+            self.forget_browser_path(browser_name)
+        return self.find_browser_path(browser_name)
+    
+    def forget_browser_path(self, browser_name):
+        """丢弃浏览器路径的缓存，下次使用时重新查找"""
+        self.browser_path_cache.pop(browser_name, None)
+        if self.browser_cache is not None:
+            self.browser_cache.remove(browser_name)
+    
+    def revalidate_browser_paths(self):
+        """检查持久化缓存中每个浏览器的文件状态，不一致时重新查找，返回路径有变化的浏览器"""
+        if self.browser_cache is None:
+            return {}
+        changed = {}
+        stale_names = [browser_name for browser_name in self.browser_cache.browser_names()
+                       if not self.browser_cache.is_valid(browser_name)]
+        old_paths = {browser_name: self.browser_cache.get(browser_name) for browser_name in stale_names}
+        discovered = self.discover_browser_paths(stale_names)
+        for browser_name in stale_names:
+            old_path = old_paths[browser_name]
+            browser_path = discovered.get(browser_name)
+            if browser_path is None:
+                self.forget_browser_path(browser_name)
+                continue
+            self.browser_path_cache[browser_name] = browser_path
+            self.browser_cache.put(browser_name, browser_path)
+            if browser_path != old_path:
+                changed[browser_name] = browser_path
+        return changed
+    
+    def discover_browser_path(self, browser_name):
+        """重新查找单个浏览器的完整路径"""
+        return self.discover_browser_paths([browser_name]).get(browser_name)
+    
+    def discover_browser_paths(self, browser_names):
+        """使用所有查找后端并行查找浏览器路径，返回{浏览器名称: 路径}
+        
+        每个(后端, 浏览器)组合在守护线程中同时运行，总耗时取决于最慢的一次查找，且不超过PROBE_TIMEOUT；
+        多个后端都找到时取优先级最高的结果，都没有找到时返回可执行文件名，依赖系统PATH
+        """
+        probes = []
+        for browser_name in browser_names:
+            exe_name = self.browser_paths.get(browser_name)
+            if not exe_name:
+                continue
+            commands = self.BROWSER_COMMANDS.get(browser_name, ())
+            for backend in self.discovery_backends:
+                probes.append((browser_name, exe_name, commands, backend))
+        if not probes:
+            return {}
+        # 1. 所有查找同时开始，超时的查找不再等待（线程无法强制结束，由它在后台自行完成）；
+        # 工作线程是守护线程，卡住的查找（例如无响应的网络驱动器）不会阻止进程退出
+        pending = queue.Queue()
+        for index, probe in enumerate(probes):
+            pending.put((index,) + probe)
+        results = queue.Queue()
+        
+        def run_probes():
+            while True:
+                try:
+                    index, browser_name, exe_name, commands, backend = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results.put((index, backend.probe(browser_name, exe_name, commands), None))
+                except Exception as e:
+                    results.put((index, None, e))
+        
+        for i in range(min(len(probes), self.MAX_PROBE_WORKERS)):
+            threading.Thread(target=run_probes, name=f"BrowserProbe-{i}", daemon=True).start()
+        
+        # 2. 在超时前收集结果，按后端优先级合并
+        deadline = time.monotonic() + self.PROBE_TIMEOUT
+        finished = set()
+        found = {}
+        while len(finished) < len(probes):
+            try:
+                index, path, error = results.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            finished.add(index)
+            browser_name, _, _, backend = probes[index]
+            if error is not None:
+                print(f"查找{browser_name}失败: {backend.name}: {error}")
+                continue
+            if path and (browser_name not in found or backend.priority < found[browser_name][0]):
+                found[browser_name] = (backend.priority, path)
+        
+        # 尚未开始的查找不再运行
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                break
+        for index, (browser_name, _, _, backend) in enumerate(probes):
+            if index not in finished:
+                print(f"查找{browser_name}超时: {backend.name}")
+        
+        return {
+            browser_name: found[browser_name][1] if browser_name in found else self.browser_paths[browser_name]
+            for browser_name in browser_names if self.browser_paths.get(browser_name)
+        }
+    
+    def complete_url(self, text):
+        """把输入框中的一段文本补全为URL（没有协议时加上自定义协议），不像URL时返回None"""
+        prefixes = ('http://', 'https://', f'{self.protocol_name}://')
+        if text.startswith(prefixes):
+            return text
+        if '.' in text or ':' in text:
+            return f'{self.protocol_name}://{text}'
+        return None
+    
+    def parse_url(self, url):
+        """解析URL，已经解析过的ParsedURL直接返回"""
+        if isinstance(url, ParsedURL):
+            return url
+        return parse_url(url, self.protocol_name)
+    
+    def get_actual_url(self, url):
+        """将自定义协议URL转换为浏览器可打开的http URL"""
+        return self.parse_url(url).url
+    
+    def find_rule(self, url, rules):
+        """根据URL（字符串或ParsedURL）查找第一条匹配的规则，没有匹配时返回None"""
+        parsed_url = self.parse_url(url)
+        
+        # 先确认匹配器与规则集一致，再查路由缓存
+        # 子串规则能看到整个URL（含主机、路径和参数），因此以规范化后的完整URL作为缓存键
+        matcher = self.get_rule_matcher(rules)
+        matched_rule = self.route_cache.get(parsed_url.match_url)
+        if matched_rule is None:
+            # 使用编译后的匹配器查找第一条匹配的规则，缓存中用False表示没有匹配
+            matched_rule = matcher.match(parsed_url.match_url, parsed_url.idna_host) or False
+            self.route_cache.put(parsed_url.match_url, matched_rule)
+        return matched_rule or None
+    
+    def match_rule(self, url, rules):
+        """根据URL（字符串或ParsedURL）匹配规则，返回匹配的浏览器名称"""
+        try:
+            start_time = time.perf_counter()
+            matched_rule = self.find_rule(url, rules)
+            self.metrics.record_match(matched_rule, time.perf_counter() - start_time)
+            
+            # 选择浏览器
+            if matched_rule:
+                return matched_rule["browser"]
+            else:
+                return "default"
+        except Exception as e:
+            print(f"匹配规则失败: {e}")
+            return "default"
+    
+    def open_url(self, actual_url, browser_exe=None):
+        """使用指定浏览器打开URL，未指定时使用系统默认浏览器，所有方式都失败时抛出异常"""
+        if browser_exe:
+            self.spawn_browser(browser_exe, [actual_url])
+            return
+        
+        # 使用Python内置的os.startfile方法，安全打开默认浏览器
+        try:
+            os.startfile(actual_url)
+        except Exception as e1:
+            print(f"使用os.startfile打开URL失败: {e1}")
+            try:
+                # 回退方案1：使用webbrowser模块，这是最安全的兜底
+                webbrowser.open(actual_url)
+            except Exception as e2:
+                print(f"使用webbrowser打开URL失败: {e2}")
+                # 最后的兜底方案：使用subprocess，不使用shell=True
+                try:
+                    # 尝试使用系统默认浏览器的通用方法
+                    subprocess.Popen(['cmd', '/c', 'start', '', actual_url], shell=False)
+                except Exception as e3:
+                    print(f"所有打开URL的方法都失败了: {e3}")
+                    raise
+    
+    def open_in_browser(self, actual_urls, browser_name, browser_exe):
+        """使用规则指定的浏览器打开一个或多个URL（多个URL在同一个进程中打开），
+        浏览器已被移动或卸载时重新查找路径并重试一次"""
+        if isinstance(actual_urls, str):
+            actual_urls = [actual_urls]
+        try:
+            self.spawn_browser(browser_exe, actual_urls)
+            return browser_exe
+        except FileNotFoundError:
+            self.forget_browser_path(browser_name)
+            new_exe = self.find_browser_path(browser_name)
+            if not new_exe or new_exe == browser_exe:
+                raise
+            print(f"浏览器路径已失效，重新查找: {browser_exe} -> {new_exe}")
+            self.spawn_browser(new_exe, actual_urls)
+            return new_exe
+    
+    @staticmethod
+    def spawn_browser(browser_exe, actual_urls):
+        """启动浏览器进程，所有URL作为命令行参数传入"""
+        # 安全执行：去掉shell=True，直接使用列表参数
+        subprocess.Popen([browser_exe] + list(actual_urls))
+    
+    def set_protocol_name(self, protocol_name):
+        """设置协议名称"""
+        self.protocol_name = protocol_name
+
+# 浏览器启动合并类
+class LaunchBatcher:
+    """把短时间内要打开的URL按浏览器分组，每个浏览器只启动一个进程并一次传入多个URL
+    
+    调用者负责计时：add返回True表示开始了新的一批，应在合并窗口结束后调用flush，
+    或者用take取出各组URL，再在工作线程中分别调用launch；
+    默认浏览器通过系统文件关联打开，无法一次传入多个URL，仍逐个打开
+    """
+    
+    # Windows的命令行长度上限为32767个字符，留出余量
+    MAX_COMMAND_LENGTH = 32000
+    
+    def __init__(self, router_engine, max_command_length=MAX_COMMAND_LENGTH):
+        self.router_engine = router_engine
+        self.max_command_length = max_command_length
+        # 浏览器名称 -> [(URL, 转发进程的启动时间)]，保持加入顺序
+        self.pending = OrderedDict()
+        # 在输入框按下回车打开的URL -> (按下回车的时间, 是否已预先路由)，启动后统计耗时
+        self.keypresses = {}
+    
+    def mark_keypress(self, actual_url, speculated, pressed_at=None):
+        """记录URL是在输入框按下回车打开的，启动浏览器后统计从按键到启动的耗时"""
+        self.keypresses[actual_url] = (pressed_at if pressed_at is not None else time.perf_counter(), speculated)
+    
+    def add(self, actual_url, browser_name="default", started_at=None):
+        """加入一个等待打开的URL，是这一批的第一个URL时返回True"""
+        first = not self.pending
+        self.pending.setdefault(browser_name, []).append((actual_url, started_at))
+        return first
+    
+    def take(self):
+        """取出所有等待中的URL，返回[(浏览器名称, [(URL, 启动时间)])]"""
+        pending, self.pending = self.pending, OrderedDict()
+        return list(pending.items())
+    
+    def split_batches(self, browser_exe, entries):
+        """按命令行长度上限把URL分成多批，单个URL超长时单独成批"""
+        base_length = len(subprocess.list2cmdline([browser_exe]))
+        batches = []
+        batch = []
+        length = base_length
+        for entry in entries:
+            # 每个参数前有一个空格，含特殊字符时还要加引号和转义
+            arg_length = len(subprocess.list2cmdline([entry[0]])) + 1
+            if batch and length + arg_length > self.max_command_length:
+                batches.append(batch)
+                batch = []
+                length = base_length
+            batch.append(entry)
+            length += arg_length
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def flush(self):
+        """在当前线程中打开所有等待中的URL，返回启动失败的[(URL列表, 异常)]"""
+        failures = []
+        for browser_name, entries in self.take():
+            failures += self.launch(browser_name, entries)
+        return failures
+    
+    def launch(self, browser_name, entries):
+        """查找浏览器路径并打开一组URL，返回启动失败的[(URL列表, 异常)]，可以在工作线程中调用"""
+        failures = []
+        metrics = self.router_engine.metrics
+        browser_exe = None
+        if browser_name != "default":
+            browser_exe = self.router_engine.find_browser_path(browser_name)
+        batches = self.split_batches(browser_exe, entries) if browser_exe else [[entry] for entry in entries]
+        for batch in batches:
+            urls = [url for url, _ in batch]
+            start_time = time.perf_counter()
+            try:
+                if browser_exe:
+                    self.router_engine.open_in_browser(urls, browser_name, browser_exe)
+                else:
+                    # 默认浏览器依次尝试os.startfile、webbrowser和cmd start
+                    self.router_engine.open_url(urls[0])
+            except Exception as e:
+                failures.append((urls, e))
+                for url in urls:
+                    self.keypresses.pop(url, None)
+                continue
+            metrics.record_spawn(time.perf_counter() - start_time, len(urls))
+            for url in urls:
+                keypress = self.keypresses.pop(url, None)
+                if keypress is not None:
+                    metrics.record_keypress(time.perf_counter() - keypress[0], keypress[1])
+            
+            # 统计从启动转发进程到打开浏览器的耗时
+            for url, started_at in batch:
+                if started_at:
+                    print(f"转发URL处理完成: {url}，点击到启动耗时 {(time.time() - started_at) * 1000:.1f} ms")
+        return failures
+
+# 浏览器启动调度类
+class LaunchDispatcher:
+    """在后台工作线程中启动浏览器，调用者（界面线程）只负责把任务放入队列
+    
+    同时进行的启动不超过max_workers个；单次启动超过timeout秒仍未完成时按超时失败报告，
+    挂起的启动线程被放弃，不再占用工作线程。启动线程（包括挂起的）最多比工作线程多max_hung个，
+    达到上限时新任务等待其中一个结束，超过timeout秒仍没有结束则不再启动并报告失败。每个任务结束后在工作线程中调用
+    on_result(浏览器名称, URL列表, 失败列表[(URL列表, 异常)], 耗时秒数)
+    """
+    
+    # 最多同时进行的启动数量
+    MAX_WORKERS = 4
+    # 单次启动（查找浏览器路径和启动进程）的超时时间（秒）
+    LAUNCH_TIMEOUT = 10.0
+    # 超时后仍在运行的启动线程数量上限，达到上限时不再创建新的启动线程
+    MAX_HUNG = 8
+    # 退出程序时等待已提交的启动开始执行的最长时间（秒），工作线程是守护线程，挂起的启动不阻止退出
+    CLOSE_TIMEOUT = 1.0
+    
+    def __init__(self, launch, on_result=None, max_workers=MAX_WORKERS, timeout=LAUNCH_TIMEOUT, max_hung=MAX_HUNG):
+        # launch(浏览器名称, [(URL, 启动时间)])返回失败列表，例如LaunchBatcher.launch
+        self.launch = launch
+        self.on_result = on_result
+        self.timeout = timeout
+        self.max_hung = max(1, max_hung)
+        self.tasks = queue.Queue()
+        self.timeout_count = 0
+        # 挂起过多而没有启动的任务数
+        self.refused_count = 0
+        # 仍在运行的启动线程（包括超时后被放弃的），结束时自行移除并唤醒等待的工作线程
+        self.runners = set()
+        self.runners_changed = threading.Condition()
+        self.max_runners = max(1, max_workers) + self.max_hung
+        self.closed = False
+        self.workers = []
+        for index in range(max(1, max_workers)):
+            worker = threading.Thread(target=self.run_worker, name=f"LaunchWorker-{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+    
+    def submit(self, browser_name, entries):
+        """加入一个启动任务，立即返回"""
+        if self.closed:
+            raise RuntimeError("启动调度器已关闭")
+        self.tasks.put((browser_name, entries))
+    
+    def run_task(self, browser_name, entries):
+        """在单独的线程中执行一个启动任务，超时后放弃等待，返回失败列表"""
+        urls = [url for url, _ in entries]
+        outcome = {}
+        
+        def run():
+            try:
+                outcome["failures"] = self.launch(browser_name, entries)
+            except Exception as e:
+                outcome["failures"] = [(urls, e)]
+            finally:
+                with self.runners_changed:
+                    self.runners.discard(runner)
+                    self.runners_changed.notify_all()
+        
+        with self.runners_changed:
+            # 挂起的启动线程过多时（例如浏览器或系统无响应）等待其中一个结束，避免线程无限增加
+            if not self.runners_changed.wait_for(lambda: len(self.runners) < self.max_runners, self.timeout):
+                self.refused_count += 1
+                return [(urls, RuntimeError(f"已有 {len(self.runners)} 个启动未完成，暂不启动浏览器"))]
+            runner = threading.Thread(target=run, name=f"Launch-{browser_name}", daemon=True)
+            self.runners.add(runner)
+        runner.start()
+        runner.join(self.timeout)
+        if "failures" not in outcome:
+            # Python无法终止线程，挂起的启动留在守护线程中，结束后结果被丢弃
+            self.timeout_count += 1
+            return [(urls, TimeoutError(f"启动浏览器超过 {self.timeout:g} 秒仍未完成"))]
+        return outcome["failures"]
+    
+    def run_worker(self):
+        """工作线程：依次取出任务并执行，收到None时退出"""
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    return
+                browser_name, entries = task
+                start_time = time.perf_counter()
+                failures = self.run_task(browser_name, entries)
+                if self.on_result:
+                    try:
+                        self.on_result(browser_name, [url for url, _ in entries], failures,
+                                       time.perf_counter() - start_time)
+                    except Exception as e:
+                        print(f"处理启动结果失败: {str(e)}")
+            finally:
+                self.tasks.task_done()
+    
+    def close(self, timeout=None):
+        """不再接受新任务，等待已提交的任务开始执行，最多等待timeout秒"""
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.workers:
+            self.tasks.put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+# 预先路由类
+class SpeculativeRouter:
+    """在按下回车之前预先路由输入框或剪贴板中的URL，并确保目标浏览器的路径已找到且仍然有效
+    
+    submit只记录最新的文本并唤醒后台线程，文本变化很快时只处理最新的一次；后台线程解析文本中的URL，
+    用与路由引擎相同的规则匹配并预先查找浏览器路径，结果按补全后的URL保存。
+    路由引擎的匹配器和路由缓存只在界面线程中修改，后台线程读取当前的匹配器，规则已变化时自行编译
+    """
+    
+    # 最多保存的预先路由结果数量
+    MAX_DECISIONS = 64
+    
+    def __init__(self, router_engine, get_rules):
+        self.router_engine = router_engine
+        # 返回界面当前使用的规则列表
+        self.get_rules = get_rules
+        # URL -> (规则列表, 规则集版本号, 匹配的规则, 匹配耗时秒数)
+        self.decisions = OrderedDict()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending_text = None
+        self.closed = False
+        # 规则变化后后台线程自行编译的匹配器：(规则列表, 规则集版本号, 匹配器)
+        self.own_matcher = None
+        self.worker = threading.Thread(target=self.run_worker, name="SpeculativeRouter", daemon=True)
+        self.worker.start()
+    
+    def submit(self, text):
+        """提交输入框或剪贴板中的文本，立即返回"""
+        with self.lock:
+            self.pending_text = text
+        self.wakeup.set()
+    
+    def get(self, url, rules):
+        """返回URL的预先路由结果(匹配的规则, 匹配耗时秒数)，没有结果或规则已变化时返回None"""
+        with self.lock:
+            decision = self.decisions.get(url)
+        if decision is None:
+            return None
+        decision_rules, generation, matched_rule, seconds = decision
+        if decision_rules is not rules or generation != ConfigManager.rules_generation:
+            return None
+        return matched_rule, seconds
+    
+    def get_matcher(self, rules, generation):
+        """返回与规则列表一致的匹配器，优先使用路由引擎已编译的匹配器"""
+        router_engine = self.router_engine
+        matcher = router_engine.rule_matcher
+        if matcher is not None and router_engine.compiled_rules is rules and \
+                router_engine.compiled_generation == generation and len(matcher.rules) == len(rules):
+            return matcher
+        if self.own_matcher is None or self.own_matcher[0] is not rules or self.own_matcher[1] != generation:
+            self.own_matcher = (rules, generation, RuleMatcher(list(rules)))
+        return self.own_matcher[2]
+    
+    def speculate(self, text):
+        """预先路由文本中的每个URL，并查找和验证目标浏览器的路径"""
+        router_engine = self.router_engine
+        for token in text.split():
+            url = router_engine.complete_url(token)
+            if url is None:
+                continue
+            rules = self.get_rules()
+            generation = ConfigManager.rules_generation
+            with self.lock:
+                decision = self.decisions.get(url)
+            if decision is not None and decision[0] is rules and decision[1] == generation:
+                continue
+            
+            start_time = time.perf_counter()
+            try:
+                parsed_url = router_engine.parse_url(url)
+                matched_rule = self.get_matcher(rules, generation).match(parsed_url.match_url, parsed_url.idna_host)
+            except Exception as e:
+                print(f"预先路由失败: {url}: {e}")
+                continue
+            seconds = time.perf_counter() - start_time
+            
+            with self.lock:
+                self.decisions[url] = (rules, generation, matched_rule, seconds)
+                self.decisions.move_to_end(url)
+                while len(self.decisions) > self.MAX_DECISIONS:
+                    self.decisions.popitem(last=False)
+            
+            # 按回车时浏览器路径已在内存中，且文件状态已验证
+            if matched_rule:
+                try:
+                    router_engine.prepare_browser_path(matched_rule["browser"])
+                except Exception as e:
+                    print(f"预先查找浏览器失败: {matched_rule['browser']}: {e}")
+    
+    def run_worker(self):
+        """后台线程：等待新的文本并预先路由，关闭后退出"""
+        while True:
+            self.wakeup.wait()
+            with self.lock:
+                text, self.pending_text = self.pending_text, None
+                self.wakeup.clear()
+            if self.closed:
+                return
+            if text:
+                self.speculate(text)
+    
+    def close(self):
+        """停止后台线程，不等待正在进行的查找"""
+        self.closed = True
+        self.wakeup.set()
+
+def run_fast_path(url):
+    """命令行快速路径：不加载PyQt5，按规则选择浏览器打开URL，返回进程退出码"""
+    # 已有常驻实例时交给它处理，复用其已编译的规则和缓存
+    if forward_to_running_instance(url):
+        return 0
+    
+    try:
+        router_engine = RouterEngine(browser_cache=BrowserPathCache())
+        router_engine.set_protocol_name(PROTOCOL_NAME)
+        
+        # 优先使用二进制规则索引，避免解析整个rules.json；索引不可用时读取规则文件
+        rules = None
+        rule_index = RuleIndex.load()
+        if rule_index is not None:
+            router_engine.set_rule_index(rule_index)
+        else:
+            rules = ConfigManager().read_rules()
+        
+        # URL只解析一次，匹配和启动共用
+        parsed_url = router_engine.parse_url(url)
+        browser = router_engine.match_rule(parsed_url, rules)
+        browser_exe = None
+        if browser != "default":
+            browser_exe = router_engine.find_browser_path(browser)
+        if browser_exe:
+            router_engine.open_in_browser(parsed_url.url, browser, browser_exe)
+        else:
+            router_engine.open_url(parsed_url.url)
+    except Exception as e:
+        print(f"处理URL失败: {e}")
+        return 1
+    
+    # 统计从进程启动到浏览器进程创建完成的耗时
+    elapsed_ms = (time.time() - PROCESS_START_TIME) * 1000
+    print(f"快速路径处理完成: {url} -> {browser}，耗时 {elapsed_ms:.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python url_browser_rule_core.py <URL>")
+        sys.exit(2)
+    sys.exit(run_fast_path(sys.argv[1]))